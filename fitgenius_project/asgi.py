@@ -0,0 +1,18 @@
+"""
+ASGI config for fitgenius_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI the hot views (lists, details and exports) are served by
+``training_plans.async_views``; set FITGENIUS_ASYNC_VIEWS=0 to keep the sync ones.
+
+Run with e.g. ``uvicorn fitgenius_project.asgi:application``.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitgenius_project.settings')
+os.environ.setdefault('FITGENIUS_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
@@ -5,6 +5,8 @@ Django settings for fitgenius_project project.
 import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,10 +34,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'training_plans.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'training_plans.middleware.ShardMiddleware',
+    'training_plans.middleware.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,8 +64,56 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'fitgenius_project.wsgi.application'
+ASGI_APPLICATION = 'fitgenius_project.asgi.application'
+
+# Асинхронные версии списков, деталей и экспортов (training_plans/async_views.py).
+# fitgenius_project/asgi.py включает их по умолчанию; под WSGI они не нужны.
+ASYNC_VIEWS = os.environ.get('FITGENIUS_ASYNC_VIEWS', '0') == '1'
+
+# Сколько PDF/XLSX рендерится одновременно в пуле потоков асинхронного воркера
+EXPORT_MAX_WORKERS = int(os.environ.get('FITGENIUS_EXPORT_MAX_WORKERS', '4'))
+
+# Шрифт с кириллицей для PDF: DejaVu (лицензия — static/fonts/LICENSE) лежит
+# в репозитории; без него экспорт PDF падает с ImproperlyConfigured.
+PDF_FONT_DIRS = [BASE_DIR / 'static' / 'fonts']
+PDF_FONT_FILES = {'regular': 'DejaVuSans.ttf', 'bold': 'DejaVuSans-Bold.ttf'}
+
+# Контроль допуска к экспортам и генерации плана (training_plans/throttling.py):
+# токен-бакет на пользователя и общий предел одновременных дорогих операций.
+# CacheAdmissionBackend держит состояние в кэше и делит лимиты между воркерами.
+ADMISSION_CONTROL = {
+    'BACKEND': os.environ.get('FITGENIUS_ADMISSION_BACKEND', 'training_plans.throttling.LocalAdmissionBackend'),
+    'RATE': 1.0,            # токенов в секунду на пользователя
+    'BURST': 10,            # запросов подряд без ожидания
+    'MAX_CONCURRENT': 4,    # одновременных дорогих операций
+    'QUEUE_TIMEOUT': 2.0,   # секунд ожидания слота до ответа 503 (async-представления)
+    'SYNC_QUEUE_TIMEOUT': 0.0,  # то же для синхронных: ожидание держит воркер
+    'LEASE_TIMEOUT': 300,   # слот CacheAdmissionBackend освобождается сам, если воркер умер
+}
+
+# Удаление профилей, тренировок и аккаунтов (training_plans/deletion.py):
+# дочерние строки удаляются пачками DELETE, крупные объемы — в фоновом потоке.
+BULK_DELETE_CHUNK_SIZE = 5000
+BULK_DELETE_BACKGROUND_THRESHOLD = 50000
+
+# Процессов для пакетной выгрузки PDF командой export_profile_pdfs
+PDF_BATCH_WORKERS = int(os.environ.get('FITGENIUS_PDF_WORKERS', os.cpu_count() or 1))
+
+# Профилирование отдельных запросов (training_plans/profiling.py): сотрудник
+# добавляет ?profile=1 к адресу, кроме того профилируется доля SAMPLE_RATE
+# всех запросов (0.01 — 1%). Профили и flame graph — в админке.
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get('FITGENIUS_PROFILE_SAMPLE_RATE', '0')),
+    'QUERY_PARAM': 'profile',
+    'INTERVAL': 0.005,      # секунд между снимками стека
+    'MAX_STORED': 1000,     # сколько последних профилей хранить
+}
 
 # Database
+# FITGENIUS_DB_PROFILE=production включает настройки SQLite для продакшена:
+# WAL, busy timeout, mmap и постоянные соединения с проверкой живости.
+DB_PROFILE = os.environ.get('FITGENIUS_DB_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -68,6 +121,83 @@ DATABASES = {
     }
 }
 
+# PRAGMA, которые выполняются для каждого нового SQLite-соединения
+# (см. training_plans/sqlite.py)
+SQLITE_PRAGMAS = {}
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # мс
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # отрицательное значение — в КиБ, т.е. ~64 МБ
+    'temp_store': 'MEMORY',
+}
+
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+    if django.VERSION >= (5, 1):
+        # Берем блокировку на запись в начале транзакции, чтобы не получать
+        # 'database is locked' при повышении блокировки (busy_timeout тут не помогает)
+        DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+
+# Шардирование данных пользователей (training_plans/routers.py, ShardRouter).
+# FITGENIUS_DB_SHARDS=N: default — шард 0, shard1..shard{N-1} — отдельные файлы SQLite.
+# Пользователи и сессии остаются в default, на шарды копируются только строки их владельцев.
+USER_SHARDS = []
+_shard_count = int(os.environ.get('FITGENIUS_DB_SHARDS', '1'))
+if _shard_count > 1:
+    USER_SHARDS = ['default']
+    for _i in range(1, _shard_count):
+        DATABASES[f'shard{_i}'] = {**DATABASES['default'], 'NAME': BASE_DIR / f'db_shard{_i}.sqlite3'}
+        USER_SHARDS.append(f'shard{_i}')
+
+# Реплики для чтения (training_plans/routers.py). FITGENIUS_DB_REPLICAS=N добавляет
+# алиасы replica1..replicaN. По умолчанию они открывают тот же файл SQLite отдельными
+# соединениями (локальная замена настоящей реплики); FITGENIUS_DB_REPLICA<i>_NAME
+# указывает другой файл. В тестах реплики — зеркала default.
+DATABASE_REPLICAS = []
+for _i in range(1, int(os.environ.get('FITGENIUS_DB_REPLICAS', '0')) + 1):
+    _alias = f'replica{_i}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get(f'FITGENIUS_DB_REPLICA{_i}_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = [
+    'training_plans.routers.ShardRouter',
+    'training_plans.routers.ReplicaRouter',
+]
+
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_STICKY_SECONDS = 5
+
+# Cache
+# По умолчанию — локальный кэш процесса; FITGENIUS_REDIS_URL (например,
+# redis://127.0.0.1:6379/0) переключает на общий Redis для нескольких воркеров.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fitgenius',
+    }
+}
+if os.environ.get('FITGENIUS_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['FITGENIUS_REDIS_URL'],
+    }
+
+# Сессии читаются из кэша, в базу пишутся только при изменении
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Сколько секунд пользователь и профиль живут в кэше (см. training_plans/caching.py)
+USER_CACHE_TIMEOUT = 300
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -93,6 +223,20 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# FITGENIUS_STATIC_PIPELINE=1: collectstatic кладет в STATIC_ROOT файлы с хешем
+# в имени и их .gz/.br, PrecompressedStaticMiddleware отдает их с
+# Cache-Control: immutable (см. training_plans/storage.py). Без collectstatic
+# middleware отключается. Не зависит от FITGENIUS_DB_PROFILE.
+STATIC_PIPELINE = os.environ.get('FITGENIUS_STATIC_PIPELINE', '0') == '1'
+
+if STATIC_PIPELINE:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'training_plans.storage.CompressedManifestStaticFilesStorage'},
+    }
+    MIDDLEWARE.insert(1, 'training_plans.middleware.PrecompressedStaticMiddleware')
 
 # Media files
 MEDIA_URL = '/media/'
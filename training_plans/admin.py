@@ -1,30 +1,300 @@
-from django.contrib import admin
-from .models import CustomUser, UserProfile, TrainingPlan, Training, Exercise
+from django.contrib import admin, messages
+from django.db.models import Q
+from django.http import QueryDict, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import format_html_join
+from .models import CustomUser, UserProfile, TrainingPlan, Training, Exercise, ArchivedTraining, RequestProfile, PendingDeletion
+from .paginators import EstimatedCountPaginator
+from .exports import stream_profile_pdfs_zip
+from .deletion import delete_or_schedule, delete_account, delete_profile, delete_training
+from .routers import PRIMARY_DB, is_sharded, shard_aliases, shard_for_user, use_shard
+from .profiling import flame_graph, parse_stacks
+
+
+class ScalableAdmin(admin.ModelAdmin):
+	"""Changelist для больших таблиц: без точного COUNT(*) и сортировки вне индекса."""
+	paginator = EstimatedCountPaginator
+	show_full_result_count = False
+	ordering = ('-pk',)
+
+
+def admin_shard(request):
+	"""Шард, данные которого показывает админка, или None без шардирования.
+
+	Берется из ?shard= списка, а на страницах объекта — из сохраненных фильтров
+	списка (_changelist_filters), по которым туда пришли; по умолчанию — шард 0.
+	"""
+	shards = shard_aliases()
+	if not shards:
+		return None
+	alias = request.GET.get(ShardListFilter.parameter_name)
+	if alias is None:
+		alias = QueryDict(request.GET.get('_changelist_filters', '')).get(ShardListFilter.parameter_name)
+	return alias if alias in shards else PRIMARY_DB
+
+
+class ShardListFilter(admin.SimpleListFilter):
+	"""Выбор шарда в списке; варианта «Все» нет — список читает один шард."""
+	title = 'шард'
+	parameter_name = 'shard'
+
+	def lookups(self, request, model_admin):
+		return [(alias, alias) for alias in shard_aliases()]
+
+	def queryset(self, request, queryset):
+		# База уже выбрана в ShardedAdmin.get_queryset
+		return queryset
+
+	def choices(self, changelist):
+		current = self.value() or PRIMARY_DB
+		for alias, title in self.lookup_choices:
+			yield {
+				'selected': alias == current,
+				'query_string': changelist.get_query_string({self.parameter_name: alias}),
+				'display': title,
+			}
+
+
+class ShardedAdmin(ScalableAdmin):
+	"""Админка модели, строки которой лежат на шардах пользователей.
+
+	id уникальны только в пределах шарда, поэтому список, страницы объектов
+	и выбор связанных записей работают с одним шардом (admin_shard). Новый
+	объект сохраняется на шард владельца.
+	"""
+
+	def get_list_filter(self, request):
+		list_filter = super().get_list_filter(request)
+		return (ShardListFilter, *list_filter) if shard_aliases() else list_filter
+
+	def get_queryset(self, request):
+		queryset = super().get_queryset(request)
+		alias = admin_shard(request)
+		return queryset.using(alias) if alias else queryset
+
+	def formfield_for_foreignkey(self, db_field, request, **kwargs):
+		alias = admin_shard(request)
+		if alias and is_sharded(db_field.related_model):
+			kwargs['using'] = alias
+		return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+	def save_model(self, request, obj, form, change):
+		if change or not shard_aliases():
+			return super().save_model(request, obj, form, change)
+		owner_id = getattr(obj, 'user_id', None)
+		obj.save(using=shard_for_user(owner_id) if owner_id is not None else admin_shard(request))
+
+	def get_deleted_objects(self, objs, request):
+		# Сборщик каскада выбирает базу роутером без instance
+		with use_shard(admin_shard(request)):
+			return super().get_deleted_objects(objs, request)
+
+
+class BulkDeleteAdmin(ScalableAdmin):
+	"""Удаление через training_plans.deletion: дочерние строки — пачками DELETE.
+
+	Страница подтверждения показывает число связанных строк по моделям вместо
+	списка всех объектов, который сборщик каскада собирал бы в памяти.
+	"""
+
+	# Функция из training_plans.deletion, удаляющая объект вместе с дочерними строками
+	delete_function = None
+
+	def bulk_delete(self, obj, row_count):
+		"""Удаляет `obj` через delete_function; True — удаление продолжится в фоне."""
+		return delete_or_schedule(self.delete_function, obj, row_count)
+
+	def related_counts(self, obj):
+		"""{модель: число строк}, которые удалятся вместе с `obj`."""
+		return {}
+
+	def delete_model(self, request, obj):
+		if self.bulk_delete(obj, sum(self.related_counts(obj).values())):
+			self.message_user(request, (
+				f'«{obj}»: данных много, удаление продолжится в фоне. Пока оно не завершится, задание видно '
+				f'в «Отложенных удалениях»; прерванные задания доделывает manage.py process_deletions.'
+			), messages.WARNING)
+
+	def delete_queryset(self, request, queryset):
+		for obj in queryset:
+			self.delete_model(request, obj)
+
+	def get_deleted_objects(self, objs, request):
+		deleted_objects, model_count, perms_needed = [], {}, set()
+		for obj in objs:
+			counts = self.related_counts(obj)
+			deleted_objects.append(f'{self.model._meta.verbose_name}: {obj}')
+			deleted_objects.append([f'{model._meta.verbose_name_plural}: {count}' for model, count in counts.items() if count])
+			for model, count in counts.items():
+				if not count:
+					continue
+				model_count[model._meta.verbose_name_plural] = model_count.get(model._meta.verbose_name_plural, 0) + count
+				opts = model._meta
+				if not request.user.has_perm(f'{opts.app_label}.delete_{opts.model_name}'):
+					perms_needed.add(opts.verbose_name)
+		model_count[self.model._meta.verbose_name_plural] = len(objs)
+		return deleted_objects, model_count, perms_needed, []
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(BulkDeleteAdmin):
 	list_display = ('email', 'username', 'is_staff', 'is_active')
 	search_fields = ('email', 'username')
+	search_help_text = 'Поиск по началу email или имени пользователя (с учетом регистра)'
+	delete_function = staticmethod(delete_account)
+
+	def get_search_results(self, request, queryset, search_term):
+		# Префиксный поиск диапазоном по уникальным индексам email и username
+		# вместо LIKE '%...%', который читает всю таблицу
+		term = search_term.strip()
+		if not term:
+			return queryset, False
+		condition = Q()
+		for field in self.search_fields:
+			for prefix in {term, term.lower()}:
+				condition |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+		return queryset.filter(condition), False
+
+	def related_counts(self, obj):
+		alias = shard_for_user(obj.pk)
+		return {
+			Training: Training.objects.using(alias).filter(user_id=obj.pk).count(),
+			Exercise: Exercise.objects.using(alias).filter(training__user_id=obj.pk).count(),
+			ArchivedTraining: ArchivedTraining.objects.using(alias).filter(user_id=obj.pk).count(),
+			UserProfile: UserProfile.objects.using(alias).filter(user_id=obj.pk).count(),
+			TrainingPlan: TrainingPlan.objects.using(alias).filter(user_profile__user_id=obj.pk).count(),
+		}
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(ShardedAdmin, BulkDeleteAdmin):
 	list_display = ('user', 'age', 'height', 'weight', 'goal', 'fitness_level')
+	list_select_related = ('user',)
+	actions = ('export_pdf_zip',)
+	delete_function = staticmethod(delete_profile)
+
+	@admin.action(description='Скачать PDF-планы выбранных профилей (zip)')
+	def export_pdf_zip(self, request, queryset):
+		# Рендер в процессе воркера, без пула процессов; архив отдается по мере
+		# готовности PDF. Для выгрузки всех клиентов — команда export_profile_pdfs
+		response = StreamingHttpResponse(
+			stream_profile_pdfs_zip(queryset, workers=1, aliases=[queryset.db]), content_type='application/zip',
+		)
+		response['Content-Disposition'] = 'attachment; filename="training_plans.zip"'
+		return response
+
+	def related_counts(self, obj):
+		return {TrainingPlan: obj.training_plans.count()}
 
 
 @admin.register(TrainingPlan)
-class TrainingPlanAdmin(admin.ModelAdmin):
+class TrainingPlanAdmin(ShardedAdmin):
 	list_display = ('user_profile', 'day', 'exercise_name', 'sets')
+	list_select_related = ('user_profile__user',)
+
+	# updated_at профиля — версия плана в ключе кэша фрагментов шаблона
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		obj.user_profile.save(update_fields=['updated_at'])
+
+	def delete_model(self, request, obj):
+		super().delete_model(request, obj)
+		obj.user_profile.save(update_fields=['updated_at'])
+
+	def delete_queryset(self, request, queryset):
+		profiles = list(UserProfile.objects.using(queryset.db).filter(training_plans__in=queryset).distinct())
+		super().delete_queryset(request, queryset)
+		for profile in profiles:
+			profile.save(update_fields=['updated_at'])
 
 
 @admin.register(Training)
-class TrainingAdmin(admin.ModelAdmin):
+class TrainingAdmin(ShardedAdmin, BulkDeleteAdmin):
 	list_display = ('title', 'user', 'created_at')
+	list_select_related = ('user',)
 	search_fields = ('title',)
+	delete_function = staticmethod(delete_training)
+
+	def related_counts(self, obj):
+		return {Exercise: obj.exercises.count()}
 
 
 @admin.register(Exercise)
-class ExerciseAdmin(admin.ModelAdmin):
+class ExerciseAdmin(ShardedAdmin):
 	list_display = ('training', 'day', 'name', 'sets', 'reps')
+	list_select_related = ('training__user',)
+
+	# updated_at тренировки входит в ключ кэша фрагментов шаблона
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		obj.training.save(update_fields=['updated_at'])
+
+	def delete_model(self, request, obj):
+		super().delete_model(request, obj)
+		obj.training.save(update_fields=['updated_at'])
+
+	def delete_queryset(self, request, queryset):
+		trainings = list(Training.objects.using(queryset.db).filter(exercises__in=queryset).distinct())
+		super().delete_queryset(request, queryset)
+		for training in trainings:
+			training.save(update_fields=['updated_at'])
+
+
+@admin.register(ArchivedTraining)
+class ArchivedTrainingAdmin(ShardedAdmin):
+	list_display = ('title', 'user', 'exercise_count', 'created_at', 'archived_at')
+	list_select_related = ('user',)
+	exclude = ('payload',)
+	readonly_fields = ('user', 'original_id', 'exercise_count', 'created_at', 'updated_at', 'archived_at')
+
+	def get_queryset(self, request):
+		return super().get_queryset(request).defer('payload')
+
+
+@admin.register(PendingDeletion)
+class PendingDeletionAdmin(admin.ModelAdmin):
+	"""Фоновые удаления, которые еще не завершились или упали."""
+	list_display = ('kind', 'object_id', 'using', 'attempts', 'created_at', 'last_error')
+	list_filter = ('kind',)
+	readonly_fields = ('kind', 'object_id', 'using', 'attempts', 'last_error', 'created_at')
+
+	def has_add_permission(self, request):
+		return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+	"""Самые медленные профилированные запросы и их flame graph."""
+	list_display = ('url_name', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms', 'user', 'created_at')
+	list_filter = ('url_name', 'method')
+	list_select_related = ('user',)
+	ordering = ('-duration_ms',)
+	fields = (
+		'url_name', 'method', 'path', 'status_code', 'user', 'created_at',
+		'duration_ms', 'sql_count', 'sql_ms', 'sample_count', 'interval_ms',
+		'flame_graph', 'slowest_queries',
+	)
+	readonly_fields = fields
+
+	def get_queryset(self, request):
+		# Стеки и SQL нужны только на странице профиля, там они догружаются отдельно
+		return super().get_queryset(request).defer('stacks', 'queries')
+
+	def has_add_permission(self, request):
+		return False
+
+	@admin.display(description='Flame graph')
+	def flame_graph(self, obj):
+		stacks = parse_stacks(obj.stacks)
+		boxes = flame_graph(stacks)
+		return render_to_string('training_plans/flame_graph.html', {
+			'boxes': boxes,
+			'total': sum(stacks.values()),
+			'height': (max((box['depth'] for box in boxes), default=0) + 1) * 18,
+		})
 
+	@admin.display(description='Самые долгие SQL')
+	def slowest_queries(self, obj):
+		return format_html_join('', '<div><b>{} мс</b> [{}] <code>{}</code></div>', (
+			(query['ms'], query['alias'], query['sql']) for query in obj.queries
+		))
@@ -0,0 +1,29 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class TrainingPlansConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'training_plans'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_save, post_delete
+        from django.core.signals import setting_changed
+        from .sqlite import apply_sqlite_pragmas
+        from .profiling import install_sql_timer
+        from .sharding import mirror_user_on_save, drop_user_on_delete
+        from .caching import invalidate_user, invalidate_profile
+        from .models import UserProfile
+        from .throttling import reset_admission_backend
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='training_plans.sqlite_pragmas')
+        connection_created.connect(install_sql_timer, dispatch_uid='training_plans.sql_timer')
+        user_model = get_user_model()
+        post_save.connect(mirror_user_on_save, sender=user_model, dispatch_uid='training_plans.mirror_user')
+        post_delete.connect(drop_user_on_delete, sender=user_model, dispatch_uid='training_plans.drop_user')
+        post_save.connect(invalidate_user, sender=user_model, dispatch_uid='training_plans.invalidate_user_save')
+        post_delete.connect(invalidate_user, sender=user_model, dispatch_uid='training_plans.invalidate_user_delete')
+        post_save.connect(invalidate_profile, sender=UserProfile, dispatch_uid='training_plans.invalidate_profile_save')
+        post_delete.connect(invalidate_profile, sender=UserProfile, dispatch_uid='training_plans.invalidate_profile_delete')
+        setting_changed.connect(reset_admission_backend, dispatch_uid='training_plans.reset_admission_backend')
@@ -0,0 +1,103 @@
+"""Архивация давно не менявшихся тренировок.
+
+Тренировка и ее упражнения переносятся в одну строку ArchivedTraining со
+сжатым gzip JSON, поэтому горячие таблицы Training/Exercise и их индексы
+не растут за счет старых данных. Архивная тренировка открывается прямо из
+архива и по запросу восстанавливается обратно в Training.
+"""
+import gzip
+import json
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Training, Exercise, ArchivedTraining
+from .routers import PRIMARY_DB
+
+
+PAYLOAD_VERSION = 1
+EXERCISE_FIELDS = ('day', 'name', 'sets', 'reps', 'rest_time', 'notes')
+
+
+def pack_training(training, exercises):
+    data = {
+        'v': PAYLOAD_VERSION,
+        'description': training.description,
+        'fields': EXERCISE_FIELDS,
+        'exercises': [[getattr(exercise, field) for field in EXERCISE_FIELDS] for exercise in exercises],
+    }
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return gzip.compress(raw, compresslevel=9)
+
+
+def unpack_training(archived):
+    """Словарь с description и exercises (несохраненные Exercise в исходном порядке)."""
+    data = json.loads(gzip.decompress(bytes(archived.payload)).decode('utf-8'))
+    fields = data['fields']
+    return {
+        'description': data['description'],
+        'exercises': [Exercise(**dict(zip(fields, row))) for row in data['exercises']],
+    }
+
+
+def archive_trainings(cutoff, using=PRIMARY_DB, batch_size=500, user_id=None, dry_run=False):
+    """Переносит в архив тренировки базы `using`, не менявшиеся с `cutoff`.
+
+    Каждая пачка выбирается, архивируется и удаляется в одной транзакции, так что
+    тренировка, измененная во время архивации, остается в горячей таблице.
+    Возвращает (тренировок, упражнений).
+    """
+    exercises_ordered = Prefetch('exercises', queryset=Exercise.objects.order_by('pk'))
+    trainings_done = exercises_done = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic(using=using):
+            queryset = Training.objects.using(using).filter(updated_at__lt=cutoff, pk__gt=last_pk)
+            if user_id is not None:
+                queryset = queryset.filter(user_id=user_id)
+            batch = list(queryset.order_by('pk').prefetch_related(exercises_ordered)[:batch_size])
+            if not batch:
+                return trainings_done, exercises_done
+            last_pk = batch[-1].pk
+            archived = []
+            for training in batch:
+                exercises = list(training.exercises.all())
+                archived.append(ArchivedTraining(
+                    user_id=training.user_id,
+                    original_id=training.pk,
+                    title=training.title,
+                    exercise_count=len(exercises),
+                    created_at=training.created_at,
+                    updated_at=training.updated_at,
+                    payload=pack_training(training, exercises),
+                ))
+                exercises_done += len(exercises)
+            trainings_done += len(batch)
+            if dry_run:
+                continue
+            ArchivedTraining.objects.using(using).bulk_create(archived)
+            ids = [training.pk for training in batch]
+            # Упражнения и тренировки без сигналов и каскадов, как в deletion.delete_chunked
+            Exercise.objects.using(using).filter(training_id__in=ids)._raw_delete(using)
+            Training.objects.using(using).filter(pk__in=ids)._raw_delete(using)
+
+
+def restore_training(archived):
+    """Возвращает тренировку из архива в горячие таблицы (с новым id) и удаляет архивную строку.
+
+    created_at сохраняется, updated_at становится текущим, чтобы тренировку
+    не заархивировало снова при следующем запуске.
+    """
+    using = archived._state.db or PRIMARY_DB
+    data = unpack_training(archived)
+    with transaction.atomic(using=using):
+        training = Training.objects.using(using).create(
+            user_id=archived.user_id, title=archived.title, description=data['description'],
+        )
+        for exercise in data['exercises']:
+            exercise.training = training
+        Exercise.objects.using(using).bulk_create(data['exercises'])
+        Training.objects.using(using).filter(pk=training.pk).update(created_at=archived.created_at)
+        training.created_at = archived.created_at
+        archived.delete(using=using)
+    return training
@@ -0,0 +1,19 @@
+"""Маршруты асинхронных представлений (ASYNC_VIEWS).
+
+Пути и имена совпадают с training_plans/urls.py; при ASYNC_VIEWS эти маршруты
+стоят первыми и перекрывают синхронные.
+"""
+from django.urls import path
+
+from . import async_views
+
+app_name = 'training_plans'
+
+urlpatterns = [
+    path('profiles/', async_views.profile_list, name='profile_list'),
+    path('profiles/<int:pk>/', async_views.profile_detail, name='profile_detail'),
+    path('profiles/<int:pk>/export-pdf/', async_views.export_training_plan_pdf, name='export_pdf'),
+    path('trainings/', async_views.training_list, name='training_list'),
+    path('trainings/<int:pk>/', async_views.training_detail, name='training_detail'),
+    path('trainings/<int:pk>/export/', async_views.export_training_xlsx, name='training_export'),
+]
@@ -0,0 +1,149 @@
+"""Асинхронные версии горячих представлений: списки, детали и экспорты.
+
+Подключаются в training_plans/urls.py при ASYNC_VIEWS (см. fitgenius_project/asgi.py).
+Данные загружаются асинхронным ORM целиком до рендера шаблона, поэтому
+шаблоны не делают синхронных запросов в цикле событий. ReportLab и openpyxl
+работают в ограниченном пуле потоков: пока файл рендерится или медленно
+скачивается, воркер продолжает обслуживать остальные запросы.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import redirect, render
+
+from .caching import aget_profile
+from .exports import (
+    XLSX_CONTENT_TYPE,
+    attachment_response,
+    profile_pdf_data,
+    profile_pdf_filename,
+    render_profile_pdf,
+    render_training_xlsx,
+    training_xlsx_data,
+    training_xlsx_filename,
+)
+from .models import Training, ArchivedTraining
+from .routers import read_only_view
+from .throttling import admission_controlled
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def export_executor():
+    """Общий на процесс пул для рендера экспортов (EXPORT_MAX_WORKERS потоков)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_MAX_WORKERS', 4),
+                thread_name_prefix='fitgenius-export',
+            )
+    return _executor
+
+
+async def run_export(render_func, data):
+    """Выполняет рендер экспорта в пуле, не блокируя цикл событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(export_executor(), render_func, data)
+
+
+def login_required(view_func):
+    """Асинхронный login_required; заодно загружает request.user для шаблонов."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+async def _get_own_profile(request, pk):
+    profile = await aget_profile(request)
+    if profile is None or profile.pk != pk:
+        raise Http404('Профиль не найден')
+    return profile
+
+
+async def _get_own_training(request, pk, *prefetch):
+    training = await Training.objects.prefetch_related(*prefetch).filter(pk=pk).afirst()
+    if training is None:
+        raise Http404('Тренировка не найдена')
+    if training.user_id != request.user.pk:
+        raise PermissionDenied
+    return training
+
+
+@read_only_view
+@login_required
+async def profile_list(request):
+    profile = await aget_profile(request)
+    profiles = [profile] if profile is not None else []
+    return render(request, 'training_plans/profile_list.html', {'profiles': profiles, 'object_list': profiles})
+
+
+@read_only_view
+@login_required
+async def profile_detail(request, pk):
+    profile = await _get_own_profile(request, pk)
+    plans = [plan async for plan in profile.training_plans.all().order_by('day')]
+    return render(request, 'training_plans/profile_detail.html', {
+        'object': profile,
+        'userprofile': profile,
+        'training_plans': plans,
+    })
+
+
+@read_only_view
+@login_required
+async def training_list(request):
+    trainings = [
+        training async for training in Training.objects.filter(user=request.user).order_by('-created_at')
+    ]
+    return render(request, 'training_plans/training_list.html', {'trainings': trainings, 'object_list': trainings})
+
+
+@read_only_view
+@login_required
+async def training_detail(request, pk):
+    try:
+        training = await _get_own_training(request, pk, 'exercises')
+    except Http404:
+        # Старые ссылки на заархивированную тренировку ведут в архив
+        archived = await ArchivedTraining.objects.filter(user=request.user, original_id=pk).only('pk').afirst()
+        if archived is None:
+            raise
+        return redirect('training_plans:archived_training_detail', pk=archived.pk)
+    return render(request, 'training_plans/training_detail.html', {'object': training, 'training': training})
+
+
+@read_only_view
+@login_required
+@admission_controlled
+async def export_training_plan_pdf(request, pk):
+    profile = await _get_own_profile(request, pk)
+    plans = [plan async for plan in profile.training_plans.all().order_by('day')]
+    data = profile_pdf_data(profile, plans)
+    content = await run_export(render_profile_pdf, data)
+    return attachment_response(content, 'application/pdf', profile_pdf_filename(data))
+
+
+@read_only_view
+@login_required
+@admission_controlled
+async def export_training_xlsx(request, pk):
+    training = await Training.objects.filter(pk=pk, user=request.user).afirst()
+    if training is None:
+        raise Http404('Тренировка не найдена')
+    exercises = [exercise async for exercise in training.exercises.all()]
+    data = training_xlsx_data(training, exercises)
+    content = await run_export(render_training_xlsx, data)
+    return attachment_response(content, XLSX_CONTENT_TYPE, training_xlsx_filename(data))
@@ -1,6 +1,9 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
+from .caching import get_cached_user
+from .routers import PRIMARY_DB
+
 
 class EmailBackend(ModelBackend):
     """Authenticate using an email address (case-insensitive)."""
@@ -18,3 +21,17 @@ class EmailBackend(ModelBackend):
             if user.check_password(password) and self.user_can_authenticate(user):
                 return user
         return None
+
+    def get_user(self, user_id):
+        """Загружает пользователя сессии через кэш (сбрасывается при сохранении)."""
+        return get_cached_user(user_id, self._load_user)
+
+    def _load_user(self, user_id):
+        # Из основной базы, а не с реплики: отстающая реплика вернула бы в кэш
+        # старую строку сразу после его сброса при сохранении
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.using(PRIMARY_DB).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
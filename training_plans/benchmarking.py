@@ -0,0 +1,22 @@
+import time
+from contextlib import contextmanager
+
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def isolated_databases():
+    """Временные тестовые базы для бенчмарков: рабочие данные не затрагиваются."""
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def timeit(func, repeat):
+    """Среднее время вызова `func` в миллисекундах."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
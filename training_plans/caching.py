@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserProfile
+from .routers import shard_for_user
+
+
+# Маркер «профиля нет», чтобы не путать его с промахом кэша
+_NO_PROFILE = 'none'
+
+
+def user_cache_key(user_id):
+    return f'fg:user:{user_id}'
+
+
+def profile_cache_key(user_id):
+    return f'fg:profile:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def get_cached_user(user_id, loader):
+    """Пользователь из кэша; при промахе — `loader(user_id)` и запись в кэш."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = loader(user_id)
+        if user is not None:
+            cache.set(key, user, _timeout())
+    return user
+
+
+def get_profile(request):
+    """Профиль текущего пользователя или None.
+
+    Запоминается на объекте запроса и в кэше, поэтому повторные обращения
+    в рамках запроса и между запросами не ходят в базу до сохранения профиля.
+
+    При промахе профиль читается с шарда пользователя, а не с реплики: в кэш
+    не попадет строка, которую отстающая реплика еще не обновила, а
+    закэшированный объект сохраняется туда же, откуда прочитан.
+    """
+    if hasattr(request, '_cached_profile'):
+        return request._cached_profile
+    user = request.user
+    profile = None
+    if user.is_authenticated:
+        key = profile_cache_key(user.pk)
+        profile = cache.get(key)
+        if profile is None:
+            profile = UserProfile.objects.using(shard_for_user(user.pk)).filter(user=user).first()
+            cache.set(key, profile if profile is not None else _NO_PROFILE, _timeout())
+        elif profile == _NO_PROFILE:
+            profile = None
+        if profile is not None:
+            # Подставляем пользователя запроса, а не копию из кэша
+            profile.user = user
+    request._cached_profile = profile
+    return profile
+
+
+async def aget_profile(request):
+    """Асинхронный вариант get_profile для async-представлений.
+
+    Ожидает, что request.user уже загружен (await request.auser()).
+    """
+    if hasattr(request, '_cached_profile'):
+        return request._cached_profile
+    user = request.user
+    profile = None
+    if user.is_authenticated:
+        key = profile_cache_key(user.pk)
+        profile = await cache.aget(key)
+        if profile is None:
+            profile = await UserProfile.objects.using(shard_for_user(user.pk)).filter(user=user).afirst()
+            await cache.aset(key, profile if profile is not None else _NO_PROFILE, _timeout())
+        elif profile == _NO_PROFILE:
+            profile = None
+        if profile is not None:
+            profile.user = user
+    request._cached_profile = profile
+    return profile
+
+
+def invalidate_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+def invalidate_profile(sender, instance, **kwargs):
+    cache.delete(profile_cache_key(instance.user_id))
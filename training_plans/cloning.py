@@ -0,0 +1,132 @@
+"""Копирование тренировок и превращение сгенерированного плана в тренировку.
+
+Упражнения копируются на стороне базы одним INSERT ... SELECT: строки не
+выбираются в Python и не превращаются в объекты моделей. Для клонирования
+шаблона многим клиентам новые тренировки создаются одним bulk_create, а
+упражнения шаблона размножаются на все новые тренировки тем же
+INSERT ... SELECT через CROSS JOIN — несколько запросов на шард независимо от
+числа клиентов. Всё для одного шарда выполняется в одной транзакции.
+
+Если тренировка-источник лежит на другом шарде (другой файл SQLite), SQL между
+базами не работает: упражнения шаблона читаются один раз через values() и
+записываются bulk_create.
+"""
+from django.db import connections, transaction
+
+from .models import Training, Exercise, TrainingPlan
+from .routers import PRIMARY_DB, shard_for_user
+
+
+# Поле Exercise <- поле источника
+EXERCISE_FROM_EXERCISE = {
+    'day': 'day',
+    'name': 'name',
+    'sets': 'sets',
+    'reps': 'reps',
+    'rest_time': 'rest_time',
+    'notes': 'notes',
+}
+EXERCISE_FROM_PLAN = {**EXERCISE_FROM_EXERCISE, 'name': 'exercise_name'}
+
+# Тренировок на один INSERT ... SELECT (число параметров в IN)
+CLONE_BATCH_SIZE = 500
+
+
+def _insert_exercises(using, source_model, field_map, source_filter, source_id, training_ids):
+    """INSERT INTO exercise ... SELECT из строк `source_model` с `source_filter` = source_id
+    для каждой тренировки из training_ids; возвращает число вставленных строк."""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    source = source_model._meta
+    target = Exercise._meta
+    training_pk = qn(Training._meta.pk.column)
+    columns = [target.get_field('training').column] + [target.get_field(name).column for name in field_map]
+    selected = [f't.{training_pk}'] + [f's.{qn(source.get_field(name).column)}' for name in field_map.values()]
+    placeholders = ', '.join(['%s'] * len(training_ids))
+    sql = (
+        f'INSERT INTO {qn(target.db_table)} ({", ".join(qn(column) for column in columns)}) '
+        f'SELECT {", ".join(selected)} '
+        f'FROM {qn(source.db_table)} s CROSS JOIN {qn(Training._meta.db_table)} t '
+        f'WHERE s.{qn(source.get_field(source_filter).column)} = %s AND t.{training_pk} IN ({placeholders}) '
+        # Порядок упражнений в копии — как в источнике
+        f'ORDER BY t.{training_pk}, s.{qn(source.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [source_id, *training_ids])
+        return cursor.rowcount
+
+
+def _bulk_copy_exercises(source_using, target_using, source_id, training_ids):
+    """Копирование между шардами: упражнения читаются один раз и пишутся bulk_create."""
+    fields = list(EXERCISE_FROM_EXERCISE)
+    rows = list(
+        Exercise.objects.using(source_using).filter(training_id=source_id)
+        .order_by('pk').values_list(*fields)
+    )
+    Exercise.objects.using(target_using).bulk_create(
+        [Exercise(training_id=training_id, **dict(zip(fields, row))) for training_id in training_ids for row in rows],
+        batch_size=1000,
+    )
+    return len(rows) * len(training_ids)
+
+
+def _copy_title(training):
+    return f'{training.title} (копия)'[:Training._meta.get_field('title').max_length]
+
+
+def clone_training_to_users(training, users, title=None, batch_size=CLONE_BATCH_SIZE):
+    """Создает копию `training` (с упражнениями) для каждого пользователя из `users`.
+
+    Возвращает (тренировок, упражнений).
+    """
+    source_using = training._state.db or PRIMARY_DB
+    by_shard = {}
+    for user in users:
+        by_shard.setdefault(shard_for_user(user.pk), []).append(user)
+    trainings_done = exercises_done = 0
+    for using, shard_users in by_shard.items():
+        with transaction.atomic(using=using):
+            for start in range(0, len(shard_users), batch_size):
+                created = Training.objects.using(using).bulk_create([
+                    Training(user_id=user.pk, title=title or training.title, description=training.description)
+                    for user in shard_users[start:start + batch_size]
+                ])
+                ids = [copy.pk for copy in created]
+                if using == source_using:
+                    exercises_done += _insert_exercises(using, Exercise, EXERCISE_FROM_EXERCISE, 'training', training.pk, ids)
+                else:
+                    exercises_done += _bulk_copy_exercises(source_using, using, training.pk, ids)
+                trainings_done += len(ids)
+    return trainings_done, exercises_done
+
+
+def clone_training(training, user=None, title=None):
+    """Копия тренировки для владельца или `user`; возвращает новую тренировку."""
+    owner_id = user.pk if user is not None else training.user_id
+    using = shard_for_user(owner_id)
+    source_using = training._state.db or PRIMARY_DB
+    with transaction.atomic(using=using):
+        copy = Training.objects.using(using).create(
+            user_id=owner_id, title=title or _copy_title(training), description=training.description,
+        )
+        if using == source_using:
+            _insert_exercises(using, Exercise, EXERCISE_FROM_EXERCISE, 'training', training.pk, [copy.pk])
+        else:
+            _bulk_copy_exercises(source_using, using, training.pk, [copy.pk])
+    return copy
+
+
+def training_from_plan(profile, title=None):
+    """Редактируемая тренировка из сгенерированного плана профиля (TrainingPlan)."""
+    using = profile._state.db or PRIMARY_DB
+    with transaction.atomic(using=using):
+        training = Training.objects.using(using).create(
+            user_id=profile.user_id,
+            title=title or f'План: {profile.get_goal_display()}',
+            description=(
+                f'Создано из персонального плана. Возраст {profile.age}, ИМТ {profile.calculate_bmi()}, '
+                f'уровень: {profile.get_fitness_level_display().lower()}.'
+            ),
+        )
+        _insert_exercises(using, TrainingPlan, EXERCISE_FROM_PLAN, 'user_profile', profile.pk, [training.pk])
+    return training
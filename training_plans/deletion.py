@@ -0,0 +1,161 @@
+"""Быстрое удаление профилей, тренировок и аккаунтов.
+
+Сборщик каскада Django загружает в память каждую строку моделей с вложенными
+связями (все тренировки аккаунта, все профили) и удаляет все одной транзакцией,
+которая держит блокировку записи до конца. Здесь дочерние строки удаляются
+пачками DELETE по диапазону первичного ключа, каждая пачка — в своей
+транзакции, а родитель удаляется обычным delete() уже без детей, с сигналами
+(сброс кэша профиля, копии пользователя на шарде).
+
+Если процесс прервется, часть дочерних строк уже будет удалена; повторный
+вызов доудаляет оставшееся. Поэтому фоновые удаления записываются в
+PendingDeletion до запуска: незавершенные (воркер перезапустился, удаление
+упало) доделывает manage.py process_deletions.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import UserProfile, TrainingPlan, Training, Exercise, ArchivedTraining, PendingDeletion
+from .routers import PRIMARY_DB, shard_for_user
+
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_size(chunk_size):
+    return chunk_size or getattr(settings, 'BULK_DELETE_CHUNK_SIZE', 5000)
+
+
+def delete_chunked(queryset, using, chunk_size=None):
+    """Удаляет строки `queryset` на базе `using` пачками; возвращает число удаленных строк.
+
+    Сигналы pre_delete/post_delete не отправляются — только для моделей без
+    обработчиков и без собственных каскадов.
+    """
+    chunk_size = _chunk_size(chunk_size)
+    queryset = queryset.using(using).order_by()
+    deleted = 0
+    while True:
+        with transaction.atomic(using=using):
+            # Граница пачки — pk chunk_size-й строки; сами id в Python не выбираются
+            bound = list(queryset.order_by('pk').values_list('pk', flat=True)[chunk_size - 1:chunk_size])
+            chunk = queryset.filter(pk__lte=bound[0]) if bound else queryset
+            # _raw_delete — один DELETE по условию, как быстрый путь сборщика каскада
+            deleted += chunk._raw_delete(using)
+        if not bound:
+            return deleted
+
+
+def delete_training(training, chunk_size=None):
+    using = training._state.db or PRIMARY_DB
+    deleted = delete_chunked(Exercise.objects.filter(training_id=training.pk), using, chunk_size)
+    training.delete(using=using)
+    return deleted + 1
+
+
+def delete_profile(profile, chunk_size=None):
+    using = profile._state.db or PRIMARY_DB
+    deleted = delete_chunked(TrainingPlan.objects.filter(user_profile_id=profile.pk), using, chunk_size)
+    profile.delete(using=using)
+    return deleted + 1
+
+
+def delete_account(user, chunk_size=None):
+    """Удаляет пользователя со всеми тренировками, упражнениями, профилем и планом."""
+    alias = shard_for_user(user.pk)
+    deleted = delete_chunked(Exercise.objects.filter(training__user_id=user.pk), alias, chunk_size)
+    deleted += delete_chunked(Training.objects.filter(user_id=user.pk), alias, chunk_size)
+    deleted += delete_chunked(ArchivedTraining.objects.filter(user_id=user.pk), alias, chunk_size)
+    deleted += delete_chunked(TrainingPlan.objects.filter(user_profile__user_id=user.pk), alias, chunk_size)
+    for profile in UserProfile.objects.using(alias).filter(user_id=user.pk):
+        profile.delete(using=alias)
+        deleted += 1
+    user.delete(using=PRIMARY_DB)
+    return deleted + 1
+
+
+def account_row_count(user):
+    """Сколько дочерних строк удалит delete_account (без самого пользователя и профиля)."""
+    alias = shard_for_user(user.pk)
+    return (
+        Exercise.objects.using(alias).filter(training__user_id=user.pk).count()
+        + Training.objects.using(alias).filter(user_id=user.pk).count()
+        + ArchivedTraining.objects.using(alias).filter(user_id=user.pk).count()
+        + TrainingPlan.objects.using(alias).filter(user_profile__user_id=user.pk).count()
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _background_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Один поток: крупные удаления идут по очереди и не конкурируют за запись
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fitgenius-delete')
+    return _executor
+
+
+def run_in_background(func, *args, **kwargs):
+    def task():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception('Фоновое удаление %s не завершилось', getattr(func, '__name__', func))
+        finally:
+            connections.close_all()
+    return _background_executor().submit(task)
+
+
+def _deletion_kinds():
+    # Вид задания -> (модель, функция удаления)
+    return {
+        'account': (get_user_model(), delete_account),
+        'profile': (UserProfile, delete_profile),
+        'training': (Training, delete_training),
+    }
+
+
+def run_pending_deletion(job, chunk_size=None):
+    """Выполняет задание PendingDeletion и удаляет его строку.
+
+    Объект, которого уже нет, считается удаленным. При ошибке задание остается
+    с увеличенным attempts и текстом ошибки, исключение пробрасывается.
+    """
+    model, func = _deletion_kinds()[job.kind]
+    obj = model._default_manager.using(job.using).filter(pk=job.object_id).first()
+    try:
+        if obj is not None:
+            func(obj, chunk_size)
+    except Exception as exc:
+        PendingDeletion.objects.using(PRIMARY_DB).filter(pk=job.pk).update(
+            attempts=F('attempts') + 1, last_error=repr(exc),
+        )
+        raise
+    PendingDeletion.objects.using(PRIMARY_DB).filter(pk=job.pk).delete()
+
+
+def delete_or_schedule(func, obj, row_count, chunk_size=None):
+    """Удаляет `obj` функцией `func` сразу или, если строк больше
+    BULK_DELETE_BACKGROUND_THRESHOLD, в фоновом потоке. True — удаление отложено.
+
+    Отложенное удаление сначала записывается в PendingDeletion, так что
+    перезапуск воркера его не теряет.
+    """
+    if row_count > getattr(settings, 'BULK_DELETE_BACKGROUND_THRESHOLD', 50000):
+        kind = next(kind for kind, (_, known) in _deletion_kinds().items() if known is func)
+        job = PendingDeletion.objects.using(PRIMARY_DB).create(
+            kind=kind, object_id=obj.pk, using=obj._state.db or PRIMARY_DB,
+        )
+        run_in_background(run_pending_deletion, job, chunk_size)
+        return True
+    func(obj, chunk_size)
+    return False
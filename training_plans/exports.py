@@ -1,70 +1,302 @@
-from io import BytesIO
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, RawIOBase
+from itertools import islice
+
 from django.http import HttpResponse
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import openpyxl
 
+# reportlab и openpyxl импортируются внутри функций: они тяжелые, а нужны только
+# при экспорте, поэтому воркеры и manage.py не платят за них при старте.
+#
+# Рендеры работают с обычными словарями и списками, а не с моделями: их можно
+# вызывать в пуле потоков или процессов, не трогая базу и не передавая туда ORM-объекты.
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# (стиль шрифта, размер) для элементов PDF
+PDF_STYLES = {
+    'title': ('bold', 16),
+    'header': ('regular', 12),
+    'day': ('bold', 12),
+    'line': ('regular', 11),
+    'note': ('italic', 10),
+}
+
+_pdf_fonts = None
+_pdf_fonts_lock = threading.Lock()
+
+
+def profile_pdf_data(profile, plans=None):
+    """Данные для render_profile_pdf. `plans` — уже загруженные TrainingPlan в порядке дней."""
+    if plans is None:
+        plans = profile.training_plans.all().order_by('day')
+    return {
+        'email': profile.user.email,
+        'username': profile.user.username,
+        'age': profile.age,
+        'height': profile.height,
+        'weight': profile.weight,
+        'goal': profile.get_goal_display(),
+        'fitness_level': profile.get_fitness_level_display(),
+        'plans': [
+            (item.get_day_display(), item.exercise_name, item.sets, item.reps, item.rest_time, item.notes)
+            for item in plans
+        ],
+    }
+
+
+def find_pdf_fonts():
+    """Пути к TTF с кириллицей по стилям из первой подходящей PDF_FONT_DIRS.
+
+    Встроенные шрифты reportlab не содержат кириллицы, поэтому без TTF
+    экспорт не выполняется, а не выдает PDF с пустыми квадратами.
+    """
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+
+    files = getattr(settings, 'PDF_FONT_FILES', {})
+    directories = getattr(settings, 'PDF_FONT_DIRS', [])
+    for directory in directories:
+        paths = {style: os.path.join(directory, name) for style, name in files.items()}
+        if paths and all(os.path.isfile(path) for path in paths.values()):
+            return paths
+    raise ImproperlyConfigured(
+        f"Шрифты для PDF ({', '.join(files.values())}) не найдены в PDF_FONT_DIRS: "
+        f"{', '.join(str(directory) for directory in directories)}"
+    )
+
+
+def register_pdf_fonts(paths=None):
+    """Регистрирует шрифты в reportlab один раз на процесс и возвращает их имена по стилям.
+
+    `paths` передается в процессы пакетной выгрузки, чтобы им не нужны были настройки Django.
+    """
+    global _pdf_fonts
+    with _pdf_fonts_lock:
+        if _pdf_fonts is None:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            if paths is None:
+                paths = find_pdf_fonts()
+            fonts = {}
+            for style, path in paths.items():
+                fonts[style] = f'FitGenius-{style}'
+                pdfmetrics.registerFont(TTFont(fonts[style], path))
+            # Отдельного курсива нет — примечания пишутся обычным начертанием
+            fonts.setdefault('italic', fonts['regular'])
+            _pdf_fonts = fonts
+    return _pdf_fonts
+
+
+class _PdfWriter:
+    """Пишет строки на canvas, вызывая setFont только при смене стиля."""
+
+    def __init__(self, canvas, fonts):
+        self.canvas = canvas
+        self.fonts = fonts
+        self.font = None
+
+    def text(self, x, y, text, style):
+        font = (self.fonts[style[0]], style[1])
+        if font != self.font:
+            self.canvas.setFont(*font)
+            self.font = font
+        self.canvas.drawString(x, y, text)
+
+    def show_page(self):
+        self.canvas.showPage()
+        # reportlab сбрасывает шрифт на новой странице
+        self.font = None
+
+
+def render_profile_pdf(data):
+    """PDF с планом профиля в виде bytes."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
 
-def export_profile_pdf_response(profile):
-    """Return HttpResponse with a PDF for a given `UserProfile` instance."""
     buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
+    p = _PdfWriter(canvas.Canvas(buffer, pagesize=A4), register_pdf_fonts())
     width, height = A4
 
     # Заголовок
-    p.setFont('Helvetica-Bold', 16)
-    p.drawString(40, height - 50, f"Тренировочный план для: {profile.user.email}")
-    p.setFont('Helvetica', 12)
-    p.drawString(40, height - 70, f"Возраст: {profile.age}  Рост: {profile.height} см  Вес: {profile.weight} кг")
-    p.drawString(40, height - 90, f"Цель: {profile.get_goal_display()}  Уровень: {profile.get_fitness_level_display()}")
+    p.text(40, height - 50, f"Тренировочный план для: {data['email']}", PDF_STYLES['title'])
+    p.text(40, height - 70, f"Возраст: {data['age']}  Рост: {data['height']} см  Вес: {data['weight']} кг", PDF_STYLES['header'])
+    p.text(40, height - 90, f"Цель: {data['goal']}  Уровень: {data['fitness_level']}", PDF_STYLES['header'])
 
     y = height - 120
-    p.setFont('Helvetica-Bold', 14)
     current_day = None
-    plans = profile.training_plans.all().order_by('day')
-    for item in plans:
+    for day, exercise_name, sets, reps, rest_time, notes in data['plans']:
         if y < 100:
-            p.showPage()
+            p.show_page()
             y = height - 50
-        if current_day != item.get_day_display():
-            current_day = item.get_day_display()
-            p.setFont('Helvetica-Bold', 12)
-            p.drawString(40, y, current_day)
+        if current_day != day:
+            current_day = day
+            p.text(40, y, current_day, PDF_STYLES['day'])
             y -= 18
-        p.setFont('Helvetica', 11)
-        line = f"- {item.exercise_name} | Подходы: {item.sets} | Повторы: {item.reps} | Отдых: {item.rest_time}"
-        p.drawString(50, y, line)
+        line = f"- {exercise_name} | Подходы: {sets} | Повторы: {reps} | Отдых: {rest_time}"
+        p.text(50, y, line, PDF_STYLES['line'])
         y -= 16
-        if item.notes:
-            p.setFont('Helvetica-Oblique', 10)
-            p.drawString(60, y, f"Примечание: {item.notes}")
+        if notes:
+            p.text(60, y, f"Примечание: {notes}", PDF_STYLES['note'])
             y -= 14
 
-    p.showPage()
-    p.save()
+    p.show_page()
+    p.canvas.save()
+    return buffer.getvalue()
 
-    buffer.seek(0)
-    # Return as an attachment with a filename so browsers download the PDF
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    filename = f"training_plan_{profile.user.username}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
 
+def profile_pdf_filename(data):
+    return f"training_plan_{data['username']}.pdf"
+
+
+def profile_pdf_batch_data(queryset, chunk_size=500, aliases=None):
+    """Данные для PDF по профилям из `queryset`: пользователи и планы грузятся пачками.
+
+    Профили читаются по очереди с каждой базы из `aliases`; по умолчанию —
+    со всех шардов (или с базы самого `queryset`, если шардов нет).
+    """
+    from django.db.models import Prefetch
+    from .models import TrainingPlan
+    from .routers import shard_aliases
+
+    if aliases is None:
+        aliases = shard_aliases() or [queryset.db]
+    queryset = queryset.select_related('user').prefetch_related(
+        Prefetch('training_plans', queryset=TrainingPlan.objects.order_by('day'))
+    )
+    for alias in aliases:
+        # Планы догружаются с той же базы: роутер берет ее из профиля
+        for profile in queryset.using(alias).iterator(chunk_size=chunk_size):
+            yield profile_pdf_data(profile, profile.training_plans.all())
+
+
+def _render_profile_pdf_file(data):
+    return profile_pdf_filename(data), render_profile_pdf(data)
+
+
+def render_profile_pdfs(items, workers=None):
+    """Рендерит PDF по данным из `items` и выдает (имя файла, bytes) в том же порядке.
+
+    При workers > 1 рендер идет в пуле процессов; шрифты регистрируются
+    один раз при старте каждого процесса.
+    """
+    if workers is None:
+        from django.conf import settings
+        workers = getattr(settings, 'PDF_BATCH_WORKERS', 1)
+    items = iter(items)
+    if workers <= 1:
+        register_pdf_fonts()
+        for data in items:
+            yield _render_profile_pdf_file(data)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=register_pdf_fonts,
+                             initargs=(find_pdf_fonts(),)) as pool:
+        # Отправляем пачками, чтобы не держать в памяти данные всех профилей сразу
+        while chunk := list(islice(items, workers * 32)):
+            yield from pool.map(_render_profile_pdf_file, chunk, chunksize=8)
+
+
+class _ZipChunks(RawIOBase):
+    """Поток для ZipFile, который копит записанные байты до следующего pop()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_profile_pdfs_zip(queryset, workers=1, aliases=None):
+    """zip-архив PDF профилей из `queryset` кусками bytes — по куску на PDF.
+
+    Для StreamingHttpResponse: архив не собирается в памяти целиком. Поток
+    без seek, поэтому ZipFile пишет размеры файлов после их данных.
+    """
+    stream = _ZipChunks()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for filename, content in render_profile_pdfs(profile_pdf_batch_data(queryset, aliases=aliases), workers):
+            archive.writestr(filename, content)
+            yield stream.pop()
+    yield stream.pop()
+
+
+def write_profile_pdfs_zip(queryset, fileobj, workers=None, aliases=None):
+    """Пишет PDF всех профилей из `queryset` в zip-архив `fileobj`; возвращает их число.
+
+    `aliases` — см. profile_pdf_batch_data.
+    """
+    count = 0
+    # PDF уже сжаты, повторное сжатие только тратит время
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as archive:
+        for filename, content in render_profile_pdfs(profile_pdf_batch_data(queryset, aliases=aliases), workers):
+            archive.writestr(filename, content)
+            count += 1
+    return count
+
+
+def training_xlsx_data(training, exercises=None):
+    """Данные для render_training_xlsx. `exercises` — уже загруженные упражнения тренировки."""
+    if exercises is None:
+        exercises = training.exercises.all()
+    return {
+        'pk': training.pk,
+        'title': training.title,
+        'rows': [
+            (ex.get_day_display(), ex.name, ex.sets, ex.reps, ex.rest_time, ex.notes)
+            for ex in exercises
+        ],
+    }
+
+
+def render_training_xlsx(data):
+    """XLSX с упражнениями тренировки в виде bytes."""
+    import openpyxl
 
-def export_training_xlsx_response(training):
-    """Return HttpResponse with an .xlsx file for a given `Training` instance."""
     wb = openpyxl.Workbook()
     ws = wb.active
-    ws.title = training.title[:30]
+    ws.title = data['title'][:30]
 
     # Header
     ws.append(['День', 'Упражнение', 'Подходы', 'Повторы', 'Отдых', 'Примечания'])
 
-    for ex in training.exercises.all():
-        ws.append([ex.get_day_display(), ex.name, ex.sets, ex.reps, ex.rest_time, ex.notes])
+    for row in data['rows']:
+        ws.append(list(row))
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def training_xlsx_filename(data):
+    return f"training_{data['pk']}.xlsx"
+
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    filename = f"training_{training.pk}.xlsx"
+def attachment_response(content, content_type, filename):
+    # Return as an attachment with a filename so browsers download the file
+    response = HttpResponse(content, content_type=content_type)
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
     return response
+
+
+def export_profile_pdf_response(profile):
+    """Return HttpResponse with a PDF for a given `UserProfile` instance."""
+    data = profile_pdf_data(profile)
+    return attachment_response(render_profile_pdf(data), 'application/pdf', profile_pdf_filename(data))
+
+
+def export_training_xlsx_response(training):
+    """Return HttpResponse with an .xlsx file for a given `Training` instance."""
+    data = training_xlsx_data(training)
+    return attachment_response(render_training_xlsx(data), XLSX_CONTENT_TYPE, training_xlsx_filename(data))
@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.core.validators import validate_email
 from .models import UserProfile, CustomUser
 from .models import Training, Exercise
 from django.forms import inlineformset_factory
@@ -82,4 +83,47 @@ TrainingExerciseFormset = inlineformset_factory(
     form=ExerciseForm,
     extra=1,
     can_delete=True
-)
\ No newline at end of file
+)
+
+class TrainingImportForm(forms.Form):
+    file = forms.FileField(
+        label='Файл CSV или XLSX',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+    def clean_file(self):
+        f = self.cleaned_data['file']
+        if not f.name.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+            raise forms.ValidationError('Поддерживаются только файлы .csv и .xlsx')
+        return f
+
+
+class BulkCloneForm(forms.Form):
+    MAX_EMAILS = 1000
+
+    emails = forms.CharField(
+        label='Email клиентов',
+        help_text='По одному на строку или через запятую',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 8}),
+    )
+    title = forms.CharField(
+        label='Название копий',
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Как у шаблона'}),
+    )
+
+    def clean_emails(self):
+        raw = self.cleaned_data['emails'].replace(',', ' ').replace(';', ' ').split()
+        emails = list(dict.fromkeys(email.strip().lower() for email in raw))
+        invalid = []
+        for email in emails:
+            try:
+                validate_email(email)
+            except forms.ValidationError:
+                invalid.append(email)
+        if invalid:
+            raise forms.ValidationError(f"Некорректные email: {', '.join(invalid[:10])}")
+        if len(emails) > self.MAX_EMAILS:
+            raise forms.ValidationError(f'Не больше {self.MAX_EMAILS} клиентов за раз')
+        return emails
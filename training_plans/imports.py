@@ -0,0 +1,325 @@
+import codecs
+import csv
+import io
+import os
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .models import Training, Exercise, TrainingPlan
+from .deletion import delete_chunked
+from .routers import shard_for_user
+
+
+# Заголовки совпадают с export_training_xlsx_response, поэтому выгруженный файл
+# можно загрузить обратно. Колонки «Тренировка» и «Email» необязательны.
+TITLE_COLUMN = 'Тренировка'
+EMAIL_COLUMN = 'Email'
+EXERCISE_COLUMNS = {
+    'День': 'day',
+    'Упражнение': 'name',
+    'Подходы': 'sets',
+    'Повторы': 'reps',
+    'Отдых': 'rest_time',
+    'Примечания': 'notes',
+}
+REQUIRED_COLUMNS = ('День', 'Упражнение', 'Подходы', 'Повторы')
+
+# День можно указать как ключом ('monday'), так и названием ('Понедельник')
+DAY_LOOKUP = {}
+for _key, _label in TrainingPlan.DAY_CHOICES:
+    DAY_LOOKUP[_key] = _key
+    DAY_LOOKUP[_label.lower()] = _key
+
+DEFAULT_BATCH_SIZE = 1000
+# Тренировок на один DELETE при откате неудачного импорта (число параметров в IN)
+DISCARD_BATCH_SIZE = 500
+
+# Кодировки CSV в порядке проверки: Excel в русской локали сохраняет CSV в cp1251
+CSV_ENCODINGS = ('utf-8-sig', 'cp1251')
+# Сколько байт начала файла читается для определения кодировки
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+
+class TrainingImportError(ValueError):
+    """Файл не может быть импортирован целиком (неизвестный формат, нет заголовка)."""
+
+
+def detect_encoding(fileobj):
+    """Кодировка CSV по началу файла: UTF-8 (с BOM или без), иначе cp1251.
+
+    Файл должен поддерживать seek(): после проверки он перематывается в начало.
+    """
+    sample = fileobj.read(ENCODING_SAMPLE_SIZE)
+    fileobj.seek(0)
+    for encoding in CSV_ENCODINGS[:-1]:
+        try:
+            # final=False: многобайтный символ может быть обрезан на границе образца
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return CSV_ENCODINGS[-1]
+
+
+def iter_csv_rows(fileobj):
+    """Построчно читает CSV, не загружая файл в память."""
+    encoding = None
+    if isinstance(fileobj.read(0), bytes):
+        encoding = detect_encoding(fileobj)
+        fileobj = io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+    try:
+        sample = fileobj.readline()
+        if not sample:
+            return
+        dialect = csv.excel
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            pass
+        yield next(csv.reader([sample], dialect))
+        yield from csv.reader(fileobj, dialect)
+    except UnicodeDecodeError as exc:
+        # Начало файла в одной кодировке, а дальше встретились байты из другой
+        raise TrainingImportError(f'Файл не в кодировке {encoding}: {exc.reason}')
+    except csv.Error as exc:
+        raise TrainingImportError(f'Файл не является CSV: {exc}')
+
+
+def iter_xlsx_rows(fileobj):
+    """Построчно читает первый лист XLSX в режиме read-only."""
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as exc:
+        # KeyError — zip-архив без частей книги Excel
+        raise TrainingImportError(f'Файл не является книгой Excel: {exc}')
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    except zipfile.BadZipFile as exc:
+        raise TrainingImportError(f'Файл Excel поврежден: {exc}')
+    finally:
+        wb.close()
+
+
+def iter_rows(fileobj, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        return iter_csv_rows(fileobj)
+    if ext in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(fileobj)
+    raise TrainingImportError(f'Неподдерживаемый формат файла: {ext or filename}')
+
+
+class ImportResult:
+    """Итог импорта: счетчики и первые `max_errors` ошибок по строкам."""
+    max_errors = 100
+
+    def __init__(self):
+        self.trainings_created = 0
+        self.exercises_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    @property
+    def ok(self):
+        return self.error_count == 0
+
+
+class TrainingImporter:
+    """Потоковый импорт упражнений пачками.
+
+    Строки проверяются и сохраняются пачками по `batch_size` в отдельных
+    транзакциях, поэтому память не растет с размером файла, блокировка записи
+    держится только на время пачки, а ошибка в одной строке (или пачке) не
+    прерывает весь импорт. Строки с одинаковым названием тренировки попадают
+    в одну новую `Training`; тренировки и упражнения пишутся на шард
+    владельца (shard_for_user).
+
+    Импорт только создает новые тренировки, поэтому их id и есть метка
+    импорта: если файл оказывается нечитаемым посреди импорта (другая
+    кодировка, поврежденный архив), созданные тренировки с упражнениями
+    удаляются и исключение уходит наружу.
+
+    Если `user` не задан, владелец берется из колонки «Email» каждой строки.
+    Чужие email допускаются только при `allow_other_users=True`.
+    """
+
+    def __init__(self, user=None, batch_size=DEFAULT_BATCH_SIZE, default_title='Импорт',
+                 allow_other_users=False):
+        if user is None and not allow_other_users:
+            raise ValueError('Без user импорт возможен только с allow_other_users=True')
+        self.user = user
+        self.batch_size = batch_size
+        self.default_title = default_title
+        self.allow_other_users = allow_other_users
+        self._columns = {}
+        self._user_ids = {}
+        self._training_ids = {}
+        self.result = ImportResult()
+
+    def run(self, rows):
+        rows = iter(rows)
+        try:
+            header = next(rows)
+        except StopIteration:
+            raise TrainingImportError('Файл пуст')
+        self._read_header(header)
+
+        try:
+            batch = []
+            for line, row in enumerate(rows, start=2):
+                if not row or all(value in (None, '') for value in row):
+                    continue
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            if batch:
+                self._flush(batch)
+        except Exception:
+            self._discard_created()
+            raise
+        return self.result
+
+    def _discard_created(self):
+        """Удаляет тренировки (с упражнениями), созданные этим импортом."""
+        by_shard = {}
+        for (owner_id, _), training_id in self._training_ids.items():
+            by_shard.setdefault(shard_for_user(owner_id), []).append(training_id)
+        for using, training_ids in by_shard.items():
+            for start in range(0, len(training_ids), DISCARD_BATCH_SIZE):
+                ids = training_ids[start:start + DISCARD_BATCH_SIZE]
+                delete_chunked(Exercise.objects.filter(training_id__in=ids), using)
+                delete_chunked(Training.objects.filter(pk__in=ids), using)
+        self._training_ids.clear()
+        self.result = ImportResult()
+
+    def _read_header(self, header):
+        names = [str(name).strip() if name is not None else '' for name in header]
+        missing = [name for name in REQUIRED_COLUMNS if name not in names]
+        if missing:
+            raise TrainingImportError(f"Нет обязательных колонок: {', '.join(missing)}")
+        if self.user is None and EMAIL_COLUMN not in names:
+            raise TrainingImportError(f'Нет колонки «{EMAIL_COLUMN}» для определения владельца')
+        self._columns = {name: index for index, name in enumerate(names) if name}
+
+    def _value(self, row, column):
+        index = self._columns.get(column)
+        if index is None or index >= len(row) or row[index] is None:
+            return ''
+        value = row[index]
+        return value.strip() if isinstance(value, str) else value
+
+    def _clean_row(self, row):
+        """Возвращает (email, title, Exercise) или бросает ValidationError."""
+        fields = {attr: self._value(row, column) for column, attr in EXERCISE_COLUMNS.items()}
+        day = DAY_LOOKUP.get(str(fields['day']).lower())
+        if day is None:
+            raise ValidationError({'day': f"Неизвестный день: {fields['day']}"})
+        fields['day'] = day
+        if fields['rest_time'] == '':
+            del fields['rest_time']
+        for attr in ('reps', 'rest_time', 'notes'):
+            if attr in fields:
+                fields[attr] = str(fields[attr])
+
+        exercise = Exercise(**fields)
+        exercise.clean_fields(exclude=['id', 'training'])
+        title = str(self._value(row, TITLE_COLUMN) or self.default_title)[:200]
+        email = str(self._value(row, EMAIL_COLUMN)).lower()
+        return email, title, exercise
+
+    def _resolve_users(self, emails):
+        """Кэширует id владельцев по email; одна выборка на пачку."""
+        unknown = {email for email in emails if email and email not in self._user_ids}
+        if unknown:
+            found = get_user_model().objects.filter(email__in=unknown).values_list('email', 'id')
+            for email, pk in found:
+                self._user_ids[email.lower()] = pk
+            for email in unknown:
+                self._user_ids.setdefault(email, None)
+
+    def _owner_id(self, email):
+        if self.user is None:
+            return self._user_ids.get(email)
+        if not email or email == self.user.email.lower():
+            return self.user.pk
+        if not self.allow_other_users:
+            raise ValidationError('Можно импортировать только собственные тренировки')
+        return self._user_ids.get(email)
+
+    def _flush(self, batch):
+        cleaned = []
+        for line, row in batch:
+            try:
+                cleaned.append((line,) + self._clean_row(row))
+            except ValidationError as exc:
+                self.result.add_error(line, _format_error(exc))
+
+        self._resolve_users(email for _, email, _, _ in cleaned)
+        rows = []
+        for line, email, title, exercise in cleaned:
+            try:
+                owner_id = self._owner_id(email)
+            except ValidationError as exc:
+                self.result.add_error(line, _format_error(exc))
+                continue
+            if owner_id is None:
+                self.result.add_error(line, f'Пользователь не найден: {email}')
+                continue
+            rows.append((line, (owner_id, title), exercise))
+        if not rows:
+            return
+
+        by_shard = {}
+        for line, (owner_id, title), exercise in rows:
+            by_shard.setdefault(shard_for_user(owner_id), []).append((line, (owner_id, title), exercise))
+        for using, shard_rows in by_shard.items():
+            self._save(using, shard_rows)
+
+    def _save(self, using, rows):
+        """Сохраняет пачку строк одного шарда в отдельной транзакции."""
+        new_keys = list(dict.fromkeys(key for _, key, _ in rows if key not in self._training_ids))
+        try:
+            with transaction.atomic(using=using):
+                created = Training.objects.using(using).bulk_create(
+                    [Training(user_id=user_id, title=title) for user_id, title in new_keys]
+                )
+                for key, training in zip(new_keys, created):
+                    self._training_ids[key] = training.pk
+                exercises = []
+                for _, key, exercise in rows:
+                    exercise.training_id = self._training_ids[key]
+                    exercises.append(exercise)
+                Exercise.objects.using(using).bulk_create(exercises)
+        except DatabaseError as exc:
+            for key in new_keys:
+                self._training_ids.pop(key, None)
+            for line, _, _ in rows:
+                self.result.add_error(line, f'Ошибка базы данных: {exc}')
+            return
+        self.result.trainings_created += len(new_keys)
+        self.result.exercises_created += len(rows)
+
+
+def _format_error(exc):
+    if hasattr(exc, 'message_dict'):
+        return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in exc.message_dict.items())
+    return ' '.join(exc.messages)
+
+
+def import_trainings(fileobj, filename, user=None, **kwargs):
+    """Импортирует тренировки из CSV/XLSX файла и возвращает ImportResult."""
+    kwargs.setdefault('default_title', os.path.splitext(os.path.basename(filename))[0][:200] or 'Импорт')
+    importer = TrainingImporter(user=user, **kwargs)
+    return importer.run(iter_rows(fileobj, filename))
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from training_plans.archiving import archive_trainings
+from training_plans.routers import PRIMARY_DB, shard_aliases, shard_for_user
+
+
+class Command(BaseCommand):
+    help = 'Переносит тренировки, не менявшиеся дольше --days дней, в сжатый архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--user', help='Email: архивировать только тренировки этого пользователя')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не переносить')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days не может быть отрицательным')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        aliases = shard_aliases() or [PRIMARY_DB]
+        user_id = None
+        if options['user']:
+            try:
+                user_id = get_user_model().objects.get(email__iexact=options['user']).pk
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+            aliases = [shard_for_user(user_id)]
+
+        total_trainings = total_exercises = 0
+        for alias in aliases:
+            trainings, exercises = archive_trainings(
+                cutoff, using=alias, batch_size=options['batch_size'],
+                user_id=user_id, dry_run=options['dry_run'],
+            )
+            self.stdout.write(f'{alias}: тренировок: {trainings}, упражнений: {exercises}')
+            total_trainings += trainings
+            total_exercises += exercises
+        verb = 'Будет перенесено' if options['dry_run'] else 'Перенесено в архив'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: тренировок {total_trainings}, упражнений {total_exercises} (старше {cutoff:%Y-%m-%d})'
+        ))
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import path
+
+from training_plans import async_views, views
+from training_plans.benchmarking import isolated_databases
+from training_plans.models import CustomUser, UserProfile, Training, Exercise, TrainingPlan
+
+
+# Синхронные и асинхронные экспорты рядом, независимо от ASYNC_VIEWS
+urlpatterns = [
+    path('wsgi/pdf/<int:pk>/', views.export_training_plan_pdf),
+    path('wsgi/xlsx/<int:pk>/', views.export_training_xlsx),
+    path('asgi/pdf/<int:pk>/', async_views.export_training_plan_pdf),
+    path('asgi/xlsx/<int:pk>/', async_views.export_training_xlsx),
+]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность конкурентных экспортов PDF/XLSX: синхронный воркер '
+        'с пулом потоков (WSGI) против одного цикла событий (ASGI)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=64, help='Число одновременных скачиваний')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков у WSGI-воркера (аналог gunicorn --threads)')
+        parser.add_argument('--client-delay', type=float, default=0.2,
+                            help='Сколько секунд медленный клиент скачивает ответ')
+        parser.add_argument('--rows', type=int, default=200, help='Строк в каждом экспорте')
+        parser.add_argument('--kind', choices=('pdf', 'xlsx'), default='pdf')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['workers'] < 1:
+            raise CommandError('--requests и --workers должны быть положительными')
+        # Команда работает вне тестового раннера, поэтому testserver разрешаем явно
+        with isolated_databases(), override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=['testserver']):
+            user, pk = self._seed(options['kind'], options['rows'])
+            login = Client()
+            login.force_login(user)
+            cookies = login.cookies
+            self.stdout.write(
+                f"Экспорт: {options['kind']}, строк: {options['rows']}, запросов: {options['requests']}, "
+                f"задержка клиента: {options['client_delay']} с"
+            )
+            wsgi = self._run_wsgi(cookies, f"/wsgi/{options['kind']}/{pk}/", options)
+            self._report(f"WSGI, потоков: {options['workers']}", wsgi)
+            asgi = self._run_asgi(cookies, f"/asgi/{options['kind']}/{pk}/", options)
+            self._report('ASGI, один цикл событий', asgi)
+
+    def _seed(self, kind, rows):
+        user = CustomUser.objects.create_user(username='bench', email='bench@example.com', password='x')
+        days = [key for key, _ in TrainingPlan.DAY_CHOICES]
+        if kind == 'pdf':
+            profile = UserProfile.objects.create(
+                user=user, age=30, gender='male', height=180, weight=80,
+                goal='muscle_gain', fitness_level='intermediate',
+            )
+            TrainingPlan.objects.bulk_create([
+                TrainingPlan(user_profile=profile, day=days[i % 7], exercise_name=f'Упражнение {i}',
+                             sets=4, reps='8-10', rest_time='90 сек', notes='Контроль техники' if i % 2 else '')
+                for i in range(rows)
+            ])
+            return user, profile.pk
+        training = Training.objects.create(user=user, title='Бенчмарк')
+        Exercise.objects.bulk_create([
+            Exercise(training=training, day=days[i % 7], name=f'Упражнение {i}', sets=3, reps='10')
+            for i in range(rows)
+        ])
+        return user, training.pk
+
+    def _run_wsgi(self, cookies, url, options):
+        local = threading.local()
+
+        def download():
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies = cookies
+            response = local.client.get(url)
+            # Поток синхронного воркера занят, пока клиент забирает ответ
+            time.sleep(options['client_delay'])
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            latencies = list(pool.map(lambda _: download(), range(options['requests'])))
+        return time.perf_counter() - start, latencies
+
+    def _run_asgi(self, cookies, url, options):
+        client = AsyncClient()
+        client.cookies = cookies
+
+        async def download():
+            response = await client.get(url)
+            # Медленная отдача ждет сокет, а не занимает поток
+            await asyncio.sleep(options['client_delay'])
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - start
+
+        async def main():
+            return await asyncio.gather(*(download() for _ in range(options['requests'])))
+
+        start = time.perf_counter()
+        latencies = asyncio.run(main())
+        return time.perf_counter() - start, latencies
+
+    def _report(self, name, result):
+        # Задержка — от начала пачки до получения файла, включая ожидание в очереди
+        elapsed, latencies = result
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f'  всего: {elapsed:.2f} с  запросов/с: {len(latencies) / elapsed:.1f}  '
+            f'p50={_percentile(latencies, 50) * 1000:.0f} мс  p95={_percentile(latencies, 95) * 1000:.0f} мс'
+        )
@@ -0,0 +1,154 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Профиль Django по умолчанию: новое соединение на запрос, python-таймаут 5 с,
+# отложенные (DEFERRED) транзакции, журнал отката.
+DEFAULT_PROFILE = {
+    'pragmas': {},
+    'persistent': False,
+    'begin': 'BEGIN',
+}
+
+SCHEMA = """
+CREATE TABLE exercise (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    training_id INTEGER NOT NULL,
+    day VARCHAR(10) NOT NULL,
+    name VARCHAR(200) NOT NULL,
+    sets INTEGER NOT NULL,
+    reps VARCHAR(50) NOT NULL
+);
+CREATE INDEX exercise_training_id ON exercise (training_id);
+"""
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк конкурентной смешанной нагрузки (чтение/запись) на SQLite: '
+        'профиль по умолчанию против продакшен-профиля (WAL, busy_timeout, mmap, постоянные соединения)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Доля операций записи (перегенерация плана)')
+        parser.add_argument('--trainings', type=int, default=200)
+        parser.add_argument('--profile', choices=('default', 'production', 'both'), default='both')
+        parser.add_argument('--shards', type=int, default=1,
+                            help='Число файлов-шардов; тренировки распределяются по ним как в ShardRouter')
+
+    def handle(self, *args, **options):
+        profiles = {
+            'default': DEFAULT_PROFILE,
+            'production': {
+                'pragmas': settings.SQLITE_PRODUCTION_PRAGMAS,
+                'persistent': True,
+                'begin': 'BEGIN IMMEDIATE',
+            },
+        }
+        names = ['default', 'production'] if options['profile'] == 'both' else [options['profile']]
+        for name in names:
+            with tempfile.TemporaryDirectory() as tmp:
+                paths = [os.path.join(tmp, f'bench{i}.sqlite3') for i in range(max(1, options['shards']))]
+                stats = self._run(paths, profiles[name], options)
+            self._report(f"{name}, шардов: {len(paths)}", stats, options['seconds'])
+
+    def _connect(self, path, profile):
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        for pragma, value in profile['pragmas'].items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def _seed(self, path, profile, trainings):
+        conn = self._connect(path, profile)
+        conn.executescript(SCHEMA)
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO exercise (training_id, day, name, sets, reps) VALUES (?, ?, ?, ?, ?)',
+            [(t, 'monday', f'Упражнение {i}', 3, '10') for t in range(trainings) for i in range(10)],
+        )
+        conn.execute('COMMIT')
+        conn.close()
+
+    def _run(self, paths, profile, options):
+        for path in paths:
+            self._seed(path, profile, options['trainings'])
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        stats = {'read': [], 'write': [], 'errors': 0}
+
+        def worker():
+            rnd = random.Random()
+            conns = [self._connect(path, profile) for path in paths] if profile['persistent'] else None
+            local = {'read': [], 'write': [], 'errors': 0}
+            while time.perf_counter() < deadline:
+                kind = 'write' if rnd.random() < options['write_ratio'] else 'read'
+                training_id = rnd.randrange(options['trainings'])
+                shard = training_id % len(paths)
+                start = time.perf_counter()
+                c = conns[shard] if conns else self._connect(paths[shard], profile)
+                try:
+                    if kind == 'read':
+                        c.execute('SELECT * FROM exercise WHERE training_id = ?', (training_id,)).fetchall()
+                    else:
+                        c.execute(profile['begin'])
+                        try:
+                            c.execute('SELECT COUNT(*) FROM exercise WHERE training_id = ?', (training_id,)).fetchone()
+                            c.execute('DELETE FROM exercise WHERE training_id = ?', (training_id,))
+                            c.executemany(
+                                'INSERT INTO exercise (training_id, day, name, sets, reps) VALUES (?, ?, ?, ?, ?)',
+                                [(training_id, 'friday', f'Упражнение {i}', 4, '8') for i in range(10)],
+                            )
+                            c.execute('COMMIT')
+                        except sqlite3.Error:
+                            if c.in_transaction:
+                                c.execute('ROLLBACK')
+                            raise
+                    local[kind].append(time.perf_counter() - start)
+                except sqlite3.OperationalError:
+                    local['errors'] += 1
+                finally:
+                    if conns is None:
+                        c.close()
+            for c in conns or []:
+                c.close()
+            with lock:
+                stats['read'] += local['read']
+                stats['write'] += local['write']
+                stats['errors'] += local['errors']
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return stats
+
+    def _report(self, name, stats, seconds):
+        total = len(stats['read']) + len(stats['write'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Профиль: {name}'))
+        self.stdout.write(f'  операций/с: {total / seconds:.0f}  ошибок (database is locked): {stats["errors"]}')
+        for kind in ('read', 'write'):
+            values = stats[kind]
+            self.stdout.write(
+                f'  {kind:5}: n={len(values):6}  '
+                f'p50={_percentile(values, 50) * 1000:.2f} мс  '
+                f'p95={_percentile(values, 95) * 1000:.2f} мс  '
+                f'p99={_percentile(values, 99) * 1000:.2f} мс'
+            )
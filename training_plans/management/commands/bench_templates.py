@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from training_plans.benchmarking import isolated_databases, timeit
+from training_plans.models import CustomUser, Training, Exercise, TrainingPlan
+
+
+TEMPLATE = 'training_plans/training_detail.html'
+
+
+class Command(BaseCommand):
+    help = 'Время рендера страницы тренировки со 100 упражнениями: без кэша фрагментов и с ним'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exercises', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with isolated_databases():
+            user = CustomUser.objects.create_user(username='bench', email='bench@example.com', password='x')
+            training = Training.objects.create(user=user, title='Бенчмарк')
+            days = [key for key, _ in TrainingPlan.DAY_CHOICES]
+            Exercise.objects.bulk_create([
+                Exercise(training=training, day=days[i % 7], name=f'Упражнение {i}', sets=3, reps='10',
+                         notes='Техника важнее веса' if i % 3 == 0 else '')
+                for i in range(options['exercises'])
+            ])
+            request = RequestFactory().get('/')
+            request.user = user
+
+            def render():
+                # Свежий объект, как в DetailView на каждый запрос
+                obj = Training.objects.get(pk=training.pk)
+                return render_to_string(TEMPLATE, {'object': obj}, request=request)
+
+            def render_cold():
+                cache.clear()
+                return render()
+
+            self.stdout.write(f"Упражнений: {options['exercises']}, повторов: {options['repeat']}")
+
+            cold = timeit(render_cold, options['repeat'])
+            with CaptureQueriesContext(connection) as cold_queries:
+                render_cold()
+            render()
+            warm = timeit(render, options['repeat'])
+            with CaptureQueriesContext(connection) as warm_queries:
+                render()
+            self.stdout.write(f'  рендер без кэша фрагмента: {cold:.3f} мс, запросов: {len(cold_queries)}')
+            self.stdout.write(f'  рендер из кэша фрагмента:  {warm:.3f} мс, запросов: {len(warm_queries)}')
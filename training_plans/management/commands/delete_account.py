@@ -0,0 +1,31 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from training_plans.deletion import account_row_count, delete_account
+
+
+class Command(BaseCommand):
+    help = 'Удаляет аккаунт со всеми тренировками и планом пачками DELETE, без загрузки строк в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать строки')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email__iexact=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['email']} не найден")
+
+        rows = account_row_count(user)
+        if options['dry_run']:
+            self.stdout.write(f'{user.email}: связанных строк: {rows}')
+            return
+        start = time.perf_counter()
+        deleted = delete_account(user, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["email"]}: удалено строк: {deleted} за {time.perf_counter() - start:.1f} с'
+        ))
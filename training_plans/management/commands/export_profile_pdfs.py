@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from training_plans.exports import write_profile_pdfs_zip
+from training_plans.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Пакетная выгрузка PDF-планов профилей со всех шардов в zip-архив (рендер в пуле процессов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к создаваемому .zip')
+        parser.add_argument('--email', action='append', default=[],
+                            help='Email клиента; можно повторять. Без него выгружаются все профили')
+        parser.add_argument('--workers', type=int, default=settings.PDF_BATCH_WORKERS)
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.order_by('pk')
+        if options['email']:
+            condition = Q()
+            for email in options['email']:
+                condition |= Q(user__email__iexact=email)
+            profiles = profiles.filter(condition)
+
+        start = time.perf_counter()
+        try:
+            with open(options['output'], 'wb') as f:
+                count = write_profile_pdfs_zip(profiles, f, workers=options['workers'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"PDF: {count}, процессов: {options['workers']}, время: {elapsed:.1f} с -> {options['output']}"
+        ))
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from training_plans.imports import import_trainings, TrainingImportError, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт тренировок и упражнений из CSV/XLSX файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .csv или .xlsx файлу')
+        parser.add_argument(
+            '--user',
+            help='Email владельца; без него владелец берется из колонки «Email» каждой строки',
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email__iexact=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
+        path = options['path']
+        try:
+            with open(path, 'rb') as f:
+                result = import_trainings(
+                    f, path, user=user, batch_size=options['batch_size'], allow_other_users=True
+                )
+        except (OSError, TrainingImportError) as exc:
+            raise CommandError(str(exc))
+
+        for line, message in result.errors:
+            self.stderr.write(f'Строка {line}: {message}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... и еще {result.error_count - len(result.errors)} ошибок')
+        self.stdout.write(self.style.SUCCESS(
+            f'Тренировок: {result.trainings_created}, упражнений: {result.exercises_created}, '
+            f'ошибок: {result.error_count}'
+        ))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from training_plans.routers import PRIMARY_DB, shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Применяет миграции ко всем шардам из USER_SHARDS (или только к default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='?')
+        parser.add_argument('migration_name', nargs='?')
+
+    def handle(self, *args, **options):
+        args = [a for a in (options['app_label'], options['migration_name']) if a]
+        for alias in shard_aliases() or [PRIMARY_DB]:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'Шард {alias} ({settings.DATABASES[alias]["NAME"]})'))
+            call_command(
+                'migrate', *args,
+                database=alias,
+                interactive=False,
+                verbosity=options['verbosity'],
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
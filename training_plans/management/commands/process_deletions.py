@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from training_plans.deletion import run_pending_deletion
+from training_plans.models import PendingDeletion
+from training_plans.routers import PRIMARY_DB
+
+
+class Command(BaseCommand):
+    help = 'Доделывает отложенные удаления, которые фоновый поток не завершил (перезапуск воркера, ошибка)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument(
+            '--min-age', type=int, default=600,
+            help='Пропускать задания моложе стольких секунд: их, скорее всего, еще выполняет воркер',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        jobs = list(PendingDeletion.objects.using(PRIMARY_DB).filter(created_at__lte=cutoff).order_by('pk'))
+        failed = 0
+        for job in jobs:
+            try:
+                run_pending_deletion(job, chunk_size=options['chunk_size'])
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'{job}: {exc!r}')
+            else:
+                self.stdout.write(f'{job}: удалено')
+        self.stdout.write(self.style.SUCCESS(f'Заданий: {len(jobs)}, с ошибкой: {failed}'))
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+BOOT_CODE = (
+    'import fitgenius_project.wsgi\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+)
+
+
+def parse_importtime(output):
+    """Разбирает вывод `python -X importtime` в список (модуль, self_us, cumulative_us)."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает стоимость импорта модулей при загрузке воркера '
+        '(fitgenius_project.wsgi + URLconf) по данным python -X importtime'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument('--sort', choices=('cumulative', 'self'), default='cumulative')
+        parser.add_argument('--package', action='store_true',
+                            help='Суммировать собственное время по пакетам верхнего уровня')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'fitgenius_project.settings')
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_CODE],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr[-2000:])
+
+        rows = parse_importtime(proc.stderr)
+        total_self = sum(row[1] for row in rows)
+        self.stdout.write(f'Модулей: {len(rows)}, суммарное время импорта: {total_self / 1000:.1f} мс')
+
+        if options['package']:
+            packages = {}
+            for name, self_us, _ in rows:
+                top = name.split('.')[0]
+                packages[top] = packages.get(top, 0) + self_us
+            ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+            for name, self_us in ranked[:options['top']]:
+                self.stdout.write(f'{self_us / 1000:9.1f} мс  {name}')
+            return
+
+        index = 2 if options['sort'] == 'cumulative' else 1
+        self.stdout.write(f"{'self, мс':>10} {'cumul., мс':>11}  модуль")
+        for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[index], reverse=True)[:options['top']]:
+            self.stdout.write(f'{self_us / 1000:10.1f} {cumulative_us / 1000:11.1f}  {name}')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from training_plans.routers import shard_aliases, shard_for_user
+from training_plans.sharding import misplaced_users, move_user
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит данные пользователей на шард, вычисленный по текущему USER_SHARDS '
+        '(нужно после изменения числа шардов)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет перенесено')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not shard_aliases():
+            raise CommandError('Шардирование выключено: USER_SHARDS пуст')
+
+        moved = 0
+        for source in shard_aliases():
+            for user_id in misplaced_users(source):
+                target = shard_for_user(user_id)
+                self.stdout.write(f'user {user_id}: {source} -> {target}')
+                if not options['dry_run']:
+                    move_user(user_id, source, target, batch_size=options['batch_size'])
+                moved += 1
+        verb = 'Будет перенесено' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} пользователей: {moved}'))
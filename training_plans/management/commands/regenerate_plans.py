@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from training_plans.models import UserProfile
+from training_plans.recommendations import regenerate_plans
+from training_plans.routers import PRIMARY_DB, shard_aliases, shard_for_user, use_shard
+
+
+class Command(BaseCommand):
+    help = 'Перегенерирует тренировочные планы профилей на всех шардах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Только профиль этого пользователя')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Профилей на один векторизованный проход подбора')
+
+    def handle(self, *args, **options):
+        if options['user_id']:
+            aliases = [shard_for_user(options['user_id'])]
+        else:
+            aliases = shard_aliases() or [PRIMARY_DB]
+
+        total = 0
+        start = time.perf_counter()
+        for alias in aliases:
+            profiles = UserProfile.objects.all()
+            if options['user_id']:
+                profiles = profiles.filter(user_id=options['user_id'])
+            with use_shard(alias):
+                count = regenerate_plans(profiles, alias, batch_size=options['batch_size'])
+            self.stdout.write(f'{alias}: {count} профилей')
+            total += count
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Планы перегенерированы: {total} за {elapsed:.1f} с'))
@@ -0,0 +1,71 @@
+import os
+import re
+import tempfile
+import time
+
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponseNotFound
+from django.test import Client, RequestFactory, override_settings
+
+from training_plans.benchmarking import isolated_databases
+from training_plans.middleware import PrecompressedStaticMiddleware
+from training_plans.models import CustomUser
+
+
+DEFAULT_URLS = ['/admin/', '/admin/training_plans/training/', '/admin/training_plans/training/add/', '/login/']
+ACCEPT_ENCODING = 'gzip, deflate, br'
+ASSET_URL = re.compile(r'''(?:href|src)=["']([^"']+)["']''')
+
+
+class Command(BaseCommand):
+    help = ('Байты статики на просмотр страницы: как раньше (исходные файлы без кэширования) '
+            'и с CompressedManifestStaticFilesStorage + PrecompressedStaticMiddleware')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', default=[],
+                            help='Адрес страницы; можно повторять. По умолчанию — страницы админки и входа')
+
+    def handle(self, *args, **options):
+        urls = options['url'] or DEFAULT_URLS
+        with tempfile.TemporaryDirectory() as root, isolated_databases(), override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            STATIC_ROOT=root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'training_plans.storage.CompressedManifestStaticFilesStorage'},
+            },
+        ):
+            start = time.perf_counter()
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.stdout.write(f'collectstatic со сжатием: {time.perf_counter() - start:.1f} с')
+
+            originals = {hashed: name for name, hashed in staticfiles_storage.hashed_files.items()}
+            middleware = PrecompressedStaticMiddleware(lambda request: HttpResponseNotFound())
+            factory = RequestFactory()
+            user = CustomUser.objects.create_superuser(username='report', email='report@example.com', password='x')
+            client = Client()
+            client.force_login(user)
+
+            prefix = staticfiles_storage.base_url
+            self.stdout.write(f'{"страница":<40} {"файлов":>6} {"было, КБ":>9} {"стало, КБ":>10} {"повторно было/стало":>20}')
+            for url in urls:
+                html = client.get(url).content.decode('utf-8', 'replace')
+                assets = sorted({asset for asset in ASSET_URL.findall(html) if asset.startswith(prefix)})
+                before = after = 0
+                for asset in assets:
+                    name = asset[len(prefix):]
+                    before += os.path.getsize(finders.find(originals.get(name, name)))
+                    response = middleware(factory.get(asset, HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING))
+                    if response.status_code != 200:
+                        raise CommandError(f'{asset}: статус {response.status_code}')
+                    after += len(response.content)
+                # Повторный просмотр: раньше браузер перезапрашивал каждый файл, теперь
+                # файлы с хешем и Cache-Control: immutable берутся из кэша без запросов
+                self.stdout.write(
+                    f'{url:<40} {len(assets):>6} {before / 1024:>9.1f} {after / 1024:>10.1f} '
+                    f'{f"{len(assets)} запр. / 0":>20}'
+                )
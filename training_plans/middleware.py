@@ -0,0 +1,185 @@
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .profiling import RequestSampler, profiling_requested, sampled, save_profile
+from .routers import STICKY_COOKIE, begin_request, wrote_primary, set_current_shard, shard_for_user
+from .storage import ENCODINGS, accepted_encodings, static_file_index
+
+
+def etag_matches(etag, if_none_match):
+    """Слабое сравнение для If-None-Match: '*' совпадает с любым тегом, префикс W/ не учитывается."""
+    etags = parse_etags(if_none_match)
+    if etags == ['*']:
+        return True
+    return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+
+
+class ReplicaStickinessMiddleware:
+    """Ставит короткоживущую cookie после записи в основную базу.
+
+    Пока cookie жива, read_only_view читают из default, поэтому пользователь
+    сразу видит свои изменения, несмотря на задержку репликации.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        begin_request()
+        return self._set_cookie(self.get_response(request))
+
+    async def __acall__(self, request):
+        begin_request()
+        return self._set_cookie(await self.get_response(request))
+
+    def _set_cookie(self, response):
+        if wrote_primary():
+            response.set_cookie(
+                STICKY_COOKIE,
+                '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class ShardMiddleware:
+    """Направляет запросы к данным пользователя на его шард.
+
+    Шард вычисляется лениво, при первом запросе к шардированной модели,
+    так что анонимные страницы не загружают пользователя лишний раз.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        set_current_shard(self._resolver(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        set_current_shard(self._resolver(request))
+        return await self.get_response(request)
+
+    @staticmethod
+    def _resolver(request):
+        # Под ASGI резолвер вызывается роутером внутри sync_to_async, где
+        # синхронная загрузка request.user разрешена
+        def resolve():
+            user = request.user
+            return shard_for_user(user.pk) if user.is_authenticated else None
+        return resolve
+
+
+class RequestProfilingMiddleware:
+    """Профилирует запрос сотрудника с ?profile=1 или случайную долю запросов.
+
+    Стоит после AuthenticationMiddleware; см. training_plans/profiling.py.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not (sampled() or (profiling_requested(request) and request.user.is_staff)):
+            return self.get_response(request)
+        with RequestSampler() as sampler:
+            response = self.get_response(request)
+        save_profile(request, response, sampler, request.user)
+        return response
+
+    async def __acall__(self, request):
+        if not sampled():
+            if not profiling_requested(request) or not (await request.auser()).is_staff:
+                return await self.get_response(request)
+        with RequestSampler() as sampler:
+            response = await self.get_response(request)
+        await sync_to_async(save_profile)(request, response, sampler, await request.auser())
+        return response
+
+
+class PrecompressedStaticMiddleware:
+    """Отдает собранную статику из STATIC_ROOT: сжатая копия по Accept-Encoding,
+    Cache-Control: immutable на год для файлов с хешем в имени.
+
+    Индекс файлов строится один раз при запуске процесса — после
+    collectstatic статика не меняется. Подключается в settings.py при
+    FITGENIUS_STATIC_PIPELINE=1; см. training_plans/storage.py.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+    # Файлы без хеша (их запрашивают по постоянному имени) перепроверяются по ETag
+    REVALIDATE = 'public, max-age=60'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            raise MiddlewareNotUsed('STATIC_ROOT не собран (manage.py collectstatic)')
+        self.prefix = settings.STATIC_URL
+        self.files = static_file_index(root)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Файлы маленькие и уже сжаты: чтение с диска не держит цикл событий заметно
+        return self._serve(request) or await self.get_response(request)
+
+    def _serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        entry = self.files.get(request.path[len(self.prefix):])
+        if entry is None:
+            return None
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next((name for name, _ in ENCODINGS if name in accepted and name in entry['variants']), '')
+        path, size, etag = entry['variants'][encoding]
+
+        if etag_matches(etag, request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            with open(path, 'rb') as f:
+                response = HttpResponse(f.read() if request.method == 'GET' else b'', content_type=entry['content_type'])
+            response['Content-Length'] = str(size)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = self.IMMUTABLE if entry['immutable'] else self.REVALIDATE
+        if len(entry['variants']) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training_plans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Training',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='Название')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trainings', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Exercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.CharField(choices=[('monday', 'Понедельник'), ('tuesday', 'Вторник'), ('wednesday', 'Среда'), ('thursday', 'Четверг'), ('friday', 'Пятница'), ('saturday', 'Суббота'), ('sunday', 'Воскресенье')], max_length=10, verbose_name='День')),
+                ('name', models.CharField(max_length=200, verbose_name='Название упражнения')),
+                ('sets', models.IntegerField(verbose_name='Подходы')),
+                ('reps', models.CharField(max_length=50, verbose_name='Повторы')),
+                ('rest_time', models.CharField(default='60 сек', max_length=50, verbose_name='Время отдыха')),
+                ('notes', models.TextField(blank=True, verbose_name='Примечания')),
+                ('training', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercises', to='training_plans.training')),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training_plans', '0002_training_exercise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTraining',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(verbose_name='id тренировки до архивации')),
+                ('title', models.CharField(max_length=200, verbose_name='Название')),
+                ('exercise_count', models.PositiveIntegerField(default=0, verbose_name='Упражнений')),
+                ('created_at', models.DateTimeField(verbose_name='Создана')),
+                ('updated_at', models.DateTimeField(verbose_name='Последнее изменение')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='В архиве с')),
+                ('payload', models.BinaryField(verbose_name='Сжатые данные')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_trainings', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Архивная тренировка',
+                'verbose_name_plural': 'Архивные тренировки',
+                'indexes': [models.Index(fields=['user', 'original_id'], name='training_pl_user_id_2271b1_idx')],
+            },
+        ),
+    ]
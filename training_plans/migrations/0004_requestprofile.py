@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training_plans', '0003_archivedtraining'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(blank=True, max_length=200, verbose_name='Имя URL')),
+                ('path', models.CharField(max_length=500, verbose_name='Путь')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Статус')),
+                ('duration_ms', models.FloatField(verbose_name='Длительность, мс')),
+                ('sql_count', models.PositiveIntegerField(verbose_name='SQL-запросов')),
+                ('sql_ms', models.FloatField(verbose_name='Время SQL, мс')),
+                ('sample_count', models.PositiveIntegerField(verbose_name='Сэмплов')),
+                ('interval_ms', models.FloatField(verbose_name='Интервал сэмплирования, мс')),
+                ('stacks', models.TextField(blank=True)),
+                ('queries', models.JSONField(default=list, verbose_name='Самые долгие SQL')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Снят')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'indexes': [models.Index(fields=['-duration_ms'], name='training_pl_duratio_0a4631_idx'), models.Index(fields=['url_name', '-duration_ms'], name='training_pl_url_nam_34e60c_idx')],
+            },
+        ),
+    ]
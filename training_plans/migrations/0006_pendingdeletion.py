@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training_plans', '0005_customuser_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('account', 'Аккаунт'), ('profile', 'Профиль'), ('training', 'Тренировка')], max_length=20, verbose_name='Что удаляется')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('using', models.CharField(max_length=100, verbose_name='База')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Неудачных попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Запланировано')),
+            ],
+            options={
+                'verbose_name': 'Отложенное удаление',
+                'verbose_name_plural': 'Отложенные удаления',
+            },
+        ),
+    ]
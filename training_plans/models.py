@@ -1,13 +1,19 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 # Создаем кастомную модель пользователя
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True, verbose_name="Email")
     phone = models.CharField(max_length=20, blank=True, verbose_name="Телефон")
-    
+
+    class Meta(AbstractUser.Meta):
+        # Поиск по email без учета регистра (массовое клонирование) идет по этому индексу
+        indexes = [models.Index(Lower('email'), name='customuser_email_lower_idx')]
+
     def __str__(self):
         return self.email
 
@@ -63,76 +69,37 @@ class UserProfile(models.Model):
 
     def generate_training_plan(self):
         """Генерация персонального тренировочного плана на основе данных пользователя"""
-        # Очищаем старый план
-        self.training_plans.all().delete()
-        
-        bmi = self.calculate_bmi()
-        
-        # Базовая логика в зависимости от цели и ИМТ
-        if self.goal == 'weight_loss':
-            plans = self._generate_weight_loss_plan(bmi)
-        elif self.goal == 'muscle_gain':
-            plans = self._generate_muscle_gain_plan(bmi)
-        elif self.goal == 'strength':
-            plans = self._generate_strength_plan(bmi)
-        else:
-            plans = self._generate_health_plan(bmi)
-        
-        # Создаем тренировочные дни
-        for day, exercises in plans.items():
-            for exercise in exercises:
-                TrainingPlan.objects.create(
-                    user_profile=self,
-                    day=day,
-                    exercise_name=exercise['name'],
-                    sets=exercise['sets'],
-                    reps=exercise['reps'],
-                    rest_time=exercise['rest'],
-                    notes=exercise.get('notes', '')
-                )
-    
-    def _generate_weight_loss_plan(self, bmi):
-        """Генерация плана для похудения"""
-        base_plan = {
-            'monday': [
-                {'name': 'Бег на дорожке', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
-                {'name': 'Приседания', 'sets': 3, 'reps': '15-20', 'rest': '45 сек'},
-                {'name': 'Выпады', 'sets': 3, 'reps': '12-15 на ногу', 'rest': '45 сек'},
-            ],
-            'wednesday': [
-                {'name': 'Эллиптический тренажер', 'sets': 1, 'reps': '25-35 мин', 'rest': '—'},
-                {'name': 'Жим гантелей лежа', 'sets': 3, 'reps': '12-15', 'rest': '45 сек'},
-                {'name': 'Тяга верхнего блока', 'sets': 3, 'reps': '12-15', 'rest': '45 сек'},
-            ],
-            'friday': [
-                {'name': 'Велотренажер', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
-                {'name': 'Планка', 'sets': 3, 'reps': '30-60 сек', 'rest': '30 сек'},
-                {'name': 'Скручивания', 'sets': 3, 'reps': '15-20', 'rest': '30 сек'},
-            ]
-        }
-        return self._adjust_plan_by_level(base_plan)
-    
-    def _generate_muscle_gain_plan(self, bmi):
-        """Генерация плана для набора массы"""
-        base_plan = {
-            'monday': [  # Грудь, трицепс
-                {'name': 'Жим штанги лежа', 'sets': 4, 'reps': '8-12', 'rest': '90 сек'},
-                {'name': 'Разводка гантелей', 'sets': 3, 'reps': '10-15', 'rest': '60 сек'},
-                {'name': 'Отжимания на брусьях', 'sets': 3, 'reps': '8-12', 'rest': '75 сек'},
-            ],
-            'tuesday': [  # Спина, бицепс
-                {'name': 'Становая тяга', 'sets': 4, 'reps': '6-10', 'rest': '120 сек'},
-                {'name': 'Подтягивания', 'sets': 3, 'reps': 'макс', 'rest': '90 сек'},
-                {'name': 'Тяга штанги в наклоне', 'sets': 3, 'reps': '8-12', 'rest': '75 сек'},
-            ],
-            'thursday': [  # Ноги, плечи
-                {'name': 'Приседания со штангой', 'sets': 4, 'reps': '8-12', 'rest': '120 сек'},
-                {'name': 'Жим гантелей сидя', 'sets': 3, 'reps': '10-15', 'rest': '60 сек'},
-                {'name': 'Подъем на носки', 'sets': 4, 'reps': '15-20', 'rest': '45 сек'},
-            ]
-        }
-        return self._adjust_plan_by_level(base_plan)
-    
+        from .recommendations import recommend_plan
+
+        # База для записи, а не self._state.db: профиль мог быть прочитан с реплики
+        alias = router.db_for_write(TrainingPlan, instance=self)
+        plans = self.build_training_plan(recommend_plan(self))
+        with transaction.atomic(using=alias):
+            # Очищаем старый план
+            TrainingPlan.objects.using(alias).filter(user_profile_id=self.pk).delete()
+            TrainingPlan.objects.using(alias).bulk_create(plans)
+            # Новая версия плана: updated_at входит в ключ кэша фрагментов страницы профиля
+            self.save(using=alias, update_fields=['updated_at'])
+
+    def build_training_plan(self, template_key):
+        """Несохраненные строки TrainingPlan по шаблону из recommendations.PLAN_TEMPLATES"""
+        from .recommendations import PLAN_TEMPLATES
+
+        plans = self._adjust_plan_by_level(PLAN_TEMPLATES[template_key]['days'])
+        return [
+            TrainingPlan(
+                user_profile=self,
+                day=day,
+                exercise_name=exercise['name'],
+                sets=exercise['sets'],
+                reps=exercise['reps'],
+                rest_time=exercise['rest'],
+                notes=exercise.get('notes', '')
+            )
+            for day, exercises in plans.items()
+            for exercise in exercises
+        ]
+
     def _adjust_plan_by_level(self, plan):
         """Корректировка плана по уровню подготовки"""
         if self.fitness_level == 'beginner':
@@ -148,42 +115,6 @@ class UserProfile(models.Model):
                     adjusted_plan[day].append(adj_exercise)
             return adjusted_plan
         return plan
-    
-    def _generate_strength_plan(self, bmi):
-        """Генерация плана для развития силы"""
-        base_plan = {
-            'monday': [
-                {'name': 'Приседания со штангой', 'sets': 5, 'reps': '3-5', 'rest': '180 сек'},
-                {'name': 'Жим ногами', 'sets': 3, 'reps': '6-8', 'rest': '120 сек'},
-            ],
-            'wednesday': [
-                {'name': 'Жим штанги лежа', 'sets': 5, 'reps': '3-5', 'rest': '180 сек'},
-                {'name': 'Армейский жим', 'sets': 3, 'reps': '5-8', 'rest': '120 сек'},
-            ],
-            'friday': [
-                {'name': 'Становая тяга', 'sets': 5, 'reps': '3-5', 'rest': '180 сек'},
-                {'name': 'Тяга штанги в наклоне', 'sets': 3, 'reps': '5-8', 'rest': '120 сек'},
-            ]
-        }
-        return self._adjust_plan_by_level(base_plan)
-    
-    def _generate_health_plan(self, bmi):
-        """Генерация плана для общего оздоровления"""
-        base_plan = {
-            'monday': [
-                {'name': 'Ходьба/Бег', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
-                {'name': 'Приседания с собственным весом', 'sets': 3, 'reps': '12-15', 'rest': '60 сек'},
-            ],
-            'wednesday': [
-                {'name': 'Плавание/Велосипед', 'sets': 1, 'reps': '25-35 мин', 'rest': '—'},
-                {'name': 'Отжимания от пола', 'sets': 3, 'reps': '8-12', 'rest': '60 сек'},
-            ],
-            'friday': [
-                {'name': 'Йога/Растяжка', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
-                {'name': 'Планка', 'sets': 3, 'reps': '30-45 сек', 'rest': '45 сек'},
-            ]
-        }
-        return self._adjust_plan_by_level(base_plan)
 
 
 class TrainingPlan(models.Model):
@@ -243,4 +174,95 @@ class Exercise(models.Model):
         ordering = ['day']
 
     def __str__(self):
-        return f"{self.get_day_display()} - {self.name}"
\ No newline at end of file
+        return f"{self.get_day_display()} - {self.name}"
+
+class ArchivedTraining(models.Model):
+    """Тренировка, перенесенная из горячих таблиц в архив.
+
+    Описание и упражнения хранятся одним сжатым gzip JSON (см. training_plans/archiving.py),
+    в отдельных колонках — только то, что нужно для списка архива.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_trainings',
+        verbose_name='Владелец'
+    )
+    original_id = models.BigIntegerField(verbose_name='id тренировки до архивации')
+    title = models.CharField(max_length=200, verbose_name='Название')
+    exercise_count = models.PositiveIntegerField(default=0, verbose_name='Упражнений')
+    created_at = models.DateTimeField(verbose_name='Создана')
+    updated_at = models.DateTimeField(verbose_name='Последнее изменение')
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name='В архиве с')
+    payload = models.BinaryField(verbose_name='Сжатые данные')
+
+    class Meta:
+        verbose_name = 'Архивная тренировка'
+        verbose_name_plural = 'Архивные тренировки'
+        indexes = [models.Index(fields=['user', 'original_id'])]
+
+    def __str__(self):
+        return f"{self.title} (архив)"
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса: сэмплы стеков и SQL (см. training_plans/profiling.py)"""
+    url_name = models.CharField(max_length=200, blank=True, verbose_name='Имя URL')
+    path = models.CharField(max_length=500, verbose_name='Путь')
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Статус')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    duration_ms = models.FloatField(verbose_name='Длительность, мс')
+    sql_count = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    sql_ms = models.FloatField(verbose_name='Время SQL, мс')
+    sample_count = models.PositiveIntegerField(verbose_name='Сэмплов')
+    interval_ms = models.FloatField(verbose_name='Интервал сэмплирования, мс')
+    # Свернутые стеки: 'корень;...;лист <число сэмплов>' по строке на стек
+    stacks = models.TextField(blank=True)
+    queries = models.JSONField(default=list, verbose_name='Самые долгие SQL')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Снят')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        indexes = [
+            models.Index(fields=['-duration_ms']),
+            models.Index(fields=['url_name', '-duration_ms']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.url_name or self.path} — {self.duration_ms:.0f} мс"
+
+
+class PendingDeletion(models.Model):
+    """Крупное удаление, отложенное в фон (см. training_plans/deletion.py).
+
+    Строка живет в основной базе, пока удаление не завершится: если воркер
+    перезапустится посреди удаления, его доделает manage.py process_deletions.
+    """
+    KIND_CHOICES = [
+        ('account', 'Аккаунт'),
+        ('profile', 'Профиль'),
+        ('training', 'Тренировка'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='Что удаляется')
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    using = models.CharField(max_length=100, verbose_name='База')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Неудачных попыток')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Запланировано')
+
+    class Meta:
+        verbose_name = 'Отложенное удаление'
+        verbose_name_plural = 'Отложенные удаления'
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}"
@@ -0,0 +1,197 @@
+"""Профилирование отдельных запросов (RequestProfilingMiddleware).
+
+Профиль снимается для запроса сотрудника с ?profile=1 или для случайной доли
+SAMPLE_RATE всех запросов. Пока запрос выполняется, фоновый поток раз в
+INTERVAL секунд снимает стеки потоков запроса (sys._current_frames) и считает
+одинаковые стеки — из этих счетчиков строится flame graph. SQL замеряется
+обёрткой выполнения запросов, которая стоит на каждом соединении и ничего не
+делает, пока профиль не активен; поток, выполнивший SQL, тоже начинает
+сэмплироваться (так под ASGI в профиль попадает поток sync_to_async).
+
+Под ASGI поток цикла событий общий для всех запросов, поэтому в стеки могут
+попасть корутины соседних запросов.
+
+Профили хранятся в RequestProfile (основная база), не больше MAX_STORED
+последних; список самых медленных и flame graph — в админке.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.0,
+    'QUERY_PARAM': 'profile',
+    'INTERVAL': 0.005,
+    'MAX_STORED': 1000,
+    'MAX_DEPTH': 128,
+    'MAX_QUERIES': 50,
+}
+
+_active = ContextVar('fitgenius_request_profile', default=None)
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILING', {})}
+
+
+def profiling_requested(request):
+    """Запрошен ли профиль параметром адреса (право сотрудника проверяет middleware)."""
+    return request.GET.get(profiling_settings()['QUERY_PARAM']) == '1'
+
+
+def sampled():
+    rate = profiling_settings()['SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _frame_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def collapse_stack(frame, max_depth):
+    """Стек от корня к листу в свернутом формате 'a;b;c'."""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class RequestSampler:
+    """Сэмплирующий профилировщик одного запроса; используется как контекстный менеджер."""
+
+    def __init__(self, interval=None, max_depth=None):
+        options = profiling_settings()
+        self.interval = interval or options['INTERVAL']
+        self.max_depth = max_depth or options['MAX_DEPTH']
+        self.threads = {threading.get_ident()}
+        self.stacks = Counter()
+        self.queries = []
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fitgenius-profiler', daemon=True)
+
+    def __enter__(self):
+        self._token = _active.set(self)
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self._start
+        self._stop.set()
+        self._thread.join()
+        _active.reset(self._token)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in tuple(self.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[collapse_stack(frame, self.max_depth)] += 1
+
+    def add_query(self, alias, sql, duration):
+        self.threads.add(threading.get_ident())
+        self.queries.append((alias, duration, sql))
+
+
+def _time_sql(execute, sql, params, many, context):
+    sampler = _active.get()
+    if sampler is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sampler.add_query(context['connection'].alias, sql, time.perf_counter() - start)
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    """Ставит замер SQL на соединение; подключен к connection_created.
+
+    Обёртка вставляется первой: connection.execute_wrapper() снимает свою
+    обёртку через pop(), и добавленная в конец списка была бы снята вместо нее.
+    """
+    if _time_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_sql)
+
+
+def save_profile(request, response, sampler, user):
+    """Сохраняет профиль запроса и удаляет вышедшие за MAX_STORED."""
+    from .models import RequestProfile
+
+    options = profiling_settings()
+    match = getattr(request, 'resolver_match', None)
+    queries = sorted(sampler.queries, key=lambda query: query[1], reverse=True)
+    profile = RequestProfile.objects.create(
+        url_name=(match.view_name if match else '')[:200],
+        path=request.path[:500],
+        method=request.method,
+        status_code=response.status_code,
+        user=user if user is not None and user.is_authenticated else None,
+        duration_ms=sampler.duration * 1000,
+        sql_count=len(sampler.queries),
+        sql_ms=sum(query[1] for query in sampler.queries) * 1000,
+        sample_count=sum(sampler.stacks.values()),
+        interval_ms=sampler.interval * 1000,
+        stacks='\n'.join(f'{stack} {count}' for stack, count in sampler.stacks.most_common()),
+        queries=[
+            {'alias': alias, 'ms': round(duration * 1000, 3), 'sql': sql[:2000]}
+            for alias, duration, sql in queries[:options['MAX_QUERIES']]
+        ],
+    )
+    RequestProfile.objects.filter(pk__lte=profile.pk - options['MAX_STORED']).delete()
+    return profile
+
+
+def parse_stacks(text):
+    stacks = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            stacks[stack] += int(count)
+    return stacks
+
+
+def flame_graph(stacks, min_fraction=0.002):
+    """Прямоугольники flame graph: список словарей depth/left/width (в %)/name/samples.
+
+    Корень — сверху (icicle). Кадры уже min_fraction от общего числа
+    сэмплов отбрасываются вместе с потомками.
+    """
+    root = {'children': {}, 'samples': 0}
+    for stack, count in stacks.items():
+        root['samples'] += count
+        node = root
+        for name in stack.split(';'):
+            node = node['children'].setdefault(name, {'children': {}, 'samples': 0})
+            node['samples'] += count
+    total = root['samples']
+    if not total:
+        return []
+    boxes = []
+    pending = [(root, 0, 0)]
+    while pending:
+        node, depth, left = pending.pop()
+        for name, child in sorted(node['children'].items()):
+            width = child['samples'] / total
+            if width >= min_fraction:
+                boxes.append({
+                    'depth': depth,
+                    'left': round(left * 100, 3),
+                    'width': round(width * 100, 3),
+                    'name': name,
+                    'samples': child['samples'],
+                })
+                pending.append((child, depth + 1, left))
+            left += width
+    return boxes
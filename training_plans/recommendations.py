@@ -0,0 +1,411 @@
+"""Подбор шаблона тренировочного плана по ближайшей когорте.
+
+Профиль описывается вектором признаков: возраст, рост, вес и ИМТ
+стандартизуются, уровень подготовки — порядковый признак, пол и цель —
+one-hot. У каждого шаблона из PLAN_TEMPLATES есть когорты — точки того же
+пространства, для которых шаблон подходит лучше всего; признаки, не указанные
+в когорте, в расстоянии не участвуют. Выбирается шаблон ближайшей когорты
+(взвешенное квадратичное расстояние).
+
+Поэтому когорты одной цели задают одинаковый набор признаков: иначе когорта
+с меньшим числом признаков ближе просто за счет меньшего числа слагаемых.
+При общем наборе граница между когортами проходит посередине между их
+точками, и точки расставлены симметрично вокруг порогов правил.
+
+Когорты собраны в матрицы NumPy (PlanIndex) один раз на процесс; новые
+шаблоны дописываются в индекс без пересборки (register_plan_template).
+Расстояния до всех когорт считаются двумя матричными умножениями, поэтому
+подбор для одного профиля стоит микросекунды, а для всех профилей сразу —
+один векторизованный проход (recommend_many).
+"""
+import threading
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+# Признак: (среднее, стандартное отклонение) для стандартизации
+NUMERIC_FEATURES = {
+    'age': (35.0, 12.0),
+    'height': (172.0, 10.0),
+    'weight': (75.0, 15.0),
+    'bmi': (24.0, 4.0),
+}
+GENDERS = ('male', 'female')
+GOALS = ('weight_loss', 'muscle_gain', 'strength', 'endurance', 'health')
+LEVELS = ('beginner', 'intermediate', 'advanced')
+
+# Вклад признаков в расстояние: несовпадение цели (2 * 50) перевешивает любую
+# разницу в возрасте (16-80) и ИМТ до 40 единиц, поэтому цель решает первой,
+# а остальные признаки выбирают шаблон только внутри цели
+FEATURE_WEIGHTS = {
+    'age': 1.0,
+    'height': 0.25,
+    'weight': 0.25,
+    'bmi': 1.0,
+    'level': 1.0,
+    'gender': 0.5,
+    'goal': 50.0,
+}
+
+# Раскладка вектора: имя признака -> срез столбцов
+_LAYOUT = {}
+_offset = 0
+for _name in (*NUMERIC_FEATURES, 'level'):
+    _LAYOUT[_name] = slice(_offset, _offset + 1)
+    _offset += 1
+for _name, _choices in (('gender', GENDERS), ('goal', GOALS)):
+    _LAYOUT[_name] = slice(_offset, _offset + len(_choices))
+    _offset += len(_choices)
+FEATURE_COUNT = _offset
+
+_WEIGHTS = np.zeros(FEATURE_COUNT)
+for _name, _columns in _LAYOUT.items():
+    _WEIGHTS[_columns] = FEATURE_WEIGHTS[_name]
+
+_LEVEL_VALUE = {value: index for index, value in enumerate(LEVELS)}
+_GENDER_COLUMN = {value: _LAYOUT['gender'].start + i for i, value in enumerate(GENDERS)}
+_GOAL_COLUMN = {value: _LAYOUT['goal'].start + i for i, value in enumerate(GOALS)}
+
+
+PLAN_TEMPLATES = {
+    'weight_loss': {
+        'title': 'Похудение',
+        'cohorts': [{'goal': 'weight_loss', 'age': 50, 'bmi': 28}],
+        'days': {
+            'monday': [
+                {'name': 'Бег на дорожке', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
+                {'name': 'Приседания', 'sets': 3, 'reps': '15-20', 'rest': '45 сек'},
+                {'name': 'Выпады', 'sets': 3, 'reps': '12-15 на ногу', 'rest': '45 сек'},
+            ],
+            'wednesday': [
+                {'name': 'Эллиптический тренажер', 'sets': 1, 'reps': '25-35 мин', 'rest': '—'},
+                {'name': 'Жим гантелей лежа', 'sets': 3, 'reps': '12-15', 'rest': '45 сек'},
+                {'name': 'Тяга верхнего блока', 'sets': 3, 'reps': '12-15', 'rest': '45 сек'},
+            ],
+            'friday': [
+                {'name': 'Велотренажер', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
+                {'name': 'Планка', 'sets': 3, 'reps': '30-60 сек', 'rest': '30 сек'},
+                {'name': 'Скручивания', 'sets': 3, 'reps': '15-20', 'rest': '30 сек'},
+            ],
+        },
+    },
+    'low_impact': {
+        'title': 'Щадящий план',
+        # ИМТ больше 32 или возраст от 65 лет: без бега и прыжков, нагрузка на суставы ниже.
+        # Границы — середины между этими точками и когортами weight_loss и health (age 50)
+        'cohorts': [
+            {'goal': 'weight_loss', 'age': 50, 'bmi': 36},
+            {'goal': 'weight_loss', 'age': 79, 'bmi': 28},
+            {'goal': 'health', 'age': 79},
+        ],
+        'days': {
+            'monday': [
+                {'name': 'Ходьба', 'sets': 1, 'reps': '30-40 мин', 'rest': '—'},
+                {'name': 'Приседания к стулу', 'sets': 3, 'reps': '10-12', 'rest': '60 сек'},
+            ],
+            'wednesday': [
+                {'name': 'Плавание/Аквааэробика', 'sets': 1, 'reps': '30-40 мин', 'rest': '—'},
+                {'name': 'Тяга резиновой ленты', 'sets': 3, 'reps': '12-15', 'rest': '60 сек'},
+            ],
+            'friday': [
+                {'name': 'Велотренажер', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
+                {'name': 'Растяжка', 'sets': 1, 'reps': '15 мин', 'rest': '—'},
+            ],
+        },
+    },
+    'muscle_gain': {
+        'title': 'Набор мышечной массы',
+        'cohorts': [{'goal': 'muscle_gain', 'level': 'intermediate'}],
+        'days': {
+            'monday': [  # Грудь, трицепс
+                {'name': 'Жим штанги лежа', 'sets': 4, 'reps': '8-12', 'rest': '90 сек'},
+                {'name': 'Разводка гантелей', 'sets': 3, 'reps': '10-15', 'rest': '60 сек'},
+                {'name': 'Отжимания на брусьях', 'sets': 3, 'reps': '8-12', 'rest': '75 сек'},
+            ],
+            'tuesday': [  # Спина, бицепс
+                {'name': 'Становая тяга', 'sets': 4, 'reps': '6-10', 'rest': '120 сек'},
+                {'name': 'Подтягивания', 'sets': 3, 'reps': 'макс', 'rest': '90 сек'},
+                {'name': 'Тяга штанги в наклоне', 'sets': 3, 'reps': '8-12', 'rest': '75 сек'},
+            ],
+            'thursday': [  # Ноги, плечи
+                {'name': 'Приседания со штангой', 'sets': 4, 'reps': '8-12', 'rest': '120 сек'},
+                {'name': 'Жим гантелей сидя', 'sets': 3, 'reps': '10-15', 'rest': '60 сек'},
+                {'name': 'Подъем на носки', 'sets': 4, 'reps': '15-20', 'rest': '45 сек'},
+            ],
+        },
+    },
+    'full_body': {
+        'title': 'Все тело для начинающих',
+        # Новичкам в массе и силе сначала нужна техника базовых движений
+        'cohorts': [
+            {'goal': 'muscle_gain', 'level': 'beginner'},
+            {'goal': 'strength', 'level': 'beginner'},
+        ],
+        'days': {
+            'monday': [
+                {'name': 'Приседания с гантелью', 'sets': 3, 'reps': '10-12', 'rest': '90 сек'},
+                {'name': 'Жим гантелей лежа', 'sets': 3, 'reps': '10-12', 'rest': '90 сек'},
+                {'name': 'Тяга верхнего блока', 'sets': 3, 'reps': '10-12', 'rest': '90 сек'},
+            ],
+            'wednesday': [
+                {'name': 'Румынская тяга с гантелями', 'sets': 3, 'reps': '10-12', 'rest': '90 сек'},
+                {'name': 'Отжимания от пола', 'sets': 3, 'reps': '8-12', 'rest': '60 сек'},
+                {'name': 'Тяга гантели в наклоне', 'sets': 3, 'reps': '10-12', 'rest': '60 сек'},
+            ],
+            'friday': [
+                {'name': 'Жим ногами', 'sets': 3, 'reps': '10-12', 'rest': '90 сек'},
+                {'name': 'Жим гантелей сидя', 'sets': 3, 'reps': '10-12', 'rest': '60 сек'},
+                {'name': 'Планка', 'sets': 3, 'reps': '30-45 сек', 'rest': '45 сек'},
+            ],
+        },
+    },
+    'strength': {
+        'title': 'Развитие силы',
+        'cohorts': [{'goal': 'strength', 'level': 'intermediate'}],
+        'days': {
+            'monday': [
+                {'name': 'Приседания со штангой', 'sets': 5, 'reps': '3-5', 'rest': '180 сек'},
+                {'name': 'Жим ногами', 'sets': 3, 'reps': '6-8', 'rest': '120 сек'},
+            ],
+            'wednesday': [
+                {'name': 'Жим штанги лежа', 'sets': 5, 'reps': '3-5', 'rest': '180 сек'},
+                {'name': 'Армейский жим', 'sets': 3, 'reps': '5-8', 'rest': '120 сек'},
+            ],
+            'friday': [
+                {'name': 'Становая тяга', 'sets': 5, 'reps': '3-5', 'rest': '180 сек'},
+                {'name': 'Тяга штанги в наклоне', 'sets': 3, 'reps': '5-8', 'rest': '120 сек'},
+            ],
+        },
+    },
+    'endurance': {
+        'title': 'Выносливость',
+        'cohorts': [{'goal': 'endurance', 'age': 50}],
+        'days': {
+            'monday': [
+                {'name': 'Бег в равномерном темпе', 'sets': 1, 'reps': '30-45 мин', 'rest': '—'},
+                {'name': 'Выпады', 'sets': 3, 'reps': '15 на ногу', 'rest': '45 сек'},
+            ],
+            'wednesday': [
+                {'name': 'Интервальный бег', 'sets': 6, 'reps': '2 мин быстро / 2 мин шагом', 'rest': '—'},
+                {'name': 'Берпи', 'sets': 3, 'reps': '10-15', 'rest': '60 сек'},
+            ],
+            'saturday': [
+                {'name': 'Длительная кардиосессия', 'sets': 1, 'reps': '60-90 мин', 'rest': '—'},
+                {'name': 'Планка', 'sets': 3, 'reps': '45-60 сек', 'rest': '30 сек'},
+            ],
+        },
+    },
+    'health': {
+        'title': 'Общее оздоровление',
+        # С 65 лет цель «выносливость» получает общий план (граница — середина между 50 и 79)
+        'cohorts': [{'goal': 'health', 'age': 50}, {'goal': 'endurance', 'age': 79}],
+        'days': {
+            'monday': [
+                {'name': 'Ходьба/Бег', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
+                {'name': 'Приседания с собственным весом', 'sets': 3, 'reps': '12-15', 'rest': '60 сек'},
+            ],
+            'wednesday': [
+                {'name': 'Плавание/Велосипед', 'sets': 1, 'reps': '25-35 мин', 'rest': '—'},
+                {'name': 'Отжимания от пола', 'sets': 3, 'reps': '8-12', 'rest': '60 сек'},
+            ],
+            'friday': [
+                {'name': 'Йога/Растяжка', 'sets': 1, 'reps': '20-30 мин', 'rest': '—'},
+                {'name': 'Планка', 'sets': 3, 'reps': '30-45 сек', 'rest': '45 сек'},
+            ],
+        },
+    },
+}
+
+
+def _encode_cohort(cohort):
+    """Когорта -> (значения, маска) в раскладке вектора признаков."""
+    values = np.zeros(FEATURE_COUNT)
+    mask = np.zeros(FEATURE_COUNT)
+    for name, value in cohort.items():
+        columns = _LAYOUT[name]
+        mask[columns] = 1
+        if name in NUMERIC_FEATURES:
+            mean, std = NUMERIC_FEATURES[name]
+            values[columns] = (value - mean) / std
+        elif name == 'level':
+            values[columns] = LEVELS.index(value)
+        else:
+            choices = GENDERS if name == 'gender' else GOALS
+            values[columns.start + choices.index(value)] = 1
+    return values, mask
+
+
+def feature_matrix(rows):
+    """Матрица признаков (len(rows) x FEATURE_COUNT).
+
+    rows — последовательность кортежей (age, height, weight, gender, goal,
+    fitness_level), например из values_list. Неизвестные значения пола,
+    цели и уровня дают нулевые столбцы.
+    """
+    count = len(rows)
+    matrix = np.zeros((count, FEATURE_COUNT))
+    if not count:
+        return matrix
+    columns = list(zip(*rows))
+    age, height, weight = (np.asarray(column, dtype=float) for column in columns[:3])
+    bmi = weight / (height / 100) ** 2
+    for name, values in (('age', age), ('height', height), ('weight', weight), ('bmi', bmi)):
+        mean, std = NUMERIC_FEATURES[name]
+        matrix[:, _LAYOUT[name].start] = (values - mean) / std
+    matrix[:, _LAYOUT['level'].start] = [_LEVEL_VALUE.get(value, 0) for value in columns[5]]
+    positions = np.arange(count)
+    for index, values in ((_GENDER_COLUMN, columns[3]), (_GOAL_COLUMN, columns[4])):
+        hot = np.array([index.get(value, -1) for value in values])
+        known = hot >= 0
+        matrix[positions[known], hot[known]] = 1
+    return matrix
+
+
+def profile_vector(profile):
+    """Вектор признаков одного профиля (1 x FEATURE_COUNT) без накладных расходов feature_matrix."""
+    vector = [0.0] * FEATURE_COUNT
+    bmi = profile.weight / (profile.height / 100) ** 2
+    for name, value in (('age', profile.age), ('height', profile.height), ('weight', profile.weight), ('bmi', bmi)):
+        mean, std = NUMERIC_FEATURES[name]
+        vector[_LAYOUT[name].start] = (value - mean) / std
+    vector[_LAYOUT['level'].start] = _LEVEL_VALUE.get(profile.fitness_level, 0)
+    for index, value in ((_GENDER_COLUMN, profile.gender), (_GOAL_COLUMN, profile.goal)):
+        if value in index:
+            vector[index[value]] = 1.0
+    return np.array([vector])
+
+
+def profile_row(profile):
+    return (profile.age, profile.height, profile.weight, profile.gender, profile.goal, profile.fitness_level)
+
+
+class PlanIndex:
+    """Индекс когорт шаблонов.
+
+    Взвешенное расстояние с маской раскладывается на
+    sum(m*w*x^2) - 2*sum(m*w*c*x) + sum(m*w*c^2); по когортам хранятся
+    m*w, m*w*c и свободный член, и расстояния до всех когорт для матрицы
+    профилей X — это X^2 @ A.T - 2 X @ B.T + k.
+    """
+
+    def __init__(self):
+        self.keys = []
+        # (шаблон когорты, m*w, m*w*c, свободный член) — заменяются одним присваиванием,
+        # поэтому параллельный поиск видит либо старый, либо новый индекс
+        self._arrays = (np.zeros(0, dtype=int), np.zeros((0, FEATURE_COUNT)), np.zeros((0, FEATURE_COUNT)), np.zeros(0))
+        self._lock = threading.Lock()
+
+    def add(self, key, cohorts):
+        """Добавляет когорты шаблона `key`; уже закодированные строки не пересчитываются."""
+        quadratic, linear, constant = [], [], []
+        for cohort in cohorts:
+            values, mask = _encode_cohort(cohort)
+            weighted = mask * _WEIGHTS
+            quadratic.append(weighted)
+            linear.append(weighted * values)
+            constant.append(weighted @ (values * values))
+        if not quadratic:
+            return
+        with self._lock:
+            if key not in self.keys:
+                self.keys.append(key)
+            position = self.keys.index(key)
+            templates, old_quadratic, old_linear, old_constant = self._arrays
+            self._arrays = (
+                np.concatenate([templates, np.full(len(quadratic), position)]),
+                np.vstack([old_quadratic, quadratic]),
+                np.vstack([old_linear, linear]),
+                np.concatenate([old_constant, constant]),
+            )
+
+    def __len__(self):
+        return len(self._arrays[0])
+
+    def _distances(self, matrix, arrays):
+        _, quadratic, linear, constant = arrays
+        return (matrix * matrix) @ quadratic.T - 2 * (matrix @ linear.T) + constant
+
+    def distances(self, matrix):
+        """Расстояния от каждого профиля до каждой когорты (профили x когорты)."""
+        return self._distances(matrix, self._arrays)
+
+    def nearest(self, matrix):
+        """Ключи шаблонов ближайших когорт для строк `matrix`."""
+        arrays = self._arrays
+        templates = arrays[0][self._distances(matrix, arrays).argmin(axis=1)]
+        keys = self.keys
+        return [keys[position] for position in templates.tolist()]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_plan_index():
+    """Индекс шаблонов PLAN_TEMPLATES, один на процесс."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = PlanIndex()
+            for key, template in PLAN_TEMPLATES.items():
+                index.add(key, template['cohorts'])
+            _index = index
+    return _index
+
+
+def register_plan_template(key, title, days, cohorts):
+    """Добавляет шаблон (или новые когорты существующего) и дописывает его в индекс."""
+    with _index_lock:
+        template = PLAN_TEMPLATES.setdefault(key, {'title': title, 'days': days, 'cohorts': []})
+        template['cohorts'] = template['cohorts'] + list(cohorts)
+        index = _index
+    if index is not None:
+        index.add(key, cohorts)
+
+
+def recommend_plan(profile):
+    """Ключ шаблона плана для профиля."""
+    return get_plan_index().nearest(profile_vector(profile))[0]
+
+
+def recommend_many(rows, chunk_size=10000):
+    """Ключи шаблонов для строк профилей (см. feature_matrix), порциями по chunk_size."""
+    index = get_plan_index()
+    keys = []
+    for start in range(0, len(rows), chunk_size):
+        keys.extend(index.nearest(feature_matrix(rows[start:start + chunk_size])))
+    return keys
+
+
+def regenerate_plans(queryset, using, batch_size=2000):
+    """Перегенерирует планы профилей `queryset` на базе `using` пачками.
+
+    На пачку — один проход recommend_many, один DELETE старых строк плана,
+    один bulk_create и один UPDATE updated_at; кэш профилей сбрасывается
+    вручную, потому что update() не отправляет post_save. Возвращает число профилей.
+    """
+    from .caching import profile_cache_key
+    from .models import UserProfile, TrainingPlan
+
+    queryset = queryset.using(using).order_by('pk')
+    done = 0
+    last_pk = 0
+    while True:
+        profiles = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not profiles:
+            return done
+        last_pk = profiles[-1].pk
+        keys = recommend_many([profile_row(profile) for profile in profiles])
+        rows = []
+        for profile, key in zip(profiles, keys):
+            rows.extend(profile.build_training_plan(key))
+        ids = [profile.pk for profile in profiles]
+        with transaction.atomic(using=using):
+            TrainingPlan.objects.using(using).filter(user_profile_id__in=ids).delete()
+            TrainingPlan.objects.using(using).bulk_create(rows, batch_size=1000)
+            UserProfile.objects.using(using).filter(pk__in=ids).update(updated_at=timezone.now())
+        cache.delete_many([profile_cache_key(profile.user_id) for profile in profiles])
+        done += len(profiles)
@@ -0,0 +1,185 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+
+PRIMARY_DB = 'default'
+STICKY_COOKIE = 'fg_primary'
+
+# Включается только внутри представлений, помеченных read_only_view
+_replica_reads = ContextVar('replica_reads', default=False)
+# Была ли запись в основную базу в рамках текущего запроса
+_wrote_primary = ContextVar('wrote_primary', default=False)
+# Шард текущего пользователя: алиас или функция без аргументов, которая его вернет
+_current_shard = ContextVar('current_shard', default=None)
+
+# Данные пользователя, которые хранятся на его шарде
+SHARDED_MODELS = {'userprofile', 'trainingplan', 'training', 'exercise', 'archivedtraining'}
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def replica_reads():
+    """Чтения внутри блока уходят на реплики (до первой записи)."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def shard_aliases():
+    return getattr(settings, 'USER_SHARDS', [])
+
+
+def shard_for_user(user_id):
+    shards = shard_aliases()
+    if not shards:
+        return PRIMARY_DB
+    return shards[int(user_id) % len(shards)]
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'training_plans' and model._meta.model_name in SHARDED_MODELS
+
+
+def current_shard():
+    value = _current_shard.get()
+    if callable(value):
+        value = value()
+    return value
+
+
+def set_current_shard(value):
+    """Задает шард для запросов без явного instance: алиас или функцию-резолвер."""
+    _current_shard.set(value)
+
+
+@contextmanager
+def use_shard(alias):
+    """Направляет запросы к шардированным моделям внутри блока на `alias`."""
+    token = _current_shard.set(alias)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def begin_request():
+    _wrote_primary.set(False)
+    _replica_reads.set(False)
+    _current_shard.set(None)
+
+
+def wrote_primary():
+    return _wrote_primary.get()
+
+
+def is_sticky(request):
+    """Пользователь недавно писал в основную базу — читаем свои записи оттуда же."""
+    return STICKY_COOKIE in request.COOKIES
+
+
+def read_only_view(view_func):
+    """Помечает представление как читающее: запросы идут на реплики,
+    если пользователь не писал в основную базу последние REPLICA_STICKY_SECONDS."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if not replica_aliases() or is_sticky(request):
+                return await view_func(request, *args, **kwargs)
+            with replica_reads():
+                return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not replica_aliases() or is_sticky(request):
+            return view_func(request, *args, **kwargs)
+        with replica_reads():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтения из read_only_view — на случайную реплику, все записи — в default.
+
+    После первой записи в запросе оставшиеся чтения тоже идут в default,
+    чтобы представление видело только что сохраненные данные.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        replicas = replica_aliases()
+        if not replicas:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote_primary.set(True)
+        _replica_reads.set(False)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {PRIMARY_DB, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема на реплики приезжает репликацией с основной базы
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ShardRouter:
+    """Хранит данные пользователя (профиль, план, тренировки) на шарде по id.
+
+    Включается настройкой USER_SHARDS. Пользователи, сессии и остальные таблицы
+    остаются в default (шард 0). Шард выбирается по instance из подсказок роутеру
+    или по текущему пользователю запроса (см. ShardMiddleware), поэтому любой
+    запрос к данным одного пользователя обращается ровно к одному шарду.
+    """
+
+    def _db(self, model, **hints):
+        if not shard_aliases():
+            return None
+        if model is get_user_model():
+            return PRIMARY_DB
+        if not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, get_user_model()):
+            return shard_for_user(instance.pk)
+        if instance is not None and instance._state.db in shard_aliases():
+            return instance._state.db
+        return current_shard() or PRIMARY_DB
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        db = self._db(model, **hints)
+        if db is not None:
+            _wrote_primary.set(True)
+        return db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not shard_aliases():
+            return None
+        user_model = get_user_model()
+        for user, other in ((obj1, obj2), (obj2, obj1)):
+            # Пользователь живет в default, но его копия есть на шарде
+            if isinstance(user, user_model) and is_sharded(type(other)):
+                return True
+        return None
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import UserProfile, TrainingPlan, Training, Exercise, ArchivedTraining
+from .routers import PRIMARY_DB, shard_aliases, shard_for_user
+
+
+def mirror_user(user, alias=None):
+    """Копирует строку пользователя на его шард.
+
+    Внешние ключи профиля и тренировок ссылаются на таблицу пользователей,
+    поэтому на каждом шарде хранится копия строк его пользователей.
+    """
+    alias = alias or shard_for_user(user.pk)
+    if alias == PRIMARY_DB:
+        return
+    fields = {
+        field.attname: getattr(user, field.attname)
+        for field in user._meta.concrete_fields
+        if not field.primary_key
+    }
+    type(user)._base_manager.using(alias).update_or_create(pk=user.pk, defaults=fields)
+
+
+def mirror_user_on_save(sender, instance, raw=False, using=None, **kwargs):
+    if shard_aliases() and not raw and using == PRIMARY_DB:
+        mirror_user(instance)
+
+
+def drop_user_on_delete(sender, instance, using=None, **kwargs):
+    """Удаляет копию пользователя вместе с его данными на шарде."""
+    if not shard_aliases() or using != PRIMARY_DB:
+        return
+    alias = shard_for_user(instance.pk)
+    if alias != PRIMARY_DB:
+        type(instance)._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+
+def misplaced_users(alias):
+    """id пользователей, чьи данные лежат на `alias`, хотя должны лежать на другом шарде."""
+    user_ids = set(UserProfile.objects.using(alias).values_list('user_id', flat=True))
+    user_ids.update(Training.objects.using(alias).values_list('user_id', flat=True).distinct())
+    user_ids.update(ArchivedTraining.objects.using(alias).values_list('user_id', flat=True).distinct())
+    return sorted(pk for pk in user_ids if shard_for_user(pk) != alias)
+
+
+def _copy_rows(queryset, target, model, batch_size, **overrides):
+    fields = [
+        f.attname for f in model._meta.concrete_fields
+        if not f.primary_key and f.attname not in overrides
+    ]
+    batch = []
+    for values in queryset.values(*fields).iterator(chunk_size=batch_size):
+        batch.append(model(**values, **overrides))
+        if len(batch) >= batch_size:
+            model.objects.using(target).bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.using(target).bulk_create(batch)
+
+
+def _save_copy(obj, target):
+    """Сохраняет объект на `target` как новую строку, не сбрасывая created_at/updated_at."""
+    timestamps = {name: getattr(obj, name) for name in ('created_at', 'updated_at')}
+    obj.pk = None
+    obj._state.adding = True
+    obj.save(using=target)
+    type(obj).objects.using(target).filter(pk=obj.pk).update(**timestamps)
+    return obj.pk
+
+
+def move_user(user_id, source, target, batch_size=1000):
+    """Переносит данные пользователя с шарда `source` на `target`.
+
+    Строки получают новые первичные ключи на целевом шарде (последовательности
+    у шардов независимы), поэтому ссылки на старые id тренировок перестают работать.
+    """
+    user = get_user_model()._base_manager.using(PRIMARY_DB).get(pk=user_id)
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        mirror_user(user, target)
+
+        profile = UserProfile.objects.using(source).filter(user_id=user_id).first()
+        if profile is not None:
+            old_profile_pk = profile.pk
+            new_profile_pk = _save_copy(profile, target)
+            _copy_rows(
+                TrainingPlan.objects.using(source).filter(user_profile_id=old_profile_pk),
+                target, TrainingPlan, batch_size, user_profile_id=new_profile_pk,
+            )
+
+        for training in Training.objects.using(source).filter(user_id=user_id).order_by('pk'):
+            old_training_pk = training.pk
+            new_training_pk = _save_copy(training, target)
+            _copy_rows(
+                Exercise.objects.using(source).filter(training_id=old_training_pk),
+                target, Exercise, batch_size, training_id=new_training_pk,
+            )
+
+        _copy_rows(ArchivedTraining.objects.using(source).filter(user_id=user_id), target, ArchivedTraining, batch_size)
+
+        ArchivedTraining.objects.using(source).filter(user_id=user_id).delete()
+        Exercise.objects.using(source).filter(training__user_id=user_id).delete()
+        Training.objects.using(source).filter(user_id=user_id).delete()
+        TrainingPlan.objects.using(source).filter(user_profile__user_id=user_id).delete()
+        UserProfile.objects.using(source).filter(user_id=user_id).delete()
+        if source != PRIMARY_DB:
+            get_user_model()._base_manager.using(source).filter(pk=user_id).delete()
@@ -0,0 +1,27 @@
+import re
+
+from django.conf import settings
+
+
+_PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Применяет settings.SQLITE_PRAGMAS к каждому новому SQLite-соединению.
+
+    Подключается к сигналу `connection_created`, поэтому при постоянных
+    соединениях (CONN_MAX_AGE > 0) PRAGMA выполняются один раз на соединение.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    raw = connection.connection
+    for name, value in pragmas.items():
+        if not _PRAGMA_NAME.match(name):
+            raise ValueError(f'Некорректное имя PRAGMA: {name!r}')
+        if not isinstance(value, int) and not re.match(r'^[A-Za-z0-9_-]+$', str(value)):
+            raise ValueError(f'Некорректное значение PRAGMA {name}: {value!r}')
+        raw.execute(f'PRAGMA {name} = {value}')
+
@@ -0,0 +1,116 @@
+"""Статика для продакшена: имена с хешем содержимого и сжатие при сборке.
+
+Включается переменной окружения FITGENIUS_STATIC_PIPELINE=1 (settings.py).
+collectstatic с CompressedManifestStaticFilesStorage кладет в STATIC_ROOT
+файлы с хешем в имени (base.1a2b3c4d5e6f.css) и рядом их заранее сжатые
+копии .gz и .br, так что при отдаче ничего не сжимается на лету.
+PrecompressedStaticMiddleware (training_plans/middleware.py) выбирает копию
+по Accept-Encoding и ставит Cache-Control: immutable для файлов с хешем.
+
+Пакет brotli необязателен (в requirements.txt закомментирован): без него создаются только .gz.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot'}
+
+# Сжатая копия сохраняется, только если она меньше оригинала хотя бы на 5%
+MIN_COMPRESSION_RATIO = 0.95
+
+# Кодировки в порядке предпочтения: (имя в Accept-Encoding, расширение копии)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Хеш, который ManifestStaticFilesStorage вставляет перед расширением
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=11)
+    # mtime=0: одинаковый файл дает одинаковый .gz при каждой сборке
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return [(name, suffix) for name, suffix in ENCODINGS if name != 'br' or brotli is not None]
+
+
+def write_compressed(path):
+    """Создает рядом с `path` сжатые копии, если они заметно меньше; возвращает их пути."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, 'rb') as f:
+        content = f.read()
+    written = []
+    for encoding, suffix in available_encodings():
+        compressed = compress(content, encoding)
+        if len(compressed) >= len(content) * MIN_COMPRESSION_RATIO:
+            continue
+        with open(path + suffix, 'wb') as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+def static_file_index(root):
+    """{путь относительно STATIC_ROOT: описание файла} для PrecompressedStaticMiddleware.
+
+    Описание: content_type, immutable (в имени есть хеш) и variants —
+    {кодировка или '': (путь, размер, etag)}.
+    """
+    compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    index = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(compressed_suffixes):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            variants = {}
+            for encoding, suffix in (('', ''), *ENCODINGS):
+                try:
+                    stat = os.stat(path + suffix)
+                except FileNotFoundError:
+                    continue
+                variants[encoding] = (path + suffix, stat.st_size, f'"{stat.st_size:x}-{int(stat.st_mtime):x}{suffix}"')
+            content_type, _ = mimetypes.guess_type(filename)
+            index[name] = {
+                'content_type': content_type or 'application/octet-stream',
+                'immutable': bool(HASHED_NAME.search(filename)),
+                'variants': variants,
+            }
+    return index
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещенных q=0."""
+    accepted = set()
+    for token in header.split(','):
+        name, _, params = token.partition(';')
+        params = params.replace(' ', '')
+        if params in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который после хеширования сжимает файлы в .gz и .br."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Сжимаются итоговые файлы с хешем: ссылки в CSS к этому моменту уже переписаны
+        for hashed_name in set(self.hashed_files.values()):
+            write_compressed(self.path(hashed_name))
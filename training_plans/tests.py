@@ -1,6 +1,15 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+from django.conf import settings
+from django.test import TestCase, Client, override_settings
+from django.http import HttpResponse
+from django.urls import include, path, reverse
 from .models import CustomUser, UserProfile
+from . import async_urls, urls
+
+
+# URLconf режима ASYNC_VIEWS: асинхронные маршруты перекрывают синхронные
+urlpatterns = [
+	path('', include((async_urls.urlpatterns + urls.urlpatterns, 'training_plans'))),
+]
 
 
 class AuthAndSecurityTests(TestCase):
@@ -76,3 +85,1067 @@ class TrainingCrudTests(TestCase):
 		resp2 = self.client.get(reverse('training_plans:training_export', kwargs={'pk': training.pk}))
 		self.assertEqual(resp2.status_code, 404)
 
+
+
+class TrainingImportTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = CustomUser.objects.create_user(username='imp', email='imp@example.com', password='pw')
+		self.other = CustomUser.objects.create_user(username='other', email='other@example.com', password='pw')
+
+	def _csv(self, text):
+		from io import BytesIO
+		return BytesIO(text.encode('utf-8'))
+
+	def test_csv_import_reports_bad_rows_and_keeps_good_ones(self):
+		from .imports import import_trainings
+		from .models import Training, Exercise
+		data = (
+			'Тренировка;День;Упражнение;Подходы;Повторы;Отдых;Примечания\n'
+			'Сила;Понедельник;Присед;5;5;180 сек;\n'
+			'Сила;funday;Жим;5;5;;\n'
+			'Сила;wednesday;Тяга;много;5;;\n'
+			'Кардио;friday;Бег;1;30 мин;;легко\n'
+		)
+		result = import_trainings(self._csv(data), 'plan.csv', user=self.user, batch_size=2)
+		self.assertEqual(result.exercises_created, 2)
+		self.assertEqual(result.trainings_created, 2)
+		self.assertEqual([line for line, _ in result.errors], [3, 4])
+		self.assertEqual(Training.objects.filter(user=self.user).count(), 2)
+		self.assertEqual(Exercise.objects.get(name='Присед').rest_time, '180 сек')
+		self.assertEqual(Exercise.objects.get(name='Бег').training.title, 'Кардио')
+
+	def test_foreign_email_rejected_without_roster_permission(self):
+		from .imports import import_trainings
+		data = 'Email,День,Упражнение,Подходы,Повторы\nother@example.com,monday,Присед,3,10\n'
+		result = import_trainings(self._csv(data), 'plan.csv', user=self.user)
+		self.assertEqual(result.exercises_created, 0)
+		self.assertEqual(result.error_count, 1)
+
+		result = import_trainings(self._csv(data), 'plan.csv', allow_other_users=True)
+		self.assertEqual(result.exercises_created, 1)
+		self.assertTrue(self.other.trainings.exists())
+
+	def test_cp1251_csv_imported_and_unreadable_file_rolled_back(self):
+		from io import BytesIO
+		from .imports import import_trainings, TrainingImportError
+		from .models import Training, Exercise
+		data = 'Тренировка;День;Упражнение;Подходы;Повторы\nСила;Понедельник;Присед;5;5\n'
+		result = import_trainings(BytesIO(data.encode('cp1251')), 'plan.csv', user=self.user)
+		self.assertEqual(result.exercises_created, 1)
+		self.assertTrue(Training.objects.filter(user=self.user, title='Сила').exists())
+
+		# Кодировка определяется по началу файла; байты cp1251 встречаются
+		# дальше, когда первые пачки уже записаны
+		broken = ('День,Упражнение,Подходы,Повторы\n' + 'monday,Присед,3,10\n' * 4000).encode('utf-8') + 'tuesday,Жим,3,10\n'.encode('cp1251')
+		with self.assertRaisesMessage(TrainingImportError, 'Файл не в кодировке utf-8-sig'):
+			import_trainings(BytesIO(broken), 'broken.csv', user=self.user, batch_size=1000)
+		# Пачки уже закоммичены по отдельности — созданное импортом удаляется после ошибки
+		self.assertFalse(Training.objects.filter(title='broken').exists())
+		self.assertFalse(Exercise.objects.filter(training__title='broken').exists())
+
+	def test_corrupt_xlsx_reported_as_form_error(self):
+		from io import BytesIO
+		self.client.login(username='imp@example.com', password='pw')
+		upload = BytesIO(b'not a zip archive')
+		upload.name = 'plan.xlsx'
+		resp = self.client.post(reverse('training_plans:training_import'), {'file': upload})
+		self.assertEqual(resp.status_code, 200)
+		self.assertIn('Файл не является книгой Excel', resp.context['form'].errors['file'][0])
+
+	def test_exported_xlsx_can_be_imported_back(self):
+		from io import BytesIO
+		from .models import Training, Exercise
+		training = Training.objects.create(user=self.user, title='Круг')
+		Exercise.objects.create(training=training, day='tuesday', name='Подтягивания', sets=3, reps='макс')
+		self.client.login(username='imp@example.com', password='pw')
+		exported = self.client.get(reverse('training_plans:training_export', kwargs={'pk': training.pk})).content
+
+		upload = BytesIO(exported)
+		upload.name = 'круг.xlsx'
+		resp = self.client.post(reverse('training_plans:training_import'), {'file': upload})
+		self.assertRedirects(resp, reverse('training_plans:training_list'))
+		imported = Training.objects.get(user=self.user, title='круг')
+		self.assertEqual(list(imported.exercises.values_list('day', 'name', 'sets')), [('tuesday', 'Подтягивания', 3)])
+
+
+class SqlitePragmaTests(TestCase):
+	def test_pragmas_applied_to_new_connection(self):
+		from django.db import connection
+		from django.test import override_settings
+		from .sqlite import apply_sqlite_pragmas
+		with override_settings(SQLITE_PRAGMAS={'busy_timeout': 4321, 'cache_size': -2000}):
+			apply_sqlite_pragmas(sender=None, connection=connection)
+		with connection.cursor() as cursor:
+			cursor.execute('PRAGMA busy_timeout')
+			self.assertEqual(cursor.fetchone()[0], 4321)
+			cursor.execute('PRAGMA cache_size')
+			self.assertEqual(cursor.fetchone()[0], -2000)
+
+	def test_rejects_unsafe_pragma(self):
+		from django.db import connection
+		from django.test import override_settings
+		from .sqlite import apply_sqlite_pragmas
+		with override_settings(SQLITE_PRAGMAS={'cache_size': '1; DROP TABLE x'}):
+			with self.assertRaises(ValueError):
+				apply_sqlite_pragmas(sender=None, connection=connection)
+
+
+class ReplicaRoutingTests(TestCase):
+	def setUp(self):
+		from django.test import RequestFactory
+		self.factory = RequestFactory()
+
+	def _routed_view(self):
+		from .models import Training
+		from .routers import ReplicaRouter, read_only_view
+		seen = []
+
+		@read_only_view
+		def view(request):
+			router = ReplicaRouter()
+			seen.append(router.db_for_read(Training))
+			router.db_for_write(Training)
+			seen.append(router.db_for_read(Training))
+			return HttpResponse()
+		return view, seen
+
+	def test_read_only_view_reads_from_replica_until_first_write(self):
+		from django.test import override_settings
+		from .models import Training
+		from .routers import ReplicaRouter
+		view, seen = self._routed_view()
+		with override_settings(DATABASE_REPLICAS=['replica1']):
+			view(self.factory.get('/'))
+			self.assertIsNone(ReplicaRouter().db_for_read(Training))
+		self.assertEqual(seen, ['replica1', None])
+
+	def test_sticky_cookie_pins_reads_to_primary(self):
+		from django.test import override_settings
+		from .routers import STICKY_COOKIE
+		view, seen = self._routed_view()
+		request = self.factory.get('/')
+		request.COOKIES[STICKY_COOKIE] = '1'
+		with override_settings(DATABASE_REPLICAS=['replica1']):
+			view(request)
+		self.assertEqual(seen, [None, None])
+
+	def test_write_sets_sticky_cookie(self):
+		from .routers import STICKY_COOKIE
+		user = CustomUser.objects.create_user(username='rw', email='rw@example.com', password='pw')
+		self.client.login(username='rw@example.com', password='pw')
+		resp = self.client.post(reverse('training_plans:training_create'), {'title': 'Запись'})
+		self.assertIn(STICKY_COOKIE, resp.cookies)
+		self.assertTrue(user.trainings.filter(title='Запись').exists())
+
+
+class ShardRoutingTests(TestCase):
+	def test_user_data_routed_to_single_shard(self):
+		from django.test import override_settings
+		from .models import Training, Exercise, TrainingPlan
+		from .routers import ShardRouter, use_shard, shard_for_user
+		router = ShardRouter()
+		with override_settings(USER_SHARDS=['default', 'shard1']):
+			self.assertEqual(shard_for_user(2), 'default')
+			self.assertEqual(shard_for_user(3), 'shard1')
+			# Пользователи и сессии всегда в default
+			self.assertEqual(router.db_for_read(CustomUser), 'default')
+			user = CustomUser(pk=3)
+			self.assertEqual(router.db_for_read(Training, instance=user), 'shard1')
+			with use_shard(shard_for_user(user.pk)):
+				aliases = {router.db_for_read(m) for m in (UserProfile, TrainingPlan, Training, Exercise)}
+				aliases.add(router.db_for_write(Exercise))
+			self.assertEqual(aliases, {'shard1'})
+
+	@override_settings(USER_SHARDS=[])
+	def test_router_disabled_without_shards(self):
+		from .models import Training
+		from .routers import ShardRouter
+		self.assertIsNone(ShardRouter().db_for_read(Training))
+		self.assertIsNone(ShardRouter().db_for_write(CustomUser))
+
+
+@override_settings(USER_SHARDS=['default', 'shard1'])
+class ShardedWritePathTests(TestCase):
+	"""Без FITGENIUS_DB_SHARDS шард shard1 поднимается на время класса как база SQLite в памяти."""
+	databases = {'default', *settings.USER_SHARDS}
+
+	@classmethod
+	def setUpClass(cls):
+		from django.core.management import call_command
+		from django.db import connections
+		cls.own_shard = 'shard1' not in connections
+		if cls.own_shard:
+			connections.settings['shard1'] = {**connections.settings['default'], 'NAME': 'file:memorydb_shard1?mode=memory&cache=shared'}
+			call_command('migrate', database='shard1', verbosity=0)
+		cls.databases = {'default', 'shard1'}
+		super().setUpClass()
+
+	@classmethod
+	def tearDownClass(cls):
+		from django.db import connections
+		super().tearDownClass()
+		if cls.own_shard:
+			connection = connections['shard1']
+			if connection.connection is not None:
+				connection.connection.close()
+			del connections['shard1']
+			del connections.settings['shard1']
+
+	def setUp(self):
+		from .routers import shard_for_user
+		users = [CustomUser.objects.create_user(username=f's{i}', email=f's{i}@example.com', password='pw') for i in range(2)]
+		self.near, self.far = sorted(users, key=lambda user: shard_for_user(user.pk) == 'shard1')
+		self.assertEqual(shard_for_user(self.far.pk), 'shard1')
+
+	def test_import_writes_to_owner_shard(self):
+		from io import BytesIO
+		from .imports import import_trainings
+		from .models import Training
+		data = 'Email,Тренировка,День,Упражнение,Подходы,Повторы\ns0@example.com,Сила,monday,Присед,3,10\ns1@example.com,Сила,monday,Присед,3,10\n'
+		result = import_trainings(BytesIO(data.encode()), 'plan.csv', allow_other_users=True)
+		self.assertEqual(result.exercises_created, 2)
+		self.assertEqual(list(Training.objects.using('shard1').values_list('user_id', flat=True)), [self.far.pk])
+		self.assertEqual(list(Training.objects.using('default').values_list('user_id', flat=True)), [self.near.pk])
+
+	def test_pdf_batch_reads_every_shard(self):
+		from .exports import profile_pdf_batch_data
+		from .routers import shard_for_user
+		for user in (self.near, self.far):
+			UserProfile.objects.using(shard_for_user(user.pk)).create(user=user, age=30, height=180, weight=80, gender='male', goal='health', fitness_level='beginner')
+		names = {data['username'] for data in profile_pdf_batch_data(UserProfile.objects.order_by('pk'))}
+		self.assertEqual(names, {'s0', 's1'})
+
+	@override_settings(ROOT_URLCONF='fitgenius_project.urls')
+	def test_admin_and_bulk_clone_use_owner_shard(self):
+		from .models import Training
+		# id тренировок на разных шардах совпадают
+		near = Training.objects.using('default').create(user=self.near, title='Ближняя')
+		far = Training.objects.using('shard1').create(user=self.far, title='Дальняя')
+		self.assertEqual(near.pk, far.pk)
+		staff = CustomUser.objects.create_superuser(username='boss', email='boss@example.com', password='pw')
+		self.client.force_login(staff)
+
+		changelist = reverse('admin:training_plans_training_changelist')
+		self.assertContains(self.client.get(changelist), 'Ближняя')
+		response = self.client.get(changelist, {'shard': 'shard1'})
+		self.assertContains(response, 'Дальняя')
+		self.assertNotContains(response, 'Ближняя')
+		change = reverse('admin:training_plans_training_change', args=[far.pk])
+		self.assertContains(self.client.get(change, {'_changelist_filters': 'shard=shard1'}), 'Дальняя')
+
+		url = reverse('training_plans:training_bulk_clone', kwargs={'pk': far.pk})
+		self.assertContains(self.client.get(url, {'owner': self.far.pk}), 'Дальняя')
+		self.assertContains(self.client.get(url, {'owner': self.near.pk}), 'Ближняя')
+		self.assertEqual(self.client.get(url, {'owner': staff.pk}).status_code, 404)
+
+
+class CachedAuthTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		self.user = CustomUser.objects.create_user(username='cached', email='cached@example.com', password='pw')
+		self.profile = UserProfile.objects.create(user=self.user, age=28, height=170, weight=65, gender='female', goal='health', fitness_level='beginner')
+		self.client.login(username='cached@example.com', password='pw')
+
+	def test_warm_profile_pages_cost_no_queries(self):
+		list_url = reverse('training_plans:profile_list')
+		self.client.get(list_url)
+		with self.assertNumQueries(0):
+			resp = self.client.get(list_url)
+		self.assertContains(resp, 'cached')
+		with self.assertNumQueries(0):
+			self.client.get(reverse('training_plans:profile_create'))
+
+	def test_profile_save_invalidates_cache(self):
+		list_url = reverse('training_plans:profile_list')
+		self.client.get(list_url)
+		self.profile.weight = 99
+		self.profile.save()
+		with self.assertNumQueries(1):
+			resp = self.client.get(list_url)
+		self.assertContains(resp, '99')
+
+	def test_user_save_invalidates_cached_user(self):
+		list_url = reverse('training_plans:profile_list')
+		self.client.get(list_url)
+		self.user.username = 'renamed'
+		self.user.save()
+		self.assertContains(self.client.get(list_url), 'renamed')
+
+	def test_cache_miss_reads_primary_inside_read_only_view(self):
+		from django.core.cache import cache
+		from django.test import RequestFactory
+		from .backends import EmailBackend
+		from .caching import get_profile
+		from .routers import replica_reads
+		cache.clear()
+		request = RequestFactory().get('/')
+		request.user = self.user
+		# Обращение к реплике упало бы: алиаса replica1 нет среди соединений
+		with override_settings(DATABASE_REPLICAS=['replica1']), replica_reads():
+			user = EmailBackend().get_user(self.user.pk)
+			profile = get_profile(request)
+		self.assertEqual(user._state.db, 'default')
+		self.assertEqual(profile._state.db, 'default')
+
+
+class StartupBudgetTests(TestCase):
+	# Бюджет загрузки воркера: fitgenius_project.wsgi + URLconf в чистом процессе
+	STARTUP_SECONDS = 2.0
+	STARTUP_RSS_MB = 100
+
+	def test_worker_boot_within_budget_and_without_export_libs(self):
+		import json
+		import os
+		import subprocess
+		import sys
+		code = (
+			'import json, resource, sys, time\n'
+			't = time.perf_counter()\n'
+			'from fitgenius_project.wsgi import application\n'
+			'from django.urls import get_resolver\n'
+			'get_resolver().url_patterns\n'
+			'print(json.dumps({"seconds": time.perf_counter() - t,'
+			' "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,'
+			' "heavy": [m for m in ("reportlab", "openpyxl") if m in sys.modules]}))\n'
+		)
+		env = dict(os.environ, DJANGO_SETTINGS_MODULE='fitgenius_project.settings')
+		out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True).stdout
+		stats = json.loads(out.strip().splitlines()[-1])
+		self.assertEqual(stats['heavy'], [])
+		self.assertLess(stats['seconds'], self.STARTUP_SECONDS)
+		self.assertLess(stats['rss_kb'] / 1024, self.STARTUP_RSS_MB)
+
+	def test_profile_imports_parser(self):
+		from .management.commands.profile_imports import parse_importtime
+		output = (
+			'import time: self [us] | cumulative | imported package\n'
+			'import time:       120 |        120 |   io\n'
+			'import time:      3000 |       5000 | django.db\n'
+		)
+		self.assertEqual(parse_importtime(output), [('io', 120, 120), ('django.db', 3000, 5000)])
+
+
+class FragmentCacheTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		self.user = CustomUser.objects.create_user(username='frag', email='frag@example.com', password='pw')
+		self.client.login(username='frag@example.com', password='pw')
+
+	def test_training_exercises_fragment_keyed_by_updated_at(self):
+		from .models import Training, Exercise
+		training = Training.objects.create(user=self.user, title='Фрагмент')
+		exercise = Exercise.objects.create(training=training, day='monday', name='Старое', sets=3, reps='10')
+		url = reverse('training_plans:training_detail', kwargs={'pk': training.pk})
+		self.assertContains(self.client.get(url), 'Старое')
+
+		Exercise.objects.filter(pk=exercise.pk).update(name='Новое')
+		self.assertContains(self.client.get(url), 'Старое')
+
+		training.save()
+		self.assertContains(self.client.get(url), 'Новое')
+
+	def test_fragment_key_includes_owner(self):
+		from django.core.cache import cache
+		from django.core.cache.utils import make_template_fragment_key
+		from .models import Training
+		training = Training.objects.create(user=self.user, title='Фрагмент')
+		self.client.get(reverse('training_plans:training_detail', kwargs={'pk': training.pk}))
+		# id тренировок на разных шардах совпадают, владелец различает их записи
+		key = make_template_fragment_key('training_exercises', [self.user.pk, training.pk, training.updated_at.timestamp()])
+		self.assertIsNotNone(cache.get(key))
+
+	def test_plan_regeneration_refreshes_profile_fragment(self):
+		profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		url = reverse('training_plans:profile_detail', kwargs={'pk': profile.pk})
+		self.assertContains(self.client.get(url), 'еще не сгенерирован')
+		self.client.get(reverse('training_plans:generate_plan', kwargs={'pk': profile.pk}))
+		self.assertContains(self.client.get(url), 'Становая тяга')
+
+
+class AdminScalabilityTests(TestCase):
+	# Запросов на страницу changelist при теплом кэше сессии и пользователя:
+	# оценка числа строк, точный подсчет для маленькой таблицы и сама страница
+	QUERY_BUDGET = 3
+
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		self.admin = CustomUser.objects.create_superuser(username='root', email='root@example.com', password='pw')
+		self.client.login(username='root@example.com', password='pw')
+		self.client.get(reverse('admin:index'))
+
+	def _add_rows(self, start, count):
+		from .models import Training, Exercise, TrainingPlan
+		for i in range(start, start + count):
+			user = CustomUser.objects.create_user(username=f'member{i}', email=f'member{i}@example.com', password='pw')
+			profile = UserProfile.objects.create(user=user, age=30, height=180, weight=80, gender='male', goal='health', fitness_level='beginner')
+			TrainingPlan.objects.create(user_profile=profile, day='monday', exercise_name='Планка', sets=3, reps='30 сек')
+			training = Training.objects.create(user=user, title=f'Тренировка {i}')
+			Exercise.objects.create(training=training, day='monday', name='Присед', sets=3, reps='10')
+
+	def _changelist_queries(self, model_name):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		url = reverse(f'admin:training_plans_{model_name}_changelist')
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.get(url)
+		self.assertEqual(resp.status_code, 200)
+		return len(ctx)
+
+	def test_changelist_queries_do_not_grow_with_rows(self):
+		models = ('customuser', 'userprofile', 'trainingplan', 'training', 'exercise')
+		self._add_rows(0, 2)
+		small = {name: self._changelist_queries(name) for name in models}
+		self._add_rows(2, 10)
+		large = {name: self._changelist_queries(name) for name in models}
+		self.assertEqual(small, large)
+		for name, queries in large.items():
+			self.assertLessEqual(queries, self.QUERY_BUDGET, name)
+
+	def test_estimated_count_used_for_large_unfiltered_tables(self):
+		from .paginators import EstimatedCountPaginator
+		self._add_rows(0, 3)
+		paginator = EstimatedCountPaginator(CustomUser.objects.all(), 100)
+		paginator.exact_threshold = 1
+		max_pk = CustomUser.objects.order_by('-pk').values_list('pk', flat=True)[0]
+		with self.assertNumQueries(2):
+			self.assertEqual(paginator.count, max_pk)
+		filtered = EstimatedCountPaginator(CustomUser.objects.filter(is_staff=False), 100)
+		filtered.exact_threshold = 1
+		self.assertEqual(filtered.count, 3)
+
+	def test_estimated_count_falls_back_when_last_page_is_empty(self):
+		from .paginators import EstimatedCountPaginator
+		self._add_rows(0, 6)
+		CustomUser.objects.filter(email__in=[f'member{i}@example.com' for i in range(5)]).delete()
+		total = CustomUser.objects.count()
+		paginator = EstimatedCountPaginator(CustomUser.objects.order_by('pk'), 1)
+		paginator.exact_threshold = 1
+		self.assertEqual(paginator.count, total)
+		self.assertEqual(len(paginator.page(paginator.num_pages).object_list), 1)
+
+	def test_user_search_is_prefix_only(self):
+		self._add_rows(0, 2)
+		url = reverse('admin:training_plans_customuser_changelist')
+		resp = self.client.get(url, {'q': 'member1'})
+		self.assertContains(resp, 'member1@example.com')
+		self.assertNotContains(resp, 'member0@example.com')
+		resp = self.client.get(url, {'q': 'example.com'})
+		self.assertNotContains(resp, 'member1@example.com')
+
+
+@override_settings(ROOT_URLCONF='training_plans.tests')
+class AsyncViewTests(TestCase):
+	def setUp(self):
+		from .models import Training, Exercise
+		self.user = CustomUser.objects.create_user(username='async', email='async@example.com', password='pw')
+		other = CustomUser.objects.create_user(username='other', email='other@example.com', password='pw')
+		self.profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		self.profile.generate_training_plan()
+		self.training = Training.objects.create(user=self.user, title='Асинхронная')
+		Exercise.objects.create(training=self.training, day='monday', name='Жим', sets=3, reps='10')
+		self.foreign = Training.objects.create(user=other, title='Чужая')
+		self.async_client.force_login(self.user)
+
+	async def test_pages_are_served_by_async_views(self):
+		from . import async_views
+		response = await self.async_client.get(reverse('training_plans:training_list'))
+		self.assertIs(response.resolver_match.func, async_views.training_list)
+		self.assertContains(response, 'Асинхронная')
+		self.assertNotContains(response, 'Чужая')
+		response = await self.async_client.get(reverse('training_plans:training_detail', kwargs={'pk': self.training.pk}))
+		self.assertContains(response, 'Жим')
+		response = await self.async_client.get(reverse('training_plans:profile_detail', kwargs={'pk': self.profile.pk}))
+		self.assertContains(response, 'Становая тяга')
+		response = await self.async_client.get(reverse('training_plans:profile_list'))
+		self.assertContains(response, 'async')
+
+	async def test_owner_checks(self):
+		response = await self.async_client.get(reverse('training_plans:training_detail', kwargs={'pk': self.foreign.pk}))
+		self.assertEqual(response.status_code, 403)
+		response = await self.async_client.get(reverse('training_plans:training_export', kwargs={'pk': self.foreign.pk}))
+		self.assertEqual(response.status_code, 404)
+		response = await self.async_client.get(reverse('training_plans:export_pdf', kwargs={'pk': self.profile.pk + 1}))
+		self.assertEqual(response.status_code, 404)
+		await self.async_client.alogout()
+		response = await self.async_client.get(reverse('training_plans:training_list'))
+		self.assertEqual(response.status_code, 302)
+
+	async def test_exports_render_in_pool(self):
+		response = await self.async_client.get(reverse('training_plans:export_pdf', kwargs={'pk': self.profile.pk}))
+		self.assertEqual(response['Content-Type'], 'application/pdf')
+		self.assertTrue(response.content.startswith(b'%PDF'))
+		response = await self.async_client.get(reverse('training_plans:training_export', kwargs={'pk': self.training.pk}))
+		self.assertIn('training_%d.xlsx' % self.training.pk, response['Content-Disposition'])
+		self.assertTrue(response.content.startswith(b'PK'))
+
+
+class PdfBatchTests(TestCase):
+	def test_batch_zip_embeds_cyrillic_font(self):
+		import io
+		import zipfile
+		from .exports import write_profile_pdfs_zip
+		for i in range(3):
+			user = CustomUser.objects.create_user(username=f'client{i}', email=f'client{i}@example.com', password='pw')
+			UserProfile.objects.create(user=user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced').generate_training_plan()
+		buffer = io.BytesIO()
+		self.assertEqual(write_profile_pdfs_zip(UserProfile.objects.order_by('pk'), buffer, workers=2), 3)
+		with zipfile.ZipFile(buffer) as archive:
+			self.assertEqual(archive.namelist(), [f'training_plan_client{i}.pdf' for i in range(3)])
+			content = archive.read('training_plan_client0.pdf')
+		self.assertTrue(content.startswith(b'%PDF'))
+		self.assertIn(b'DejaVuSans', content)
+
+	@override_settings(ROOT_URLCONF='fitgenius_project.urls')
+	def test_admin_action_streams_zip(self):
+		import io
+		import zipfile
+		staff = CustomUser.objects.create_superuser(username='boss', email='boss@example.com', password='pw')
+		profiles = [
+			UserProfile.objects.create(user=user, age=30, height=180, weight=80, gender='male', goal='health', fitness_level='beginner')
+			for user in (staff, CustomUser.objects.create_user(username='client', email='client@example.com', password='pw'))
+		]
+		self.client.force_login(staff)
+		response = self.client.post(reverse('admin:training_plans_userprofile_changelist'), {
+			'action': 'export_pdf_zip', '_selected_action': [profile.pk for profile in profiles],
+		})
+		self.assertTrue(response.streaming)
+		with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+			self.assertEqual(sorted(archive.namelist()), ['training_plan_boss.pdf', 'training_plan_client.pdf'])
+
+	def test_missing_font_is_an_error(self):
+		from django.core.exceptions import ImproperlyConfigured
+		from .exports import find_pdf_fonts
+		self.assertTrue(find_pdf_fonts()['regular'].endswith('static/fonts/DejaVuSans.ttf'))
+		with override_settings(PDF_FONT_DIRS=['/nonexistent']):
+			with self.assertRaises(ImproperlyConfigured):
+				find_pdf_fonts()
+
+	def test_font_set_only_when_style_changes(self):
+		from .exports import _PdfWriter, PDF_STYLES
+
+		class Canvas:
+			def __init__(self):
+				self.fonts = []
+			def setFont(self, name, size):
+				self.fonts.append((name, size))
+			def drawString(self, x, y, text):
+				pass
+			def showPage(self):
+				pass
+
+		writer = _PdfWriter(Canvas(), {'regular': 'R', 'bold': 'B', 'italic': 'R'})
+		for _ in range(10):
+			writer.text(0, 0, 'строка', PDF_STYLES['line'])
+		writer.text(0, 0, 'день', PDF_STYLES['day'])
+		writer.show_page()
+		writer.text(0, 0, 'строка', PDF_STYLES['line'])
+		self.assertEqual(writer.canvas.fonts, [('R', 11), ('B', 12), ('R', 11)])
+
+
+class AdmissionControlTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		self.user = CustomUser.objects.create_user(username='heavy', email='heavy@example.com', password='pw')
+		self.profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		self.client.login(username='heavy@example.com', password='pw')
+		self.url = reverse('training_plans:export_pdf', kwargs={'pk': self.profile.pk})
+
+	def test_token_bucket_refills_over_time(self):
+		from .throttling import LocalAdmissionBackend
+		backend = LocalAdmissionBackend({'RATE': 2.0, 'BURST': 2, 'MAX_CONCURRENT': 1})
+		self.assertEqual(backend.take_token('u', now=0), 0)
+		self.assertEqual(backend.take_token('u', now=0), 0)
+		self.assertAlmostEqual(backend.take_token('u', now=0), 0.5)
+		self.assertEqual(backend.take_token('u', now=0.5), 0)
+
+	def test_local_buckets_drop_refilled_keys(self):
+		from .throttling import LocalAdmissionBackend
+		backend = LocalAdmissionBackend({'RATE': 2.0, 'BURST': 2, 'MAX_CONCURRENT': 1})
+		for user_id in range(100):
+			backend.take_token(f'user:{user_id}', now=0)
+		self.assertEqual(backend.take_token('busy', now=0.9), 0)
+		backend.take_token('busy', now=0.9)
+		self.assertEqual(backend.take_token('fresh', now=1.0), 0)
+		self.assertEqual(set(backend._buckets), {'busy', 'fresh'})
+
+	def _check_limits(self, backend_path):
+		from .throttling import DEFAULTS, get_admission_backend
+		options = {**DEFAULTS, 'BACKEND': backend_path, 'RATE': 0.01, 'BURST': 2, 'MAX_CONCURRENT': 1, 'QUEUE_TIMEOUT': 0}
+		with self.settings(ADMISSION_CONTROL=options):
+			self.assertEqual(self.client.get(self.url).status_code, 200)
+			backend = get_admission_backend()
+			lease = backend.try_acquire()
+			self.assertIsNotNone(lease)
+			busy = self.client.get(self.url)
+			self.assertEqual(busy.status_code, 503)
+			self.assertEqual(busy['Retry-After'], '1')
+			backend.release(lease)
+			limited = self.client.get(self.url)
+			self.assertEqual(limited.status_code, 429)
+			self.assertEqual(limited['Retry-After'], '100')
+			metrics = backend.metrics()
+		self.assertEqual((metrics['admitted'], metrics['rejected_busy'], metrics['rejected_rate'], metrics['in_flight']), (1, 1, 1, 0))
+
+	def test_local_backend_limits(self):
+		self._check_limits('training_plans.throttling.LocalAdmissionBackend')
+
+	def test_cache_backend_limits(self):
+		self._check_limits('training_plans.throttling.CacheAdmissionBackend')
+
+	def test_cache_backend_slot_leases_expire(self):
+		import time
+		from .throttling import DEFAULTS, CacheAdmissionBackend
+		backend = CacheAdmissionBackend({**DEFAULTS, 'MAX_CONCURRENT': 1, 'LEASE_TIMEOUT': 1})
+		# Воркер умер, не вызвав release: слот освобождается по истечении аренды
+		self.assertIsNotNone(backend.try_acquire())
+		self.assertIsNone(backend.try_acquire())
+		self.assertEqual(backend.metrics()['in_flight'], 1)
+		time.sleep(1.1)
+		lease = backend.try_acquire()
+		self.assertIsNotNone(lease)
+		backend.release(lease)
+		self.assertEqual(backend.metrics()['in_flight'], 0)
+
+	async def test_async_views_wait_for_slot_with_async_cache_api(self):
+		import asyncio
+		from unittest import mock
+		from asgiref.sync import sync_to_async
+		from .throttling import DEFAULTS, CacheAdmissionBackend, _aacquire
+		backend = CacheAdmissionBackend({**DEFAULTS, 'MAX_CONCURRENT': 1})
+		held = await backend.atry_acquire()
+		add = backend.cache.add
+
+		def add_outside_event_loop(*args, **kwargs):
+			try:
+				asyncio.get_running_loop()
+			except RuntimeError:
+				return add(*args, **kwargs)
+			raise AssertionError('синхронный вызов кэша в цикле событий')
+
+		with mock.patch.object(backend.cache, 'add', side_effect=add_outside_event_loop):
+			waiter = asyncio.ensure_future(_aacquire(backend, 1.0))
+			await asyncio.sleep(0.1)
+			self.assertEqual((await sync_to_async(backend.metrics)())['waiting'], 1)
+			await backend.arelease(held)
+			lease = await waiter
+		self.assertIsNotNone(lease)
+		await backend.arelease(lease)
+		self.assertEqual((await sync_to_async(backend.metrics)())['in_flight'], 0)
+
+	def test_metrics_view_is_staff_only(self):
+		url = reverse('training_plans:admission_metrics')
+		self.assertEqual(self.client.get(url).status_code, 302)
+		CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+		self.client.login(username='heavy@example.com', password='pw')
+		self.assertIn('waiting', self.client.get(url).json())
+
+
+class BulkDeletionTests(TestCase):
+	def setUp(self):
+		self.user = CustomUser.objects.create_user(username='heavy', email='heavy@example.com', password='pw')
+
+	def test_account_with_100k_exercises_deleted_in_bounded_statements_and_memory(self):
+		import tracemalloc
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		from .deletion import delete_account
+		from .models import Training, Exercise, TrainingPlan
+		trainings = Training.objects.bulk_create([Training(user=self.user, title=f'Т{i}') for i in range(100)])
+		for training in trainings:
+			Exercise.objects.bulk_create([Exercise(training=training, day='monday', name=f'У{i}', sets=3, reps='10') for i in range(1000)])
+		profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		profile.generate_training_plan()
+
+		tracemalloc.start()
+		try:
+			with CaptureQueriesContext(connection) as queries:
+				delete_account(self.user, chunk_size=10000)
+			_, peak = tracemalloc.get_traced_memory()
+		finally:
+			tracemalloc.stop()
+
+		self.assertFalse(Exercise.objects.exists())
+		self.assertFalse(Training.objects.exists())
+		self.assertFalse(TrainingPlan.objects.exists())
+		self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+		self.assertLess(len(queries), 100)
+		self.assertLess(peak, 10 * 1024 * 1024)
+
+	def test_views_use_bulk_path(self):
+		from .models import Training, Exercise
+		training = Training.objects.create(user=self.user, title='Удалить')
+		Exercise.objects.bulk_create([Exercise(training=training, day='monday', name=f'У{i}', sets=3, reps='10') for i in range(50)])
+		profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		profile.generate_training_plan()
+		self.client.login(username='heavy@example.com', password='pw')
+		response = self.client.post(reverse('training_plans:training_delete', kwargs={'pk': training.pk}))
+		self.assertRedirects(response, reverse('training_plans:training_list'), fetch_redirect_response=False)
+		self.assertFalse(Exercise.objects.exists())
+		self.client.post(reverse('training_plans:profile_delete', kwargs={'pk': profile.pk}))
+		self.assertFalse(UserProfile.objects.exists())
+
+	def test_profile_delete_reports_background_deletion(self):
+		from unittest import mock
+		profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		profile.generate_training_plan()
+		self.client.login(username='heavy@example.com', password='pw')
+		with self.settings(BULK_DELETE_BACKGROUND_THRESHOLD=0), mock.patch('training_plans.deletion.run_in_background') as background:
+			response = self.client.post(reverse('training_plans:profile_delete', kwargs={'pk': profile.pk}), follow=True)
+		background.assert_called_once()
+		self.assertContains(response, 'Профиль удаляется в фоне')
+		self.assertNotContains(response, 'успешно удален')
+		# Поток задание не выполнил (как при перезапуске воркера) — его доделывает команда
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import PendingDeletion
+		job = PendingDeletion.objects.get()
+		self.assertEqual((job.kind, job.object_id), ('profile', profile.pk))
+		call_command('process_deletions', min_age=0, stdout=StringIO())
+		self.assertFalse(UserProfile.objects.exists())
+		self.assertFalse(PendingDeletion.objects.exists())
+
+	def test_failed_background_deletion_stays_queued(self):
+		from io import StringIO
+		from unittest import mock
+		from django.core.management import call_command
+		from .models import PendingDeletion
+		profile = UserProfile.objects.create(user=self.user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		job = PendingDeletion.objects.create(kind='profile', object_id=profile.pk, using='default')
+		with mock.patch('training_plans.deletion.delete_profile', side_effect=RuntimeError('disk I/O error')):
+			call_command('process_deletions', min_age=0, stdout=StringIO(), stderr=StringIO())
+		job.refresh_from_db()
+		self.assertEqual(job.attempts, 1)
+		self.assertIn('disk I/O error', job.last_error)
+		self.assertTrue(UserProfile.objects.filter(pk=profile.pk).exists())
+
+	def test_admin_confirmation_shows_counts(self):
+		from .models import Training, Exercise
+		training = Training.objects.create(user=self.user, title='Админ')
+		Exercise.objects.bulk_create([Exercise(training=training, day='monday', name=f'У{i}', sets=3, reps='10') for i in range(25)])
+		admin_user = CustomUser.objects.create_superuser(username='root', email='root@example.com', password='pw')
+		self.client.force_login(admin_user)
+		response = self.client.get(reverse('admin:training_plans_customuser_delete', args=[self.user.pk]))
+		self.assertContains(response, ': 25')
+		self.client.post(reverse('admin:training_plans_customuser_delete', args=[self.user.pk]), {'post': 'yes'})
+		self.assertFalse(Exercise.objects.exists())
+		self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+
+
+class ArchivalTests(TestCase):
+	def setUp(self):
+		self.user = CustomUser.objects.create_user(username='old', email='old@example.com', password='pw')
+		self.client.login(username='old@example.com', password='pw')
+
+	def _training(self, title, days_ago):
+		from datetime import timedelta
+		from django.utils import timezone
+		from .models import Training, Exercise
+		training = Training.objects.create(user=self.user, title=title, description='Описание')
+		Exercise.objects.bulk_create([
+			Exercise(training=training, day=day, name=f'{title} {i}', sets=3, reps='10', notes='заметка' if i == 0 else '')
+			for i, day in enumerate(['wednesday', 'monday', 'friday'])
+		])
+		moment = timezone.now() - timedelta(days=days_ago)
+		Training.objects.filter(pk=training.pk).update(created_at=moment, updated_at=moment)
+		return training
+
+	def test_archive_view_and_restore(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import Training, Exercise, ArchivedTraining
+		stale = self._training('Старая', 400)
+		fresh = self._training('Свежая', 10)
+		call_command('archive_trainings', days=365, stdout=StringIO())
+
+		self.assertEqual(list(Training.objects.values_list('pk', flat=True)), [fresh.pk])
+		self.assertEqual(Exercise.objects.count(), 3)
+		archived = ArchivedTraining.objects.get()
+		self.assertEqual((archived.original_id, archived.exercise_count), (stale.pk, 3))
+
+		old_url = reverse('training_plans:training_detail', kwargs={'pk': stale.pk})
+		detail_url = reverse('training_plans:archived_training_detail', kwargs={'pk': archived.pk})
+		self.assertRedirects(self.client.get(old_url), detail_url)
+		self.assertContains(self.client.get(detail_url), 'Старая 1')
+		self.assertContains(self.client.get(reverse('training_plans:training_archive')), 'Старая')
+
+		self.client.post(reverse('training_plans:archived_training_restore', kwargs={'pk': archived.pk}))
+		self.assertFalse(ArchivedTraining.objects.exists())
+		restored = Training.objects.exclude(pk=fresh.pk).get()
+		self.assertEqual(Training.objects.get(pk=restored.pk).created_at, archived.created_at)
+		self.assertEqual(restored.description, 'Описание')
+		self.assertEqual(
+			list(restored.exercises.order_by('pk').values_list('name', 'day', 'notes')),
+			[('Старая 0', 'wednesday', 'заметка'), ('Старая 1', 'monday', ''), ('Старая 2', 'friday', '')],
+		)
+
+	def test_other_users_archive_is_hidden(self):
+		from .archiving import archive_trainings
+		from django.utils import timezone
+		from .models import ArchivedTraining
+		self._training('Чужая', 400)
+		archive_trainings(timezone.now())
+		archived = ArchivedTraining.objects.get()
+		other = CustomUser.objects.create_user(username='spy', email='spy@example.com', password='pw')
+		self.client.force_login(other)
+		self.assertEqual(self.client.get(reverse('training_plans:archived_training_detail', kwargs={'pk': archived.pk})).status_code, 404)
+		self.assertEqual(self.client.post(reverse('training_plans:archived_training_restore', kwargs={'pk': archived.pk})).status_code, 404)
+
+
+class RecommendationTests(TestCase):
+	ROWS = [
+		(30, 180, 80, 'male', 'strength', 'advanced'),
+		(30, 180, 80, 'male', 'strength', 'beginner'),
+		(30, 170, 80, 'female', 'weight_loss', 'intermediate'),
+		(30, 165, 100, 'female', 'weight_loss', 'intermediate'),
+		(68, 170, 70, 'male', 'health', 'beginner'),
+		(30, 170, 70, 'female', 'endurance', 'advanced'),
+	]
+
+	def test_single_and_batch_use_profile_features(self):
+		from types import SimpleNamespace
+		from .recommendations import recommend_plan, recommend_many
+		expected = ['strength', 'full_body', 'weight_loss', 'low_impact', 'low_impact', 'endurance']
+		fields = ('age', 'height', 'weight', 'gender', 'goal', 'fitness_level')
+		single = [recommend_plan(SimpleNamespace(**dict(zip(fields, row)))) for row in self.ROWS]
+		self.assertEqual(single, expected)
+		self.assertEqual(recommend_many(self.ROWS, chunk_size=4), expected)
+
+	def test_cohort_boundaries_follow_plan_rules(self):
+		from .recommendations import recommend_many
+		cases = [
+			((50, 170, 72, 'female', 'weight_loss', 'beginner'), 'weight_loss'),  # ИМТ 24.9
+			((64, 170, 72, 'female', 'weight_loss', 'beginner'), 'weight_loss'),
+			((65, 170, 72, 'female', 'weight_loss', 'beginner'), 'low_impact'),
+			((30, 170, 92, 'male', 'weight_loss', 'advanced'), 'weight_loss'),  # ИМТ 31.8
+			((30, 170, 93, 'male', 'weight_loss', 'advanced'), 'low_impact'),  # ИМТ 32.2
+			((16, 170, 55, 'male', 'weight_loss', 'intermediate'), 'weight_loss'),
+			((52, 180, 75, 'male', 'endurance', 'advanced'), 'endurance'),
+			((64, 180, 75, 'male', 'endurance', 'advanced'), 'endurance'),
+			((65, 180, 75, 'male', 'endurance', 'advanced'), 'health'),
+			((16, 180, 75, 'male', 'endurance', 'intermediate'), 'endurance'),
+			((64, 165, 60, 'female', 'health', 'beginner'), 'health'),
+			((65, 165, 60, 'female', 'health', 'beginner'), 'low_impact'),
+			((80, 190, 130, 'male', 'muscle_gain', 'beginner'), 'full_body'),
+		]
+		self.assertEqual(recommend_many([row for row, _ in cases]), [key for _, key in cases])
+
+	def test_generation_writes_to_primary_for_replica_loaded_profile(self):
+		from .models import TrainingPlan
+		user = CustomUser.objects.create_user(username='replica', email='replica@example.com', password='pw')
+		profile = UserProfile.objects.create(user=user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		profile.generate_training_plan()
+		count = TrainingPlan.objects.filter(user_profile=profile).count()
+		# Профиль прочитан с реплики: алиаса replica1 нет среди соединений, запись туда упала бы
+		profile._state.db = 'replica1'
+		with override_settings(DATABASE_REPLICAS=['replica1']):
+			profile.generate_training_plan()
+		self.assertEqual(profile._state.db, 'default')
+		self.assertEqual(TrainingPlan.objects.filter(user_profile=profile).count(), count)
+
+	def test_index_grows_incrementally(self):
+		from .recommendations import PlanIndex, feature_matrix
+		index = PlanIndex()
+		index.add('health', [{'goal': 'health'}])
+		self.assertEqual(index.nearest(feature_matrix(self.ROWS[:1])), ['health'])
+		index.add('strength', [{'goal': 'strength'}])
+		index.add('strength', [{'goal': 'strength', 'level': 'beginner'}])
+		self.assertEqual((index.keys, len(index)), (['health', 'strength'], 3))
+		self.assertEqual(index.nearest(feature_matrix(self.ROWS[:1])), ['strength'])
+
+	def test_regenerate_command_rebuilds_plans_in_batches(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import TrainingPlan
+		profiles = []
+		for i, row in enumerate(self.ROWS):
+			user = CustomUser.objects.create_user(username=f'r{i}', email=f'r{i}@example.com', password='pw')
+			profiles.append(UserProfile.objects.create(user=user, **dict(zip(('age', 'height', 'weight', 'gender', 'goal', 'fitness_level'), row))))
+		profiles[0].generate_training_plan()
+		expected = list(profiles[0].training_plans.order_by('pk').values_list('exercise_name', 'sets'))
+		call_command('regenerate_plans', batch_size=4, stdout=StringIO())
+		self.assertEqual(list(profiles[0].training_plans.order_by('pk').values_list('exercise_name', 'sets')), expected)
+		self.assertEqual(TrainingPlan.objects.values('user_profile').distinct().count(), len(self.ROWS))
+		self.assertTrue(profiles[3].training_plans.filter(exercise_name='Ходьба').exists())
+
+
+@override_settings(ROOT_URLCONF='training_plans.tests')
+class RequestProfilingTests(TestCase):
+	def setUp(self):
+		self.staff = CustomUser.objects.create_superuser(username='staff', email='staff@example.com', password='pw')
+		self.member = CustomUser.objects.create_user(username='member', email='member@example.com', password='pw')
+
+	def test_staff_query_param_profiles_request_with_sql(self):
+		from .models import RequestProfile
+		self.client.force_login(self.member)
+		self.client.get(reverse('training_plans:training_list'), {'profile': '1'})
+		self.assertFalse(RequestProfile.objects.exists())
+
+		self.client.force_login(self.staff)
+		self.client.get(reverse('training_plans:training_list'))
+		self.client.get(reverse('training_plans:training_list'), {'profile': '1'})
+		profile = RequestProfile.objects.get()
+		self.assertEqual((profile.url_name, profile.method, profile.status_code, profile.user), ('training_plans:training_list', 'GET', 200, self.staff))
+		self.assertGreater(profile.sql_count, 0)
+		self.assertTrue(all(query['sql'] for query in profile.queries))
+
+	@override_settings(REQUEST_PROFILING={'SAMPLE_RATE': 1.0, 'MAX_STORED': 2})
+	async def test_sample_rate_profiles_async_requests_and_keeps_latest(self):
+		from .models import RequestProfile
+		await self.async_client.aforce_login(self.member)
+		for _ in range(3):
+			await self.async_client.get(reverse('training_plans:training_list'))
+		profiles = [profile async for profile in RequestProfile.objects.order_by('pk')]
+		self.assertEqual(len(profiles), 2)
+		self.assertEqual(profiles[0].user_id, self.member.pk)
+		self.assertGreater(profiles[0].sql_count, 0)
+
+	@override_settings(ROOT_URLCONF='fitgenius_project.urls')
+	def test_admin_renders_flame_graph(self):
+		from .models import RequestProfile
+		from .profiling import flame_graph, parse_stacks
+		stacks = 'view (views.py:1);render (exports.py:5) 3\nview (views.py:1);query (db.py:9) 1'
+		boxes = flame_graph(parse_stacks(stacks))
+		self.assertEqual(
+			[(box['depth'], box['left'], box['width'], box['name']) for box in boxes],
+			[(0, 0, 100.0, 'view (views.py:1)'), (1, 0, 25.0, 'query (db.py:9)'), (1, 25.0, 75.0, 'render (exports.py:5)')],
+		)
+		profile = RequestProfile.objects.create(
+			url_name='training_plans:export_pdf', path='/profiles/1/export/', method='GET', status_code=200,
+			duration_ms=1500, sql_count=1, sql_ms=2, sample_count=4, interval_ms=5, stacks=stacks,
+			queries=[{'alias': 'default', 'ms': 2.0, 'sql': 'SELECT 1'}],
+		)
+		self.client.force_login(self.staff)
+		response = self.client.get(reverse('admin:training_plans_requestprofile_changelist'))
+		self.assertContains(response, 'training_plans:export_pdf')
+		response = self.client.get(reverse('admin:training_plans_requestprofile_change', args=[profile.pk]))
+		self.assertContains(response, 'render (exports.py:5)')
+		self.assertContains(response, 'width: 75.000000%')
+		self.assertContains(response, 'SELECT 1')
+
+
+class StaticPipelineTests(TestCase):
+	def _collect(self, root):
+		import os
+		from django.core.files.storage import FileSystemStorage
+		from .storage import CompressedManifestStaticFilesStorage
+		source = os.path.join(root, 'src')
+		os.makedirs(os.path.join(source, 'img'))
+		with open(os.path.join(source, 'app.css'), 'w') as f:
+			f.write('body { background: url("img/logo.png"); }\n' + '.row { margin: 0 auto; }\n' * 200)
+		with open(os.path.join(source, 'img', 'logo.png'), 'wb') as f:
+			f.write(b'\x89PNG' + bytes(range(256)))
+		target = os.path.join(root, 'static')
+		storage = CompressedManifestStaticFilesStorage(location=target, base_url='/static/')
+		source_storage = FileSystemStorage(location=source)
+		paths = {}
+		for name in ('app.css', 'img/logo.png'):
+			with source_storage.open(name) as f:
+				storage.save(name, f)
+			paths[name] = (source_storage, name)
+		list(storage.post_process(paths))
+		return target, storage.hashed_files['app.css']
+
+	def test_collect_hashes_and_precompresses_and_middleware_negotiates(self):
+		import os
+		import tempfile
+		from django.http import HttpResponseNotFound
+		from django.test import RequestFactory
+		from .middleware import PrecompressedStaticMiddleware
+		with tempfile.TemporaryDirectory() as root:
+			target, css = self._collect(root)
+			self.assertRegex(css, r'^app\.[0-9a-f]{12}\.css$')
+			self.assertTrue(os.path.exists(os.path.join(target, css + '.gz')))
+			self.assertTrue(os.path.exists(os.path.join(target, css + '.br')))
+			self.assertFalse([name for name in os.listdir(os.path.join(target, 'img')) if name.endswith(('.gz', '.br'))])
+
+			with self.settings(STATIC_ROOT=target):
+				middleware = PrecompressedStaticMiddleware(lambda request: HttpResponseNotFound())
+			factory = RequestFactory()
+			url = '/static/' + css
+			response = middleware(factory.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br'))
+			self.assertEqual((response['Content-Encoding'], response['Content-Type']), ('br', 'text/css'))
+			self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+			self.assertEqual(response['Vary'], 'Accept-Encoding')
+			gzipped = middleware(factory.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0'))
+			self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+			plain = middleware(factory.get(url))
+			self.assertFalse(plain.has_header('Content-Encoding'))
+			self.assertIn(b'logo.', plain.content)
+			self.assertLess(len(response.content), len(plain.content) / 5)
+			self.assertEqual(middleware(factory.get(url, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=response['ETag'])).status_code, 304)
+			self.assertEqual(middleware(factory.get(url, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=f'"x", W/{response["ETag"]}')).status_code, 304)
+			self.assertEqual(middleware(factory.get(url, HTTP_IF_NONE_MATCH='*')).status_code, 304)
+			self.assertEqual(middleware(factory.get(url, HTTP_IF_NONE_MATCH='"0-0"')).status_code, 200)
+			self.assertEqual(middleware(factory.get('/static/img/logo.png'))['Cache-Control'], 'public, max-age=60')
+			self.assertEqual(middleware(factory.get('/static/missing.css')).status_code, 404)
+
+
+class CloningTests(TestCase):
+	def setUp(self):
+		from .models import Training, Exercise
+		self.coach = CustomUser.objects.create_user(username='coach', email='coach@example.com', password='pw', is_staff=True)
+		self.template = Training.objects.create(user=self.coach, title='Шаблон', description='Для клиентов')
+		Exercise.objects.bulk_create([
+			Exercise(training=self.template, day=day, name=f'Упр {i}', sets=3, reps='10', rest_time='90 сек', notes='н' if i == 0 else '')
+			for i, day in enumerate(['friday', 'monday', 'wednesday'])
+		])
+		self.exercises = list(self.template.exercises.order_by('pk').values_list('day', 'name', 'sets', 'reps', 'rest_time', 'notes'))
+
+	def _exercises(self, training):
+		return list(training.exercises.order_by('pk').values_list('day', 'name', 'sets', 'reps', 'rest_time', 'notes'))
+
+	def test_clone_own_training_only(self):
+		from .models import Training
+		self.client.force_login(self.coach)
+		response = self.client.post(reverse('training_plans:training_clone', kwargs={'pk': self.template.pk}))
+		copy = Training.objects.exclude(pk=self.template.pk).get()
+		self.assertRedirects(response, reverse('training_plans:training_update', kwargs={'pk': copy.pk}))
+		self.assertEqual((copy.user, copy.title), (self.coach, 'Шаблон (копия)'))
+		self.assertEqual(self._exercises(copy), self.exercises)
+
+		other = CustomUser.objects.create_user(username='other', email='other@example.com', password='pw')
+		self.client.force_login(other)
+		self.assertEqual(self.client.post(reverse('training_plans:training_clone', kwargs={'pk': self.template.pk})).status_code, 404)
+
+	def test_generated_plan_becomes_training(self):
+		from .models import Training
+		user = CustomUser.objects.create_user(username='client', email='client@example.com', password='pw')
+		profile = UserProfile.objects.create(user=user, age=30, height=180, weight=80, gender='male', goal='strength', fitness_level='advanced')
+		profile.generate_training_plan()
+		self.client.force_login(user)
+		self.client.post(reverse('training_plans:plan_to_training', kwargs={'pk': profile.pk}))
+		training = Training.objects.get(user=user)
+		self.assertEqual(
+			list(training.exercises.order_by('pk').values_list('day', 'name', 'sets', 'reps')),
+			list(profile.training_plans.order_by('pk').values_list('day', 'exercise_name', 'sets', 'reps')),
+		)
+
+	def test_bulk_clone_to_clients_in_constant_queries(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		from .models import Training, Exercise
+		clients = CustomUser.objects.bulk_create([
+			CustomUser(username=f'c{i}', email=f'Client{i}@example.com') for i in range(40)
+		])
+		emails = '\n'.join(f'client{i}@example.com' for i in range(40)) + '\nghost@example.com'
+		url = reverse('training_plans:training_bulk_clone', kwargs={'pk': self.template.pk})
+
+		self.client.force_login(clients[0])
+		self.assertEqual(self.client.post(url, {'emails': emails}).status_code, 302)
+		self.assertEqual(Training.objects.count(), 1)
+
+		self.client.force_login(self.coach)
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.post(url, {'emails': emails, 'title': 'Программа на месяц'}, follow=True)
+		self.assertContains(response, 'Создано тренировок: 40, упражнений: 120')
+		self.assertContains(response, 'ghost@example.com')
+		self.assertLess(len(queries), 20)
+		copies = Training.objects.filter(title='Программа на месяц')
+		self.assertEqual(sorted(copies.values_list('user_id', flat=True)), [client.pk for client in clients])
+		self.assertEqual(self._exercises(copies.get(user=clients[7])), self.exercises)
+		self.assertEqual(Exercise.objects.count(), 3 * 41)
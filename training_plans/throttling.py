@@ -0,0 +1,392 @@
+"""Контроль допуска к дорогим операциям (экспорты, генерация плана).
+
+Каждый пользователь получает токен-бакет: RATE токенов в секунду, не больше
+BURST подряд. Сверх этого одновременно выполняется не больше MAX_CONCURRENT
+дорогих операций на бэкенд. Асинхронный запрос ждет свободный слот до
+QUEUE_TIMEOUT секунд, синхронный — до SYNC_QUEUE_TIMEOUT (по умолчанию не
+ждет: спящий запрос занимал бы воркер целиком), иначе получает 503.
+Превышение личного лимита — 429. Оба ответа содержат Retry-After.
+
+Состояние хранится в бэкенде из ADMISSION_CONTROL['BACKEND']:
+LocalAdmissionBackend — в памяти процесса, CacheAdmissionBackend — в кэше
+Django (общий для воркеров при Redis).
+"""
+import asyncio
+import math
+import threading
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'training_plans.throttling.LocalAdmissionBackend',
+    'CACHE_ALIAS': 'default',
+    'RATE': 1.0,
+    'BURST': 10,
+    'MAX_CONCURRENT': 4,
+    'QUEUE_TIMEOUT': 2.0,
+    'SYNC_QUEUE_TIMEOUT': 0.0,
+    'LEASE_TIMEOUT': 300,
+}
+
+# Как часто ожидающий запрос проверяет, не освободился ли слот
+POLL_INTERVAL = 0.05
+
+COUNTERS = ('admitted', 'rejected_rate', 'rejected_busy')
+
+
+def admission_settings():
+    return {**DEFAULTS, **getattr(settings, 'ADMISSION_CONTROL', {})}
+
+
+class AdmissionBackend:
+    """Интерфейс бэкенда.
+
+    try_acquire() возвращает аренду слота или None; аренда передается в
+    release(). Асинхронные a*-методы по умолчанию вызывают синхронные —
+    этого достаточно для состояния в памяти процесса.
+    """
+
+    def __init__(self, options):
+        self.options = options
+
+    async def atake_token(self, key, now=None):
+        return self.take_token(key, now)
+
+    async def atry_acquire(self):
+        return self.try_acquire()
+
+    async def arelease(self, lease):
+        self.release(lease)
+
+    async def aadd_waiting(self, delta):
+        self.add_waiting(delta)
+
+    async def aincr(self, counter):
+        self.incr(counter)
+
+
+class LocalAdmissionBackend(AdmissionBackend):
+    """Состояние в памяти процесса: лимиты действуют на каждый воркер отдельно."""
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._swept = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def take_token(self, key, now=None):
+        """Списывает токен из бакета `key`; возвращает 0 или секунды до следующего токена."""
+        now = time.monotonic() if now is None else now
+        rate, burst = self.options['RATE'], self.options['BURST']
+        with self._lock:
+            if now - self._swept >= burst / rate:
+                self._sweep(now, rate, burst)
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def _sweep(self, now, rate, burst):
+        """Удаляет бакеты, успевшие наполниться: отсутствующий бакет и так считается полным."""
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate < burst
+        }
+        self._swept = now
+
+    def try_acquire(self):
+        with self._lock:
+            if self._in_flight >= self.options['MAX_CONCURRENT']:
+                return None
+            self._in_flight += 1
+            return True
+
+    def release(self, lease):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def add_waiting(self, delta):
+        with self._lock:
+            self._waiting += delta
+
+    def incr(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'max_concurrent': self.options['MAX_CONCURRENT'],
+            }
+
+
+class CacheAdmissionBackend(AdmissionBackend):
+    """Состояние в кэше Django, общее для всех воркеров с одним кэшем.
+
+    Слот — отдельный ключ slot:<n> с уникальным значением аренды, который
+    занимается атомарным add() на LEASE_TIMEOUT секунд. Если воркер умер,
+    не освободив слот, ключ истекает сам. Счетчик ожидающих живет, пока
+    очередь не пустеет дольше двух QUEUE_TIMEOUT. Бакет читается и
+    записывается целиком, поэтому при гонке двух запросов одного
+    пользователя лимит может быть превышен на один-два токена.
+    """
+    prefix = 'fg:admission'
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.cache = caches[options['CACHE_ALIAS']]
+        self._slot_keys = [self._key(f'slot:{n}') for n in range(options['MAX_CONCURRENT'])]
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def _waiting_timeout(self):
+        return max(1, math.ceil(self.options['QUEUE_TIMEOUT'] * 2))
+
+    def _bucket(self, state, now):
+        """(новое состояние бакета, секунд до токена, timeout ключа)."""
+        rate, burst = self.options['RATE'], self.options['BURST']
+        tokens, updated = state if state is not None else (burst, now)
+        tokens = min(burst, tokens + (now - updated) * rate)
+        # Полный бакет можно не хранить: отсутствие ключа означает то же самое
+        timeout = math.ceil(burst / rate) + 1
+        if tokens < 1:
+            return (tokens, now), (1 - tokens) / rate, timeout
+        return (tokens - 1, now), 0, timeout
+
+    def take_token(self, key, now=None):
+        now = time.time() if now is None else now
+        bucket_key = self._key(f'bucket:{key}')
+        state, retry_after, timeout = self._bucket(self.cache.get(bucket_key), now)
+        self.cache.set(bucket_key, state, timeout)
+        return retry_after
+
+    async def atake_token(self, key, now=None):
+        now = time.time() if now is None else now
+        bucket_key = self._key(f'bucket:{key}')
+        state, retry_after, timeout = self._bucket(await self.cache.aget(bucket_key), now)
+        await self.cache.aset(bucket_key, state, timeout)
+        return retry_after
+
+    def try_acquire(self):
+        taken = self.cache.get_many(self._slot_keys)
+        token = uuid.uuid4().hex
+        for key in self._slot_keys:
+            if key not in taken and self.cache.add(key, token, self.options['LEASE_TIMEOUT']):
+                return key, token
+        return None
+
+    async def atry_acquire(self):
+        taken = await self.cache.aget_many(self._slot_keys)
+        token = uuid.uuid4().hex
+        for key in self._slot_keys:
+            if key not in taken and await self.cache.aadd(key, token, self.options['LEASE_TIMEOUT']):
+                return key, token
+        return None
+
+    def release(self, lease):
+        key, token = lease
+        # Истекшую аренду мог занять другой запрос — его слот не трогаем
+        if self.cache.get(key) == token:
+            self.cache.delete(key)
+
+    async def arelease(self, lease):
+        key, token = lease
+        if await self.cache.aget(key) == token:
+            await self.cache.adelete(key)
+
+    def _incr(self, name, delta=1, timeout=None):
+        key = self._key(name)
+        self.cache.add(key, 0, timeout)
+        try:
+            value = self.cache.incr(key, delta)
+        except ValueError:
+            # Ключ вытеснен между add и incr
+            value = max(0, delta)
+            self.cache.set(key, value, timeout)
+        if timeout is not None:
+            self.cache.touch(key, timeout)
+        return value
+
+    async def _aincr(self, name, delta=1, timeout=None):
+        key = self._key(name)
+        await self.cache.aadd(key, 0, timeout)
+        try:
+            value = await self.cache.aincr(key, delta)
+        except ValueError:
+            value = max(0, delta)
+            await self.cache.aset(key, value, timeout)
+        if timeout is not None:
+            await self.cache.atouch(key, timeout)
+        return value
+
+    def add_waiting(self, delta):
+        self._incr('waiting', delta, self._waiting_timeout())
+
+    async def aadd_waiting(self, delta):
+        await self._aincr('waiting', delta, self._waiting_timeout())
+
+    def incr(self, counter):
+        self._incr(counter)
+
+    async def aincr(self, counter):
+        await self._aincr(counter)
+
+    def metrics(self):
+        names = COUNTERS + ('waiting',)
+        values = self.cache.get_many([self._key(name) for name in names] + self._slot_keys)
+        result = {name: max(0, values.get(self._key(name), 0)) for name in names}
+        result['in_flight'] = sum(key in values for key in self._slot_keys)
+        result['max_concurrent'] = self.options['MAX_CONCURRENT']
+        return result
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_admission_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            options = admission_settings()
+            _backend = import_string(options['BACKEND'])(options)
+    return _backend
+
+
+def reset_admission_backend(setting=None, **kwargs):
+    """Сбрасывает бэкенд; подключен к setting_changed для ADMISSION_CONTROL."""
+    global _backend
+    if setting is None or setting == 'ADMISSION_CONTROL':
+        with _backend_lock:
+            _backend = None
+
+
+def _client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _rejected(status, retry_after, message):
+    response = HttpResponse(message, status=status, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _check_rate(backend, request):
+    retry_after = backend.take_token(_client_key(request))
+    if retry_after:
+        backend.incr('rejected_rate')
+        return _rejected(429, retry_after, 'Слишком много запросов. Повторите позже.')
+    return None
+
+
+async def _acheck_rate(backend, request):
+    retry_after = await backend.atake_token(_client_key(request))
+    if retry_after:
+        await backend.aincr('rejected_rate')
+        return _rejected(429, retry_after, 'Слишком много запросов. Повторите позже.')
+    return None
+
+
+def _busy_response():
+    return _rejected(503, 1, 'Сервер занят. Повторите позже.')
+
+
+def _acquire(backend, timeout):
+    """Аренда слота с ожиданием до `timeout` секунд или None."""
+    lease = backend.try_acquire()
+    if lease is not None or timeout <= 0:
+        return lease
+    deadline = time.monotonic() + timeout
+    backend.add_waiting(1)
+    try:
+        while lease is None and time.monotonic() < deadline:
+            time.sleep(min(POLL_INTERVAL, max(0, deadline - time.monotonic())))
+            lease = backend.try_acquire()
+    finally:
+        backend.add_waiting(-1)
+    return lease
+
+
+async def _aacquire(backend, timeout):
+    lease = await backend.atry_acquire()
+    if lease is not None or timeout <= 0:
+        return lease
+    deadline = time.monotonic() + timeout
+    await backend.aadd_waiting(1)
+    try:
+        while lease is None and time.monotonic() < deadline:
+            await asyncio.sleep(min(POLL_INTERVAL, max(0, deadline - time.monotonic())))
+            lease = await backend.atry_acquire()
+    finally:
+        await backend.aadd_waiting(-1)
+    return lease
+
+
+def admission_controlled(view_func):
+    """Пропускает запрос к дорогому представлению через лимиты ADMISSION_CONTROL.
+
+    Работает и с синхронными, и с асинхронными представлениями; ставится
+    после login_required, чтобы лимит считался по пользователю.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            options = admission_settings()
+            if not options['ENABLED']:
+                return await view_func(request, *args, **kwargs)
+            backend = get_admission_backend()
+            rejected = await _acheck_rate(backend, request)
+            if rejected is not None:
+                return rejected
+            lease = await _aacquire(backend, options['QUEUE_TIMEOUT'])
+            if lease is None:
+                await backend.aincr('rejected_busy')
+                return _busy_response()
+            await backend.aincr('admitted')
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                await backend.arelease(lease)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        options = admission_settings()
+        if not options['ENABLED']:
+            return view_func(request, *args, **kwargs)
+        backend = get_admission_backend()
+        rejected = _check_rate(backend, request)
+        if rejected is not None:
+            return rejected
+        lease = _acquire(backend, options['SYNC_QUEUE_TIMEOUT'])
+        if lease is None:
+            backend.incr('rejected_busy')
+            return _busy_response()
+        backend.incr('admitted')
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            backend.release(lease)
+    return wrapper
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
@@ -30,11 +31,23 @@ urlpatterns = [
     path('profiles/<int:pk>/delete/', views.UserProfileDeleteView.as_view(), name='profile_delete'),
     path('profiles/<int:pk>/generate-plan/', views.generate_plan_view, name='generate_plan'),
     path('profiles/<int:pk>/export-pdf/', views.export_training_plan_pdf, name='export_pdf'),
+    path('profiles/<int:pk>/plan-to-training/', views.plan_to_training_view, name='plan_to_training'),
     # User-created trainings CRUD
     path('trainings/', views.TrainingListView.as_view(), name='training_list'),
     path('trainings/create/', views.TrainingCreateView.as_view(), name='training_create'),
+    path('trainings/import/', views.import_trainings_view, name='training_import'),
     path('trainings/<int:pk>/', views.TrainingDetailView.as_view(), name='training_detail'),
     path('trainings/<int:pk>/update/', views.TrainingUpdateView.as_view(), name='training_update'),
     path('trainings/<int:pk>/delete/', views.TrainingDeleteView.as_view(), name='training_delete'),
     path('trainings/<int:pk>/export/', views.export_training_xlsx, name='training_export'),
-]
\ No newline at end of file
+    path('trainings/<int:pk>/clone/', views.clone_training_view, name='training_clone'),
+    path('trainings/<int:pk>/clone-to-clients/', views.bulk_clone_training_view, name='training_bulk_clone'),
+    path('trainings/archive/', views.ArchivedTrainingListView.as_view(), name='training_archive'),
+    path('trainings/archive/<int:pk>/', views.ArchivedTrainingDetailView.as_view(), name='archived_training_detail'),
+    path('trainings/archive/<int:pk>/restore/', views.restore_archived_training_view, name='archived_training_restore'),
+    path('admission/metrics/', views.admission_metrics_view, name='admission_metrics'),
+]
+
+if settings.ASYNC_VIEWS:
+    from .async_urls import urlpatterns as async_urlpatterns
+    urlpatterns = async_urlpatterns + urlpatterns
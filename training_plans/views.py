@@ -1,27 +1,34 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth import login, authenticate
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib import messages
-from django.http import HttpResponse
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from django.http import HttpResponse, Http404, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-import openpyxl
+from django.db.models.functions import Lower
 
-from .models import UserProfile, CustomUser, TrainingPlan, Training, Exercise
+from .models import UserProfile, CustomUser, TrainingPlan, Training, Exercise, ArchivedTraining
 from .forms import (
     UserProfileForm,
     CustomUserCreationForm,
     CustomAuthenticationForm,
     TrainingForm,
     TrainingExerciseFormset,
+    TrainingImportForm,
+    BulkCloneForm,
 )
 from .exports import export_profile_pdf_response, export_training_xlsx_response
+from .imports import import_trainings, TrainingImportError
+from .routers import read_only_view, shard_for_user
+from .caching import get_profile
+from .throttling import admission_controlled, get_admission_backend
+from .deletion import delete_or_schedule, delete_profile, delete_training
+from .archiving import restore_training, unpack_training
+from .cloning import clone_training, clone_training_to_users, training_from_plan
 
 # Регистрация
 class RegisterView(CreateView):
@@ -60,7 +67,7 @@ class UserProfileCreateView(CreateView):
 
     def form_valid(self, form):
         # Проверяем, нет ли уже профиля у пользователя
-        if UserProfile.objects.filter(user=self.request.user).exists():
+        if get_profile(self.request) is not None:
             messages.warning(self.request, 'У вас уже есть профиль. Вы можете его отредактировать.')
             return redirect('training_plans:profile_list')
         
@@ -72,6 +79,7 @@ class UserProfileCreateView(CreateView):
         return response
 
 # Список профилей
+@method_decorator(read_only_view, name='dispatch')
 @method_decorator(login_required, name='dispatch')
 class UserProfileListView(ListView):
     model = UserProfile
@@ -79,8 +87,9 @@ class UserProfileListView(ListView):
     context_object_name = 'profiles'
     
     def get_queryset(self):
-        # Показываем только профили текущего пользователя
-        return UserProfile.objects.filter(user=self.request.user)
+        # Показываем только профиль текущего пользователя (из кэша)
+        profile = get_profile(self.request)
+        return [profile] if profile is not None else []
 
 # Редактирование профиля
 @method_decorator(login_required, name='dispatch')
@@ -109,29 +118,45 @@ class UserProfileDeleteView(DeleteView):
         # Разрешаем удалять только свои профили
         return UserProfile.objects.filter(user=self.request.user)
     
-    def delete(self, request, *args, **kwargs):
-        messages.success(request, 'Профиль успешно удален!')
-        return super().delete(request, *args, **kwargs)
+    def form_valid(self, form):
+        # План удаляется пачками DELETE, без загрузки строк в память
+        if delete_or_schedule(delete_profile, self.object, self.object.training_plans.count()):
+            messages.info(self.request, 'Профиль удаляется в фоне и исчезнет из списка, когда удаление завершится.')
+        else:
+            messages.success(self.request, 'Профиль успешно удален!')
+        return redirect(self.get_success_url())
 
 # Детали профиля
+@method_decorator(read_only_view, name='dispatch')
 @method_decorator(login_required, name='dispatch')
 class UserProfileDetailView(DetailView):
     model = UserProfile
     template_name = 'training_plans/profile_detail.html'
     
-    def get_queryset(self):
-        # Разрешаем просматривать только свои профили
-        return UserProfile.objects.filter(user=self.request.user)
+    def get_object(self, queryset=None):
+        # Разрешаем просматривать только свой профиль
+        profile = get_profile(self.request)
+        if profile is None or profile.pk != self.kwargs['pk']:
+            raise Http404('Профиль не найден')
+        return profile
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['training_plans'] = self.object.training_plans.all().order_by('day')
         return context
 
+def _get_own_profile(request, pk):
+    profile = get_profile(request)
+    if profile is None or profile.pk != pk:
+        raise Http404('Профиль не найден')
+    return profile
+
+
 # Генерация плана
 @login_required
+@admission_controlled
 def generate_plan_view(request, pk):
-    profile = get_object_or_404(UserProfile, pk=pk, user=request.user)
+    profile = _get_own_profile(request, pk)
     profile.generate_training_plan()
     messages.success(request, 'Тренировочный план успешно сгенерирован!')
     return redirect('training_plans:profile_detail', pk=pk)
@@ -142,6 +167,7 @@ def generate_plan_view(request, pk):
 # --------------------------
 
 
+@method_decorator(read_only_view, name='dispatch')
 class TrainingListView(LoginRequiredMixin, ListView):
     model = Training
     template_name = 'training_plans/training_list.html'
@@ -224,6 +250,16 @@ class TrainingUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return response
 
 
+def _find_archived(request, original_id):
+    if not request.user.is_authenticated:
+        return None
+    return (
+        ArchivedTraining.objects.filter(user=request.user, original_id=original_id)
+        .only('pk').first()
+    )
+
+
+@method_decorator(read_only_view, name='dispatch')
 class TrainingDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     model = Training
     template_name = 'training_plans/training_detail.html'
@@ -232,6 +268,16 @@ class TrainingDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         obj = self.get_object()
         return obj.user == self.request.user
 
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Http404:
+            # Старые ссылки на заархивированную тренировку ведут в архив
+            archived = _find_archived(request, kwargs['pk'])
+            if archived is None:
+                raise
+            return redirect('training_plans:archived_training_detail', pk=archived.pk)
+
 
 class TrainingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Training
@@ -242,20 +288,158 @@ class TrainingDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         obj = self.get_object()
         return obj.user == self.request.user
 
+    def form_valid(self, form):
+        # Упражнения удаляются пачками DELETE; очень большие тренировки — в фоне
+        if delete_or_schedule(delete_training, self.object, self.object.exercises.count()):
+            messages.info(self.request, 'Тренировка удаляется в фоне и исчезнет из списка, когда удаление завершится.')
+        return redirect(self.get_success_url())
+
 
+# Архив тренировок
+@method_decorator(read_only_view, name='dispatch')
+class ArchivedTrainingListView(LoginRequiredMixin, ListView):
+    model = ArchivedTraining
+    template_name = 'training_plans/training_archive.html'
+    context_object_name = 'archived_trainings'
+    paginate_by = 50
+
+    def get_queryset(self):
+        # Сжатые данные для списка не нужны
+        return (
+            ArchivedTraining.objects.filter(user=self.request.user)
+            .defer('payload').order_by('-created_at')
+        )
+
+
+@method_decorator(read_only_view, name='dispatch')
+class ArchivedTrainingDetailView(LoginRequiredMixin, DetailView):
+    model = ArchivedTraining
+    template_name = 'training_plans/archived_training_detail.html'
+
+    def get_queryset(self):
+        return ArchivedTraining.objects.filter(user=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(unpack_training(self.object))
+        return context
+
+
+@login_required
+def restore_archived_training_view(request, pk):
+    archived = get_object_or_404(ArchivedTraining, pk=pk, user=request.user)
+    if request.method != 'POST':
+        return redirect('training_plans:archived_training_detail', pk=pk)
+    training = restore_training(archived)
+    messages.success(request, f'Тренировка «{training.title}» восстановлена из архива.')
+    return redirect('training_plans:training_detail', pk=training.pk)
+
+
+# Копирование тренировок и превращение плана в тренировку
 @login_required
+def clone_training_view(request, pk):
+    training = get_object_or_404(Training, pk=pk, user=request.user)
+    if request.method != 'POST':
+        return redirect('training_plans:training_detail', pk=pk)
+    copy = clone_training(training)
+    messages.success(request, f'Создана копия «{copy.title}». Ее можно изменить, не трогая исходную.')
+    return redirect('training_plans:training_update', pk=copy.pk)
+
+
+@login_required
+def plan_to_training_view(request, pk):
+    profile = _get_own_profile(request, pk)
+    if request.method != 'POST':
+        return redirect('training_plans:profile_detail', pk=pk)
+    if not profile.training_plans.exists():
+        messages.warning(request, 'Сначала сгенерируйте план.')
+        return redirect('training_plans:profile_detail', pk=pk)
+    training = training_from_plan(profile)
+    messages.success(request, f'План сохранен как тренировка «{training.title}».')
+    return redirect('training_plans:training_update', pk=training.pk)
+
+
+@staff_member_required
+def bulk_clone_training_view(request, pk):
+    """Копия тренировки-шаблона для списка клиентов (по email) за одну операцию.
+
+    id тренировки уникален только в пределах шарда, поэтому шаблон ищется на
+    шарде его владельца (?owner=, по умолчанию — сам сотрудник).
+    """
+    owner_id = request.GET.get('owner', str(request.user.pk))
+    if not owner_id.isdigit():
+        raise Http404
+    training = get_object_or_404(
+        Training.objects.using(shard_for_user(owner_id)), pk=pk, user_id=owner_id,
+    )
+    if request.method == 'POST':
+        form = BulkCloneForm(request.POST)
+        if form.is_valid():
+            emails = form.cleaned_data['emails']
+            users = list(
+                CustomUser.objects.annotate(email_lower=Lower('email'))
+                .filter(email_lower__in=emails).only('pk', 'email')
+            )
+            trainings, exercises = clone_training_to_users(training, users, title=form.cleaned_data['title'] or None)
+            messages.success(request, f'Создано тренировок: {trainings}, упражнений: {exercises}.')
+            missing = sorted(set(emails) - {user.email.lower() for user in users})
+            if missing:
+                messages.warning(request, f"Не найдены ({len(missing)}): {', '.join(missing[:20])}")
+            return redirect(f"{reverse('training_plans:training_bulk_clone', kwargs={'pk': pk})}?owner={owner_id}")
+    else:
+        form = BulkCloneForm()
+    return render(request, 'training_plans/training_bulk_clone.html', {'form': form, 'training': training})
+
+
+@read_only_view
+@login_required
+@admission_controlled
 def export_training_xlsx(request, pk):
     training = get_object_or_404(Training, pk=pk, user=request.user)
     return export_training_xlsx_response(training)
 
 
+# Импорт тренировок из CSV/XLSX
+@login_required
+def import_trainings_view(request):
+    result = None
+    if request.method == 'POST':
+        form = TrainingImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_trainings(
+                    upload.file,
+                    upload.name,
+                    user=request.user,
+                    allow_other_users=request.user.is_staff,
+                )
+            except TrainingImportError as exc:
+                form.add_error('file', str(exc))
+            else:
+                if result.ok:
+                    messages.success(request, f'Импортировано упражнений: {result.exercises_created}.')
+                    return redirect('training_plans:training_list')
+                messages.warning(request, f'Импортировано упражнений: {result.exercises_created}, ошибок: {result.error_count}.')
+    else:
+        form = TrainingImportForm()
+    return render(request, 'training_plans/training_import.html', {'form': form, 'result': result})
+
+
 # Экспорт в PDF персонального плана (только для владельца)
+@read_only_view
 @login_required
+@admission_controlled
 def export_training_plan_pdf(request, pk):
-    profile = get_object_or_404(UserProfile, pk=pk, user=request.user)
+    profile = _get_own_profile(request, pk)
     # Delegate to helper that builds a PDF response
     return export_profile_pdf_response(profile)
 
+# Метрики контроля допуска: очередь, занятые слоты, отказы
+@staff_member_required
+def admission_metrics_view(request):
+    return JsonResponse(get_admission_backend().metrics())
+
 # Домашняя страница
 def home_view(request):
     if request.user.is_authenticated: